@@ -11,14 +11,43 @@ The library provides the following classes:
     * RegisterResponse - helper to create responses to the 'register' method.
     * CheckResponse - helper to create responses to the 'check' method.
     * ReceiveResponse - helper to create responses to the 'receive' method.
+
+The activeworkflow_agent.server module provides an asyncio HTTP server that
+dispatches requests to an agent's handlers.
+
+Importing the package only imports what ParsedRequest and the responses need.
+The other modules (the server, metrics, profiling...), JSON backends and
+standard library modules used by optional features are imported when first
+used; the submodules are also available as attributes of the package, for
+example activeworkflow_agent.server. Call warm_up() (or
+AgentServer.preload()) to do that work before the first request instead.
 """
 
-import json
+from activeworkflow_agent import codec
+from activeworkflow_agent.limits import BoundedEntries
+from activeworkflow_agent.memory_codec import decode_memory, is_compressed
+from activeworkflow_agent.tracking import TrackedDict
+from activeworkflow_agent.tracking import stats as _tracking_stats
 
 
 class ParsedRequest:
     """Helper class to parse the content of a request from the AW agent API."""
 
+    __slots__ = (
+        "method",
+        "options",
+        "_memory",
+        "credentials",
+        "message",
+        "_credentials_index",
+        "_deadline",
+    )
+
+    # Share credentials_index between requests with the same credentials.
+    intern_credentials = False
+    # Wrap the memory in a TrackedDict (see activeworkflow_agent.tracking).
+    track_memory = False
+
     def __init__(self, request):
         """Create a ParsedRequest object.
 
@@ -37,7 +66,10 @@ class ParsedRequest:
         options: dict
             A dict with configuration options for the agent.
         memory : dict
-            The memory (state) of the agent; can be updated by the agent.
+            The memory (state) of the agent; can be updated by the agent. A
+            memory compressed by a MemoryCodec (see
+            activeworkflow_agent.memory_codec) is decompressed when it is
+            first accessed.
         credentials : list
              An array of user credentials.
         message : dict
@@ -56,11 +88,162 @@ class ParsedRequest:
         if self.method == "receive":
             self.message = request["params"]["message"]["payload"]
 
+    @property
+    def memory(self):
+        """The memory of the agent, decompressed if it was compressed.
+
+        When the track_memory class attribute is set, it is a TrackedDict.
+        """
+        memory = self._memory
+        if type(memory) is dict:
+            size = None
+            if is_compressed(memory):
+                size = self._memory_size()
+                memory = decode_memory(memory)
+            if self.track_memory:
+                if size is None:
+                    size = self._memory_size()
+                memory = TrackedDict(memory, size=size)
+            self._memory = memory
+        return memory
+
+    @memory.setter
+    def memory(self, value):
+        self._memory = value
+
+    @property
+    def deadline(self):
+        """The Deadline of the request (see activeworkflow_agent.deadline).
+
+        None when the server was not given a deadline for the method.
+        """
+        try:
+            return self._deadline
+        except AttributeError:
+            return None
+
+    @deadline.setter
+    def deadline(self, value):
+        self._deadline = value
+
+    def _memory_size(self):
+        """The size of the JSON of the memory as received, if known."""
+        return None
+
+    @classmethod
+    def from_bytes(cls, data, lazy=False):
+        """Create a ParsedRequest object from the raw body of a request.
+
+        Parameters
+        ----------
+        data : bytes, bytearray or memoryview
+            The JSON encoded request received from ActiveWorkflow's API.
+        lazy : bool
+            Return a LazyParsedRequest, which decodes options, memory,
+            credentials and message on first access. See
+            activeworkflow_agent.lazy.
+
+        The JSON is decoded with the default codec, see
+        activeworkflow_agent.codec.
+        """
+        if lazy:
+            from activeworkflow_agent.lazy import LazyParsedRequest
+
+            return LazyParsedRequest(data)
+        return cls(codec.loads(data))
+
+    @property
+    def credentials_index(self):
+        """The credentials as a Credentials mapping of names to values.
+
+        It is built on first access. When the intern_credentials class
+        attribute is set, requests with the same credentials share one
+        (read-only) index.
+        """
+        try:
+            return self._credentials_index
+        except AttributeError:
+            pass
+        from activeworkflow_agent.credentials import Credentials
+
+        if self.intern_credentials:
+            index = Credentials.interned(self.credentials)
+        else:
+            index = Credentials(self.credentials)
+        self._credentials_index = index
+        return index
+
+    @property
+    def options_hash(self):
+        """A hex digest that identifies the options of the request.
+
+        Requests with the same options have the same hash. It is computed
+        from the encoded options every time it is accessed.
+        """
+        return _digest(codec.dumps(self.options))
+
+    @property
+    def content_hash(self):
+        """A hex digest that identifies the whole content of the request.
+
+        Requests with the same method, options, memory, credentials and
+        message have the same hash.
+        """
+        return _digest(
+            codec.dumps(
+                [
+                    self.method,
+                    self.options,
+                    self.memory,
+                    self.credentials,
+                    self.message,
+                ]
+            )
+        )
+
+    def option_credential(self, option, default=None):
+        """Returns the value of the credential named by an option.
+
+        For example, with the options {"email_credential": "admin_email"}
+        option_credential("email_credential") returns the value of the
+        'admin_email' credential. Returns default when the option is not set
+        or names an unknown credential.
+        """
+        name = self.options.get(option)
+        if name is None:
+            return default
+        return self.credentials_index.get(name, default)
+
 
 class RegisterResponse:
-    """Helper class to construct an object to hold an agent's metadata."""
+    """Helper class to construct an object to hold an agent's metadata.
+
+    The encoded metadata is cached: to_bytes() returns the same bytes object
+    until one of the fields is assigned or default_options is modified.
+    """
 
-    def __init__(self, name, display_name, description, default_options={}):
+    __slots__ = (
+        "name",
+        "display_name",
+        "description",
+        "default_options",
+        "options_schema",
+        "_encoded",
+        "_options",
+        "_etag",
+        "_validator",
+    )
+
+    _FIELDS = ("name", "display_name", "description", "default_options")
+
+    def __init__(
+        self,
+        name,
+        display_name,
+        description,
+        default_options={},
+        options_schema=None,
+    ):
         """Create a RegisterResponse object for responding to 'register' method.
 
         Parameters
@@ -78,13 +261,44 @@ class RegisterResponse:
         default_options: dict
            The default options that a user can use as a starting point when
            configuring the agent.
+        options_schema: dict, optional
+           The schema the agent's options are validated against, see
+           activeworkflow_agent.options. When omitted, the schema is inferred
+           from default_options. It is not sent to ActiveWorkflow.
         """
         self.name = name
         self.display_name = display_name
         self.description = description
         self.default_options = default_options
+        self.options_schema = options_schema
         self._validate()
 
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in self._FIELDS:
+            super().__setattr__("_encoded", None)
+        if name in ("default_options", "options_schema"):
+            super().__setattr__("_validator", None)
+
+    @property
+    def options_validator(self):
+        """An OptionsValidator compiled from options_schema.
+
+        It is compiled on first access and cached until default_options or
+        options_schema is assigned.
+        """
+        if self._validator is None:
+            from activeworkflow_agent.options import (
+                OptionsValidator,
+                infer_schema,
+            )
+
+            schema = self.options_schema
+            if schema is None:
+                schema = infer_schema(self.default_options)
+            super().__setattr__("_validator", OptionsValidator(schema))
+        return self._validator
+
     def to_dict(self):
         """Returns a dict with the agent's metadata.
 
@@ -104,7 +318,34 @@ class RegisterResponse:
 
         It is in the format that ActiveWorkflow's Agent API expects.
         """
-        return json.dumps(self.to_dict())
+        return self.to_bytes().decode("utf-8")
+
+    def to_bytes(self):
+        """Returns the agent's metadata as UTF-8 encoded JSON.
+
+        It is in the format that ActiveWorkflow's Agent API expects.
+        """
+        if self._encoded is None or self.default_options != self._options:
+            self._validate()
+            import copy
+
+            encoded = codec.dumps(self.to_dict())
+            options = copy.deepcopy(self.default_options)
+            super().__setattr__("_options", options)
+            super().__setattr__("_etag", None)
+            super().__setattr__("_encoded", encoded)
+        return self._encoded
+
+    @property
+    def etag(self):
+        """A quoted hash of the encoded metadata, usable as an HTTP ETag."""
+        encoded = self.to_bytes()
+        if self._etag is None:
+            import hashlib
+
+            digest = hashlib.sha256(encoded).hexdigest()[:32]
+            super().__setattr__("_etag", '"{}"'.format(digest))
+        return self._etag
 
     def _validate(self):
         if not isinstance(self.default_options, dict):
@@ -115,6 +356,8 @@ class RegisterResponse:
             raise TypeError("display_name must be a string.")
         if not isinstance(self.description, str):
             raise TypeError("description must be a string.")
+        if not isinstance(self.options_schema, (dict, type(None))):
+            raise TypeError("options_schema must be a dict.")
 
 
 class Response:
@@ -123,6 +366,14 @@ class Response:
     A response looks like this:
     {
         "result": {
+            "messages": [
+               {
+                   "a": 5
+               },
+               {
+                   "a": 6
+               }
+            ],
             "errors": [
                 "Something failed",
                 "Something else failed"
@@ -133,50 +384,96 @@ class Response:
             ],
             "memory": {
                 "key": "new value"
-            },
-            "messages": [
-               {
-                   "a": 5
-               },
-               {
-                   "a": 6
-               }
-            ]
+            }
         }
     }
     See https://docs.activeworkflow.org/remote-agent-api#responses and
     https://docs.activeworkflow.org/remote-agent-api#methods
     for more details.
+
+    Messages are serialised first, so that a response that is streamed (see
+    iter_chunks()) can still report in its logs that messages were dropped.
     """
 
-    def __init__(self):
-        """Create an object for responding to 'receive' or 'check' methods."""
-        self._errors = []
-        self._logs = []
-        self._messages = []
-        self._memory = {}
+    __slots__ = (
+        "max_messages",
+        "max_messages_size",
+        "overflow",
+        "_errors",
+        "_logs",
+        "_messages",
+        "_memory",
+        "_sources",
+    )
+
+    # A MemoryCodec that compresses large memories, see add_memory().
+    memory_codec = None
+    # EntryLimits for the logs and errors (see activeworkflow_agent.limits).
+    log_limits = None
+    error_limits = None
+
+    def __init__(
+        self, max_messages=None, max_messages_size=None, overflow="truncate"
+    ):
+        """Create an object for responding to 'receive' or 'check' methods.
+
+        Parameters
+        ----------
+        max_messages : int, optional
+            The maximum number of messages in the response.
+        max_messages_size : int, optional
+            The maximum total size (in bytes) of the encoded messages.
+        overflow : str
+            What happens when messages exceed one of the limits. With
+            'truncate' the remaining messages are dropped and a log entry
+            says so; with 'error' a ValueError is raised.
+
+        The limits are applied when the response is serialised.
+        """
+        if overflow not in ("truncate", "error"):
+            raise ValueError("overflow must be 'truncate' or 'error'.")
+        self.max_messages = max_messages
+        self.max_messages_size = max_messages_size
+        self.overflow = overflow
+        # Empty responses share an empty tuple (and None for the memory)
+        # instead of allocating containers that are never written to.
+        self._errors = ()
+        self._logs = ()
+        self._messages = ()
+        self._memory = None
+        self._sources = 0
 
     def add_logs(self, *logs):
-        """Add log messages to the response object."""
+        """Add log messages to the response object.
+
+        When the log_limits class attribute is set, the logs are kept within
+        the limits.
+        """
         for log in logs:
             if not isinstance(log, str):
                 raise TypeError("Log entries must be (non-empty) strings.")
             if log == "":
                 raise ValueError("Log entries can not be empty strings.")
 
-        for log in logs:
-            self._logs.append(log)
+        if not self._logs:
+            self._logs = _entries(self.log_limits, _LOG_NOUN)
+        self._logs.extend(logs)
 
     def add_errors(self, *errors):
-        """Add error messages to the response object."""
+        """Add error messages to the response object.
+
+        When the error_limits class attribute is set, the errors are kept
+        within the limits.
+        """
         for err in errors:
             if not isinstance(err, str):
                 raise TypeError("Error entries must be (non-empty) strings.")
             if err == "":
                 raise ValueError("Error entries can not be empty strings.")
 
-        for err in errors:
-            self._errors.append(err)
+        if not self._errors:
+            self._errors = _entries(self.error_limits, _ERROR_NOUN)
+        self._errors.extend(errors)
 
     def add_messages(self, *messages):
         """Add messages to the response object."""
@@ -184,11 +481,43 @@ class Response:
             if not isinstance(msg, dict):
                 raise TypeError("Messages must be dicts.")
 
-        for msg in messages:
-            self._messages.append(msg)
+        if not self._messages:
+            self._messages = []
+        self._messages.extend(messages)
+
+    def add_messages_from(self, messages):
+        """Add the messages produced by an iterable or async iterable.
+
+        The messages are consumed, and checked to be dicts, only when the
+        response is serialised. When the response is streamed (see
+        iter_chunks() and aiter_chunks()) they are encoded one at a time and
+        never all held in memory. As the messages can only be consumed once,
+        such a response can only be serialised once.
+
+        An async iterable can only be consumed by aiter_chunks() (which the
+        agent server uses).
+        """
+        if hasattr(messages, "__aiter__"):
+            source = _MessageSource(messages.__aiter__(), True)
+        elif hasattr(messages, "__iter__") and not isinstance(
+            messages, (dict, str, bytes)
+        ):
+            source = _MessageSource(iter(messages), False)
+        else:
+            raise TypeError("messages must be an iterable of dicts.")
+        if not self._messages:
+            self._messages = []
+        self._messages.append(source)
+        self._sources += 1
 
     def add_memory(self, mem):
-        """Add a memory to the response object."""
+        """Add a memory to the response object.
+
+        When the memory_codec class attribute is set to a MemoryCodec, large
+        memories are compressed when the response is serialised. A
+        TrackedDict that has not been changed is not sent (see
+        activeworkflow_agent.tracking).
+        """
         if not isinstance(mem, dict):
             raise TypeError("A memory has to be a dict.")
 
@@ -199,12 +528,34 @@ class Response:
 
         It is in the format that ActiveWorkflow's Agent API expects.
         """
+        return self._result(self._encoded_memory())
+
+    def _result(self, memory):
+        """Returns the dict of the response with memory as its memory.
+
+        Applies the message limits first.
+        """
+        if (
+            self._sources
+            or self.max_messages is not None
+            or self.max_messages_size is not None
+        ):
+            budget = _MessageBudget(self, encode=False)
+            messages = []
+            with _closing(self._iter_messages()) as source:
+                for msg in source:
+                    if budget.admit(msg) is None:
+                        break
+                    messages.append(msg)
+            self._messages = messages
+            self._sources = 0
+            self._report(budget)
         return {
             "result": {
-                "errors": self._errors,
-                "logs": self._logs,
-                "memory": self._memory,
-                "messages": self._messages,
+                "messages": self._messages or [],
+                "errors": _entry_list(self._errors),
+                "logs": _entry_list(self._logs),
+                "memory": memory,
             }
         }
 
@@ -213,8 +564,336 @@ class Response:
 
         It is in the format that ActiveWorkflow's Agent API expects.
         """
-        return json.dumps(self.to_dict())
+        return self.to_bytes().decode("utf-8")
+
+    def to_bytes(self):
+        """Returns the response as UTF-8 encoded JSON.
+
+        It is in the format that ActiveWorkflow's Agent API expects.
+        """
+        if self.memory_codec is None:
+            return codec.dumps(self.to_dict())
+        # The memory is encoded by the memory codec only, and spliced in
+        # where the memory is last in the JSON (as in _finish()).
+        encoded = codec.dumps(self._result(None))
+        memory = self._memory_to_send()
+        if memory is None:
+            memory = b"{}"
+        else:
+            memory = self.memory_codec.dumps(memory)
+        return b"".join((encoded[: -len(b"null}}")], memory, b"}}"))
+
+    def iter_chunks(self, chunk_size=65536):
+        """Yields the JSON of the response in chunks of UTF-8 encoded bytes.
+
+        Messages are encoded one at a time as the chunks are consumed, so
+        the complete JSON is never held in memory. Joined, the chunks are
+        equal to to_bytes().
+
+        Parameters
+        ----------
+        chunk_size : int
+            The size (in bytes) above which a chunk is yielded. Chunks can be
+            larger when a single message is larger than chunk_size.
+        """
+        budget = _MessageBudget(self, encode=True)
+        buffer = bytearray(b'{"result":{"messages":[')
+        with _closing(self._iter_messages()) as source:
+            for msg in source:
+                if budget.extend(buffer, msg) is None:
+                    break
+                if len(buffer) >= chunk_size:
+                    yield bytes(buffer)
+                    buffer.clear()
+        self._finish(buffer, budget)
+        yield bytes(buffer)
+
+    async def aiter_chunks(self, chunk_size=65536):
+        """Like iter_chunks(), but also consumes async iterables of messages.
+
+        This is an asynchronous generator.
+        """
+        async for buffer in self._aiter_buffers(chunk_size, bytearray):
+            yield bytes(buffer)
+
+    async def _aiter_buffers(self, chunk_size, new_buffer, budget=None):
+        """Yields the chunks of aiter_chunks() in buffers from new_buffer().
+
+        The buffers can be bytearrays or OutputBuffers, and belong to the
+        caller once yielded. A _MessageBudget can be passed to count the
+        messages sent.
+        """
+        if budget is None:
+            budget = _MessageBudget(self, encode=True)
+        buffer = new_buffer()
+        buffer += b'{"result":{"messages":['
+        source = self._aiter_messages()
+        try:
+            async for msg in source:
+                if budget.extend(buffer, msg) is None:
+                    break
+                if len(buffer) >= chunk_size:
+                    yield buffer
+                    buffer = new_buffer()
+        finally:
+            await source.aclose()
+        self._finish(buffer, budget)
+        yield buffer
+
+    def write_to(self, fp, chunk_size=65536):
+        """Write the JSON of the response to a binary file-like object.
+
+        Returns the number of bytes written. See iter_chunks().
+        """
+        size = 0
+        for chunk in self.iter_chunks(chunk_size):
+            fp.write(chunk)
+            size += len(chunk)
+        return size
+
+    async def write_to_stream(self, writer, chunk_size=65536):
+        """Write the JSON of the response to an asyncio.StreamWriter.
+
+        Waits for the writer to drain after every chunk, which bounds the
+        memory used for buffering. Returns the number of bytes written. See
+        aiter_chunks().
+        """
+        size = 0
+        async for chunk in self.aiter_chunks(chunk_size):
+            writer.write(chunk)
+            size += len(chunk)
+            await writer.drain()
+        return size
+
+    def _iter_messages(self):
+        for item in self._messages:
+            if type(item) is not _MessageSource:
+                yield item
+            elif item.is_async:
+                raise TypeError(
+                    "Async iterables of messages can only be consumed by "
+                    "aiter_chunks()."
+                )
+            else:
+                with _closing(item.iterator):
+                    yield from item.iterator
+
+    async def _aiter_messages(self):
+        for item in self._messages:
+            if type(item) is not _MessageSource:
+                yield item
+            elif item.is_async:
+                try:
+                    async for msg in item.iterator:
+                        yield msg
+                finally:
+                    if hasattr(item.iterator, "aclose"):
+                        await item.iterator.aclose()
+            else:
+                with _closing(item.iterator):
+                    for msg in item.iterator:
+                        yield msg
+
+    def _finish(self, buffer, budget):
+        if budget.truncated is not None and not self._sources:
+            # Keep the messages sent, as to_dict() does, so that serialising
+            # the response again does not truncate and report again.
+            del self._messages[budget.count :]
+        self._sources = 0
+        self._report(budget)
+        dumps = codec.get_codec().dumps
+        buffer += b'],"errors":'
+        buffer += dumps(_entry_list(self._errors))
+        buffer += b',"logs":'
+        buffer += dumps(_entry_list(self._logs))
+        buffer += b',"memory":'
+        memory = self._memory_to_send()
+        if memory is None:
+            buffer += b"{}"
+        elif self.memory_codec is not None:
+            buffer += self.memory_codec.dumps(memory)
+        else:
+            buffer += dumps(memory)
+        buffer += b"}}"
+
+    def _encoded_memory(self):
+        memory = self._memory_to_send()
+        if memory is None:
+            return {}
+        if self.memory_codec is not None:
+            return self.memory_codec.encode(memory)
+        return memory
+
+    def _memory_to_send(self):
+        memory = self._memory
+        if type(memory) is TrackedDict and not memory.changed:
+            _tracking_stats.record(memory)
+            return None
+        return memory
+
+    def _report(self, budget):
+        if budget.truncated:
+            self.add_logs(budget.truncated)
+
+
+class _MessageSource:
+    """An iterator of messages added with Response.add_messages_from()."""
+
+    __slots__ = ("iterator", "is_async")
+
+    def __init__(self, iterator, is_async):
+        self.iterator = iterator
+        self.is_async = is_async
+
+
+class _MessageBudget:
+    """Applies a Response's message limits while it is serialised."""
+
+    def __init__(self, response, encode):
+        self.max_messages = response.max_messages
+        self.max_size = response.max_messages_size
+        self.overflow = response.overflow
+        self.encode = encode or self.max_size is not None
+        self.dumps = codec.get_codec().dumps
+        self.count = 0
+        self.size = 0
+        self.truncated = None
+
+    def admit(self, msg):
+        """Returns msg, encoded if needed, or None when over the limits."""
+        if not isinstance(msg, dict):
+            raise TypeError("Messages must be dicts.")
+        if self.max_messages is not None and self.count >= self.max_messages:
+            return self._overflow("{} messages".format(self.max_messages))
+        if self.encode:
+            msg = self.dumps(msg)
+        if self.max_size is not None:
+            if self.size + len(msg) > self.max_size:
+                return self._overflow("{} bytes".format(self.max_size))
+            self.size += len(msg)
+        self.count += 1
+        return msg
+
+    def extend(self, buffer, msg):
+        """Appends the encoded msg to buffer; returns None when over limits."""
+        encoded = self.admit(msg)
+        if encoded is not None:
+            if self.count > 1:
+                buffer += b","
+            buffer += encoded
+        return encoded
+
+    def _overflow(self, limit):
+        if self.overflow == "error":
+            raise ValueError("Too many messages, the limit is " + limit + ".")
+        self.truncated = "Messages truncated at the limit of " + limit + "."
+        return None
+
+
+class _closing:
+    """Calls close() on exit, if the object has it."""
+
+    __slots__ = ("obj",)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __enter__(self):
+        return self.obj
+
+    def __exit__(self, *exc_info):
+        close = getattr(self.obj, "close", None)
+        if close is not None:
+            close()
+
+
+_LOG_NOUN = ("log entry", "log entries")
+_ERROR_NOUN = ("error", "errors")
+
+
+def _entries(limits, noun):
+    if limits is None:
+        return []
+    return BoundedEntries(limits, noun)
+
+
+def _entry_list(entries):
+    if type(entries) is BoundedEntries:
+        return entries.to_list()
+    return entries or []
+
+
+def _digest(data):
+    import hashlib
+
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
 
 
 CheckResponse = Response
 ReceiveResponse = Response
+
+
+def warm_up(*register_responses):
+    """Do the work that would otherwise slow down the first request.
+
+    Selects the default JSON codec, which imports its backend, and encodes
+    the given RegisterResponses, which cache their encoded metadata and ETag.
+
+    Parameters
+    ----------
+    *register_responses : RegisterResponse
+        The responses to the 'register' method to prepare.
+    """
+    codec.get_codec()
+    for response in register_responses:
+        response.etag
+
+
+_SUBMODULES = frozenset(
+    (
+        "batching",
+        "buffers",
+        "cache",
+        "cli",
+        "coalesce",
+        "credentials",
+        "deadline",
+        "execution",
+        "lazy",
+        "memory_codec",
+        "metrics",
+        "options",
+        "prefork",
+        "profiling",
+        "replay",
+        "server",
+        "stats",
+        "structures",
+        "tracking",
+    )
+)
+# Names of the package imported from a submodule when first accessed.
+_LAZY_NAMES = {
+    "AgentServer": "server",
+    "Credentials": "credentials",
+    "LazyParsedRequest": "lazy",
+    "MemoryCodec": "memory_codec",
+}
+
+
+def __getattr__(name):
+    import importlib
+
+    if name in _SUBMODULES:
+        return importlib.import_module(__name__ + "." + name)
+    if name in _LAZY_NAMES:
+        module = importlib.import_module(__name__ + "." + _LAZY_NAMES[name])
+        value = globals()[name] = getattr(module, name)
+        return value
+    raise AttributeError(
+        "module {!r} has no attribute {!r}".format(__name__, name)
+    )
+
+
+def __dir__():
+    return sorted(set(globals()) | _SUBMODULES | set(_LAZY_NAMES))
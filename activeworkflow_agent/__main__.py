@@ -0,0 +1,6 @@
+import sys
+
+from activeworkflow_agent.cli import main
+
+
+sys.exit(main())
@@ -0,0 +1,120 @@
+"""Micro-batching of 'receive' requests.
+
+Every 'receive' request carries a single message. Agents that process
+messages in bulk (for example by scoring them with a vectorised model) can
+instead provide a batch handler, which takes a list of ParsedRequest objects
+and returns a list with a Response for each of them:
+
+    def receive_batch(requests):
+        scores = model.predict([r.message["text"] for r in requests])
+        responses = []
+        for score in scores:
+            response = aw.ReceiveResponse()
+            response.add_messages({"score": float(score)})
+            responses.append(response)
+        return responses
+
+    run(register, receive_batch=receive_batch, port=5000)
+
+A Batcher collects the requests that arrive concurrently and calls the
+handler once the batch is full or the first request has waited max_wait
+seconds. The sizes of the batches and the time requests waited for them are
+recorded in histograms, to show whether batching pays off.
+"""
+
+import asyncio
+import inspect
+import time
+
+from activeworkflow_agent.stats import Histogram
+
+
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+WAIT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+
+class Batcher:
+    """Coalesces requests into batches for a batch handler."""
+
+    def __init__(self, handler, max_batch_size=32, max_wait=0.005):
+        """Create a Batcher object.
+
+        Parameters
+        ----------
+        handler : callable
+            Takes a list of ParsedRequest objects and returns a list of as
+            many Response objects, in the same order. Plain functions are run
+            in the event loop's default executor.
+        max_batch_size : int
+            The largest number of requests in a batch.
+        max_wait : float
+            The longest time (in seconds) a request waits for the batch to
+            fill up.
+        """
+        if not callable(handler):
+            raise TypeError("handler must be callable.")
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be a positive integer.")
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batch_sizes = Histogram(SIZE_BUCKETS)
+        self.wait_times = Histogram(WAIT_BUCKETS)
+        self._batch = []
+        self._timer = None
+        # The event loop only keeps weak references to tasks.
+        self._tasks = set()
+
+    async def submit(self, request):
+        """Add a request to the next batch and return its Response."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._batch.append((request, future, time.monotonic()))
+        if len(self._batch) >= self.max_batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self.flush)
+        return await future
+
+    def flush(self):
+        """Send the requests collected so far to the handler."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        now = time.monotonic()
+        self.batch_sizes.observe(len(batch))
+        for _, _, queued in batch:
+            self.wait_times.observe(now - queued)
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        futures = [future for _, future, _ in batch]
+        try:
+            responses = await self._call([request for request, _, _ in batch])
+            if len(responses) != len(batch):
+                raise ValueError(
+                    "The batch handler returned {} responses for {} "
+                    "requests.".format(len(responses), len(batch))
+                )
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, response in zip(futures, responses):
+            if not future.done():
+                future.set_result(response)
+
+    async def _call(self, requests):
+        if asyncio.iscoroutinefunction(self.handler):
+            return list(await self.handler(requests))
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, self.handler, requests)
+        if inspect.isawaitable(result):
+            result = await result
+        return list(result)
@@ -0,0 +1,131 @@
+"""Reusable buffers for streaming responses.
+
+Streamed responses are encoded message by message into a buffer that is sent
+once it holds chunk_size bytes. AgentServer encodes them into OutputBuffers:
+pre-sized bytearrays taken from a BufferPool, with room left before the data
+for the chunk's header. The header and the trailing CRLF are written around
+the data in place, and the chunk is sent with a single write of a memoryview
+of the buffer, so the data is never copied after it has been encoded. Once
+sent, the bytearray goes back to the pool for the next chunks.
+
+A bytearray that is cleared and refilled is freed and reallocated as it grows
+again; writing into a pre-sized one at an offset is not.
+"""
+
+
+class BufferPool:
+    """A pool of pre-sized bytearrays."""
+
+    __slots__ = (
+        "max_buffers",
+        "size",
+        "max_size",
+        "reused",
+        "created",
+        "_free",
+    )
+
+    def __init__(self, max_buffers=16, size=131072, max_size=4 * 1024 * 1024):
+        """Create a BufferPool object.
+
+        Parameters
+        ----------
+        max_buffers : int
+            The maximum number of buffers kept for reuse.
+        size : int
+            The size (in bytes) of new buffers.
+        max_size : int
+            Buffers that have grown larger than this are not kept, so that
+            one large message does not hold on to its memory.
+        """
+        if max_buffers < 0:
+            raise ValueError("max_buffers must not be negative.")
+        self.max_buffers = max_buffers
+        self.size = size
+        self.max_size = max_size
+        self.reused = 0
+        self.created = 0
+        self._free = []
+
+    def __len__(self):
+        """The number of buffers available for reuse."""
+        return len(self._free)
+
+    def acquire(self):
+        """Returns a bytearray, reused if one is available."""
+        if self._free:
+            self.reused += 1
+            return self._free.pop()
+        self.created += 1
+        return bytearray(self.size)
+
+    def release(self, buffer):
+        """Give a bytearray back to the pool once it is no longer used.
+
+        Bytearrays still referenced by a memoryview (for example one held by
+        a transport that has not sent the data yet) are not reused.
+        """
+        if len(self._free) >= self.max_buffers or len(buffer) > self.max_size:
+            return
+        try:
+            # Resizing fails while the buffer is exported. Removing a byte
+            # and putting it back does not reallocate it.
+            if buffer:
+                buffer.append(buffer.pop())
+            else:
+                buffer.append(0)
+                buffer.pop()
+        except BufferError:
+            return
+        self._free.append(buffer)
+
+
+class OutputBuffer:
+    """Data appended (with +=) to a pre-sized bytearray, after head room.
+
+    The bytearray only grows when the data does not fit in it.
+    """
+
+    __slots__ = ("data", "head_room", "end")
+
+    def __init__(self, data, head_room=0):
+        """Create an OutputBuffer object.
+
+        Parameters
+        ----------
+        data : bytearray
+            The bytearray to write into. Its content is overwritten.
+        head_room : int
+            The number of bytes left before the data, for a header.
+        """
+        if len(data) < head_room:
+            data.extend(bytes(head_room - len(data)))
+        self.data = data
+        self.head_room = head_room
+        self.end = head_room
+
+    def __len__(self):
+        return self.end - self.head_room
+
+    def __iadd__(self, chunk):
+        end = self.end + len(chunk)
+        self.data[self.end : end] = chunk
+        self.end = end
+        return self
+
+    def getvalue(self):
+        """Returns a copy of the data as bytes."""
+        return bytes(memoryview(self.data)[self.head_room : self.end])
+
+    def frame(self, header, trailer=b""):
+        """Write header before the data and trailer after it.
+
+        Returns a memoryview of the header, data and trailer. The header
+        must fit in the head room.
+        """
+        start = self.head_room - len(header)
+        if start < 0:
+            raise ValueError("The header does not fit in the head room.")
+        self.data[start : self.head_room] = header
+        self += trailer
+        return memoryview(self.data)[start : self.end]
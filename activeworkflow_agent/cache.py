@@ -0,0 +1,256 @@
+"""A cache of resources built from the options of an agent.
+
+Handlers often build expensive objects from the options of each request: HTTP
+clients, compiled regular expressions, parsed templates or loaded models. As
+the options of an agent rarely change, a ResourceCache keeps these objects
+between requests:
+
+    from activeworkflow_agent.cache import ResourceCache
+
+    clients = ResourceCache(ttl=600, teardown=lambda client: client.close())
+
+    def check(request):
+        client = clients.get(request, lambda r: Client(r.options["url"]))
+        ...
+
+Resources are keyed by ParsedRequest.options_hash (and, optionally, by the
+credentials of the request). The least recently used resources are evicted
+when the cache is full, and resources older than the time to live are built
+again. The teardown hook is called with every evicted resource.
+
+A ResourceCache can be shared by the handlers run in the event loop (aget())
+and by the ones run in the thread pool (get()).
+"""
+
+import asyncio
+import inspect
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from activeworkflow_agent import _digest, codec
+
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class ResourceCache:
+    """An LRU cache of resources keyed by the options of requests."""
+
+    def __init__(
+        self,
+        max_entries=128,
+        ttl=None,
+        max_size=None,
+        sizeof=sys.getsizeof,
+        teardown=None,
+        include_credentials=False,
+        clock=time.monotonic,
+    ):
+        """Create a ResourceCache object.
+
+        Parameters
+        ----------
+        max_entries : int
+            The maximum number of resources kept.
+        ttl : float, optional
+            The number of seconds after which a resource is built again.
+            Resources do not expire when it is None.
+        max_size : int, optional
+            The maximum total size of the resources kept, as measured by
+            sizeof. A resource larger than max_size is returned but not kept.
+        sizeof : callable
+            Returns the size of a resource. Only used with max_size.
+        teardown : callable, optional
+            Called with each resource evicted from the cache. Errors raised
+            by it are logged and otherwise ignored.
+        include_credentials : bool
+            Whether requests with the same options but different credentials
+            use different resources.
+        clock : callable
+            Returns the current time in seconds.
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1.")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.teardown = teardown
+        self.include_credentials = include_credentials
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+        # Maps keys to (resource, expiry time, size) tuples.
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._building = {}
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def key_for(self, request):
+        """Returns the key of the resource for a ParsedRequest."""
+        if not self.include_credentials:
+            return request.options_hash
+        return "{}:{}".format(
+            request.options_hash, _digest(codec.dumps(request.credentials))
+        )
+
+    def get(self, request, factory):
+        """Returns the resource for a request, building it when needed.
+
+        Parameters
+        ----------
+        request : ParsedRequest
+            The request whose options identify the resource.
+        factory : callable
+            Called with the request to build the resource when it is not in
+            the cache. Threads asking for the same missing resource wait for
+            a single call of factory.
+        """
+        key = self.key_for(request)
+        resource = self._lookup(key)
+        if resource is not _MISSING:
+            return resource
+        with self._lock:
+            building = self._building.setdefault(key, threading.Lock())
+        with building:
+            resource = self._lookup(key)
+            if resource is not _MISSING:
+                return resource
+            try:
+                with self._lock:
+                    self.misses += 1
+                return self._store(key, factory(request))
+            finally:
+                with self._lock:
+                    self._building.pop(key, None)
+
+    async def aget(self, request, factory):
+        """Returns the resource for a request, building it when needed.
+
+        Like get(), but factory can also be a coroutine function. Tasks
+        asking for the same missing resource wait for a single call of
+        factory. Plain functions are called in the event loop, so a slow
+        factory should be a coroutine function.
+        """
+        key = self.key_for(request)
+        resource = self._lookup(key)
+        if resource is not _MISSING:
+            return resource
+        task = self._pending.get(key)
+        if task is not None:
+            resource = await asyncio.shield(task)
+            with self._lock:
+                self.hits += 1
+            return resource
+        with self._lock:
+            self.misses += 1
+        task = asyncio.ensure_future(self._build(key, request, factory))
+        self._pending[key] = task
+        return await asyncio.shield(task)
+
+    async def _build(self, key, request, factory):
+        try:
+            resource = factory(request)
+            if inspect.isawaitable(resource):
+                resource = await resource
+            return self._store(key, resource)
+        finally:
+            self._pending.pop(key, None)
+
+    def invalidate(self, request):
+        """Evicts the resource for a request, if there is one."""
+        key = self.key_for(request)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return
+            self._remove(entry)
+        self._teardown([entry[0]])
+
+    def expire(self):
+        """Evicts the resources that are past their time to live."""
+        now = self.clock()
+        with self._lock:
+            expired = [
+                key
+                for key, (_, expires, _) in self._entries.items()
+                if expires is not None and expires <= now
+            ]
+            evicted = [self._entries.pop(key) for key in expired]
+            for entry in evicted:
+                self._remove(entry)
+        self._teardown([entry[0] for entry in evicted])
+
+    def clear(self):
+        """Evicts all the resources."""
+        with self._lock:
+            evicted = list(self._entries.values())
+            self._entries.clear()
+            for entry in evicted:
+                self._remove(entry)
+        self._teardown([entry[0] for entry in evicted])
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            resource, expires, _ = entry
+            if expires is None or expires > self.clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return resource
+            del self._entries[key]
+            self._remove(entry)
+        self._teardown([resource])
+        return _MISSING
+
+    def _store(self, key, resource):
+        size = self.sizeof(resource) if self.max_size is not None else 0
+        if self.max_size is not None and size > self.max_size:
+            return resource
+        expires = None if self.ttl is None else self.clock() + self.ttl
+        evicted = []
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None:
+                # Built concurrently by get() and aget(); keep the first.
+                evicted.append(resource)
+                resource = existing[0]
+            else:
+                self._entries[key] = (resource, expires, size)
+                self.size += size
+                while len(self._entries) > self.max_entries or (
+                    self.max_size is not None and self.size > self.max_size
+                ):
+                    _, entry = self._entries.popitem(last=False)
+                    self._remove(entry)
+                    evicted.append(entry[0])
+        self._teardown(evicted)
+        return resource
+
+    def _remove(self, entry):
+        self.size -= entry[2]
+        self.evictions += 1
+
+    def _teardown(self, resources):
+        if self.teardown is None:
+            return
+        for resource in resources:
+            try:
+                self.teardown(resource)
+            except Exception:
+                logger.exception("Error while tearing down a resource")
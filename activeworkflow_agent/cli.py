@@ -0,0 +1,301 @@
+"""Command line interface of activeworkflow_agent.
+
+Run an agent defined in a Python module:
+
+    python -m activeworkflow_agent serve my_agent --port 5000 --workers 4
+
+The module either defines 'register', 'check' and 'receive' handlers at the
+top level, or an AgentServer instance given as 'module:attribute'.
+
+Record the requests an agent receives, and replay them against a local copy
+of the agent (see activeworkflow_agent.replay):
+
+    python -m activeworkflow_agent serve my_agent --record traffic.jsonl.gz
+    python -m activeworkflow_agent replay traffic.jsonl.gz --agent my_agent
+"""
+
+import argparse
+import asyncio
+import importlib
+import itertools
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+
+
+def load_server(spec):
+    """Import an agent and return an AgentServer for it.
+
+    Parameters
+    ----------
+    spec : str
+        Either 'module', in which case the module's register, check and
+        receive attributes are used as handlers, or 'module:attribute' where
+        the attribute is an AgentServer.
+    """
+    from activeworkflow_agent.server import AgentServer
+
+    module_name, _, attribute = spec.partition(":")
+    module = importlib.import_module(module_name)
+    if attribute:
+        server = getattr(module, attribute)
+        if not isinstance(server, AgentServer):
+            raise TypeError("{} is not an AgentServer.".format(spec))
+        return server
+    if not hasattr(module, "register"):
+        raise AttributeError(
+            "Module {} does not define 'register'.".format(module_name)
+        )
+    return AgentServer(
+        module.register,
+        check=getattr(module, "check", None),
+        receive=getattr(module, "receive", None),
+    )
+
+
+def serve(args):
+    server = load_server(args.agent)
+    if args.max_concurrency:
+        server.max_concurrency = args.max_concurrency
+    prefork = args.workers != 1 or args.max_requests or args.max_rss
+    if args.record:
+        if prefork:
+            raise SystemExit("--record requires a single worker.")
+        from activeworkflow_agent.replay import Recorder
+
+        server.recorder = Recorder(args.record, args.record_sample_rate)
+    if prefork:
+        from activeworkflow_agent.prefork import PreforkServer
+
+        try:
+            PreforkServer(
+                server,
+                workers=args.workers,
+                host=args.host,
+                port=args.port,
+                max_requests=args.max_requests,
+                max_requests_jitter=args.max_requests_jitter,
+                max_rss=args.max_rss,
+                graceful_timeout=args.graceful_timeout,
+            ).run()
+        except RuntimeError as e:
+            raise SystemExit(str(e)) from e
+        return 0
+    server.preload()
+    try:
+        asyncio.run(server.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if server.recorder is not None:
+            server.recorder.close()
+    return 0
+
+
+def replay_recording(args):
+    from activeworkflow_agent.replay import load, replay
+
+    records = load(args.recording)
+    if args.limit:
+        records = itertools.islice(records, args.limit)
+    host, port, process = args.host, args.port, None
+    if args.agent:
+        host = "127.0.0.1"
+        process, port = start_agent(args.agent, args.workers)
+    try:
+        report = asyncio.run(
+            replay(
+                records,
+                host,
+                port,
+                concurrency=args.concurrency,
+                rate=args.rate,
+                speed=args.speed,
+                timeout=args.timeout,
+                ignore=args.ignore,
+            )
+        )
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    if args.json:
+        print(json.dumps(report.summary(), indent=2))
+    else:
+        print(report.format())
+    return 0
+
+
+def start_agent(spec, workers=1, timeout=30.0):
+    """Serve an agent in a new process on a free local port.
+
+    Returns the process and the port once the agent accepts connections.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "activeworkflow_agent",
+            "--log-level",
+            "WARNING",
+            "serve",
+            spec,
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+        ],
+        # The agent is imported from the same paths as in this process.
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+    )
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), 1.0).close()
+            return process, port
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                process.wait()
+                raise RuntimeError("The agent {} did not start.".format(spec))
+            time.sleep(0.05)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="activeworkflow_agent")
+    parser.add_argument(
+        "--log-level", default="INFO", help="Logging level (default: INFO)."
+    )
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+
+    parser_serve = commands.add_parser("serve", help="Serve an agent.")
+    parser_serve.set_defaults(func=serve)
+    parser_serve.add_argument(
+        "agent", help="The agent to serve, as 'module' or 'module:attribute'."
+    )
+    parser_serve.add_argument("--host", default="0.0.0.0")
+    parser_serve.add_argument("--port", type=int, default=5000)
+    parser_serve.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes; 0 means one per CPU (default: 1).",
+    )
+    parser_serve.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=0,
+        help="Requests handled at the same time by each worker.",
+    )
+    parser_serve.add_argument(
+        "--max-requests",
+        type=int,
+        default=0,
+        help="Recycle a worker after this many requests.",
+    )
+    parser_serve.add_argument(
+        "--max-requests-jitter",
+        type=int,
+        default=0,
+        help="Random number of requests added to --max-requests per worker.",
+    )
+    parser_serve.add_argument(
+        "--max-rss",
+        type=int,
+        default=0,
+        help="Recycle a worker when its RSS exceeds this many bytes.",
+    )
+    parser_serve.add_argument(
+        "--graceful-timeout",
+        type=float,
+        default=30.0,
+        help="Seconds stopping workers get to finish their requests.",
+    )
+    parser_serve.add_argument(
+        "--record",
+        metavar="FILE",
+        help="Record the requests and responses to a JSONL file.",
+    )
+    parser_serve.add_argument(
+        "--record-sample-rate",
+        type=float,
+        default=1.0,
+        help="Fraction of the requests recorded (default: 1).",
+    )
+
+    parser_replay = commands.add_parser(
+        "replay", help="Replay recorded requests against an agent."
+    )
+    parser_replay.set_defaults(func=replay_recording)
+    parser_replay.add_argument("recording", help="The recorded JSONL file.")
+    parser_replay.add_argument(
+        "--agent",
+        help="Serve this agent ('module' or 'module:attribute') locally and "
+        "replay against it, instead of --host and --port.",
+    )
+    parser_replay.add_argument("--host", default="127.0.0.1")
+    parser_replay.add_argument("--port", type=int, default=5000)
+    parser_replay.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes of the --agent (default: 1).",
+    )
+    parser_replay.add_argument(
+        "--concurrency",
+        type=int,
+        default=16,
+        help="Maximum number of requests in flight (default: 16).",
+    )
+    timing = parser_replay.add_mutually_exclusive_group()
+    timing.add_argument(
+        "--rate", type=float, help="Requests sent per second."
+    )
+    timing.add_argument(
+        "--speed",
+        type=float,
+        help="Replay with the recorded timing, sped up by this factor.",
+    )
+    parser_replay.add_argument(
+        "--limit", type=int, default=0, help="Replay only this many requests."
+    )
+    parser_replay.add_argument(
+        "--timeout",
+        type=float,
+        default=30.0,
+        help="Seconds to wait for each response (default: 30).",
+    )
+    parser_replay.add_argument(
+        "--ignore",
+        action="append",
+        default=[],
+        metavar="PATH",
+        help="A path not compared in responses, such as 'result.logs'.",
+    )
+    parser_replay.add_argument(
+        "--json", action="store_true", help="Print the report as JSON."
+    )
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(
+        level=args.log_level.upper(),
+        format="%(asctime)s [%(process)d] %(levelname)s %(name)s: %(message)s",
+    )
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
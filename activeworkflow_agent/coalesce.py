@@ -0,0 +1,109 @@
+"""Single-flight execution of identical concurrent requests.
+
+ActiveWorkflow can send the same 'check' request more than once at a time,
+for example when it retries a request or when schedules overlap. With
+AgentServer(coalesce_checks=True) concurrent 'check' requests with the same
+content (see ParsedRequest.content_hash) share a single call of the handler.
+
+A handler marked as idempotent can also have its results reused for a short
+time after the call has finished:
+
+    from activeworkflow_agent.coalesce import idempotent
+
+    @idempotent(ttl=5)
+    def check(request):
+        ...
+
+The shared response is encoded once and the same bytes are sent to every
+client, so coalesced responses are never streamed.
+"""
+
+import asyncio
+import time
+
+
+MAX_CACHED = 256
+
+
+def idempotent(ttl):
+    """Mark a handler whose result can be reused for ttl seconds.
+
+    The result is reused for requests with the same content only.
+    """
+
+    def decorator(handler):
+        handler.idempotent_ttl = ttl
+        return handler
+
+    return decorator
+
+
+class SingleFlight:
+    """Shares the result of a call between identical concurrent requests."""
+
+    def __init__(self, ttl=0, clock=time.monotonic):
+        """Create a SingleFlight object.
+
+        Parameters
+        ----------
+        ttl : float
+            The number of seconds a result is reused after the call has
+            finished. Results are only shared by concurrent requests when
+            it is 0.
+        clock : callable
+            Returns the current time in seconds.
+        """
+        self.ttl = ttl
+        self.clock = clock
+        self.calls = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+        self._inflight = {}
+        # Maps keys to (result, expiry time) tuples.
+        self._cache = {}
+
+    async def run(self, key, call):
+        """Returns the result of call(), shared by the callers with a key.
+
+        Parameters
+        ----------
+        key : hashable
+            Identifies the request.
+        call : coroutine function
+            Called without arguments to get the result.
+        """
+        if self.ttl:
+            entry = self._cache.get(key)
+            if entry is not None:
+                if entry[1] > self.clock():
+                    self.cache_hits += 1
+                    return entry[0]
+                del self._cache[key]
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+        self.calls += 1
+        task = asyncio.ensure_future(self._call(key, call))
+        self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _call(self, key, call):
+        try:
+            result = await call()
+        finally:
+            del self._inflight[key]
+        if self.ttl:
+            self._store(key, result)
+        return result
+
+    def _store(self, key, result):
+        now = self.clock()
+        if len(self._cache) >= MAX_CACHED:
+            expired = [k for k, (_, e) in self._cache.items() if e <= now]
+            for k in expired:
+                del self._cache[k]
+            if len(self._cache) >= MAX_CACHED:
+                # Drop the oldest result.
+                del self._cache[next(iter(self._cache))]
+        self._cache[key] = (result, now + self.ttl)
@@ -0,0 +1,209 @@
+"""Pluggable JSON encoding and decoding.
+
+The fastest available backend is selected automatically, in this order:
+orjson, msgspec, ujson and finally the standard library's json module. Set
+the ACTIVEWORKFLOW_AGENT_JSON environment variable to the name of a backend,
+or call set_codec(), to use a specific one.
+
+All backends produce compact UTF-8 encoded JSON (no whitespace, non-ASCII
+characters are not escaped) and decode the same documents to the same Python
+objects. Where a fast backend can not encode a value (for example an integer
+that does not fit in 64 bits) encoding falls back to the standard library.
+The output of different backends can still differ in insignificant ways, for
+example 1e16 may be written as 1e+16.
+
+Backends are imported when the first codec is created, not when this module
+is imported.
+"""
+
+import os
+
+
+ENV_VARIABLE = "ACTIVEWORKFLOW_AGENT_JSON"
+PREFERENCE = ("orjson", "msgspec", "ujson", "stdlib")
+
+
+class Codec:
+    """A JSON backend."""
+
+    def __init__(self, name, dumps, loads):
+        """Create a Codec object.
+
+        Parameters
+        ----------
+        name : str
+            The name of the backend.
+        dumps : callable
+            Encodes an object to JSON bytes.
+        loads : callable
+            Decodes JSON from bytes, bytearray or memoryview.
+        """
+        self.name = name
+        self._dumps = dumps
+        self._loads = loads
+
+    def dumps(self, obj):
+        """Returns the compact JSON encoding of obj as UTF-8 bytes."""
+        try:
+            return self._dumps(obj)
+        except (TypeError, OverflowError, ValueError):
+            if self._dumps is _stdlib_dumps:
+                raise
+            return _stdlib_dumps(obj)
+
+    def loads(self, data):
+        """Decodes a JSON document from bytes, bytearray, memoryview or str.
+
+        Raises ValueError if the document is not valid JSON.
+        """
+        try:
+            return self._loads(data)
+        except ValueError:
+            # Report errors consistently with the standard library.
+            if self._loads is _stdlib_loads:
+                raise
+            return _stdlib_loads(data)
+
+    def __repr__(self):
+        return "Codec({!r})".format(self.name)
+
+
+def _stdlib_dumps(obj):
+    import json
+
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode(
+        "utf-8"
+    )
+
+
+def _stdlib_loads(data):
+    import json
+
+    if isinstance(data, memoryview):
+        # Decoding the view directly saves copying it to bytes first.
+        data = str(data, "utf-8")
+    return json.loads(data)
+
+
+def _stdlib():
+    return Codec("stdlib", _stdlib_dumps, _stdlib_loads)
+
+
+def _orjson():
+    import orjson
+
+    option = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj):
+        return orjson.dumps(obj, option=option)
+
+    return Codec("orjson", dumps, orjson.loads)
+
+
+def _msgspec():
+    import msgspec
+
+    encoder = msgspec.json.Encoder()
+    decoder = msgspec.json.Decoder()
+
+    def loads(data):
+        try:
+            return decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+
+    def dumps(obj):
+        try:
+            return encoder.encode(obj)
+        except msgspec.EncodeError as e:
+            raise TypeError(str(e)) from e
+
+    return Codec("msgspec", dumps, loads)
+
+
+def _ujson():
+    import ujson
+
+    def dumps(obj):
+        return ujson.dumps(
+            obj, ensure_ascii=False, escape_forward_slashes=False
+        ).encode("utf-8")
+
+    def loads(data):
+        if isinstance(data, memoryview):
+            data = bytes(data)
+        return ujson.loads(data)
+
+    return Codec("ujson", dumps, loads)
+
+
+_FACTORIES = {
+    "orjson": _orjson,
+    "msgspec": _msgspec,
+    "ujson": _ujson,
+    "stdlib": _stdlib,
+}
+_codecs = {}
+_default = None
+
+
+def get_codec(name=None):
+    """Returns a Codec.
+
+    Parameters
+    ----------
+    name : str, optional
+        The name of the backend: 'orjson', 'msgspec', 'ujson' or 'stdlib'.
+        When omitted the default codec is returned.
+
+    Raises ImportError if the backend is not installed.
+    """
+    if name is None:
+        return _default or _select_default()
+    if name not in _FACTORIES:
+        raise ValueError("Unknown JSON backend: {!r}".format(name))
+    if name not in _codecs:
+        _codecs[name] = _FACTORIES[name]()
+    return _codecs[name]
+
+
+def available_codecs():
+    """Returns the names of the installed backends, fastest first."""
+    names = []
+    for name in PREFERENCE:
+        try:
+            get_codec(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def set_codec(name):
+    """Select the default backend by name; None restores auto-selection."""
+    global _default
+    _default = None if name is None else get_codec(name)
+
+
+def _select_default():
+    global _default
+    name = os.environ.get(ENV_VARIABLE)
+    if name:
+        _default = get_codec(name)
+        return _default
+    for name in PREFERENCE:
+        try:
+            _default = get_codec(name)
+        except ImportError:
+            continue
+        return _default
+
+
+def dumps(obj):
+    """Encodes obj with the default codec; returns bytes."""
+    return get_codec().dumps(obj)
+
+
+def loads(data):
+    """Decodes data with the default codec."""
+    return get_codec().loads(data)
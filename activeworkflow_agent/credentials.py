@@ -0,0 +1,97 @@
+"""Indexed access to the credentials sent with a request.
+
+ActiveWorkflow sends credentials as a list of {"name": ..., "value": ...}
+dicts. Credentials maps the names to the values, so that looking a credential
+up does not need a linear scan of the list.
+"""
+
+import re
+from collections.abc import Mapping
+
+
+_CREDENTIAL_TAG = re.compile(r"{%\s*credential\s+([^\s%]+)\s*%}")
+
+_interned = {}
+MAX_INTERNED = 256
+
+
+class Credentials(Mapping):
+    """A read-only mapping of credential names to values."""
+
+    __slots__ = ("_values",)
+
+    def __init__(self, credentials=()):
+        """Create a Credentials object.
+
+        Parameters
+        ----------
+        credentials : list
+            A list of dicts with the 'name' and 'value' of each credential, as
+            sent by ActiveWorkflow. When a name is repeated the first
+            credential with the name is used.
+        """
+        values = {}
+        for credential in credentials:
+            values.setdefault(credential["name"], credential["value"])
+        self._values = values
+
+    @classmethod
+    def interned(cls, credentials):
+        """Returns a Credentials object shared by equal credential lists.
+
+        Agents usually receive the same credentials with every request, so
+        the index built for the first request is reused for the following
+        ones. Interned objects must not be modified.
+        """
+        try:
+            key = tuple((c["name"], c["value"]) for c in credentials)
+            hash(key)
+        except TypeError:
+            return cls(credentials)
+        return cls._interned(key, lambda: credentials)
+
+    @classmethod
+    def _interned(cls, key, get_credentials):
+        index = _interned.get(key)
+        if index is None:
+            index = cls(get_credentials())
+            if len(_interned) >= MAX_INTERNED:
+                _interned.clear()
+            _interned[key] = index
+        return index
+
+    def __getitem__(self, name):
+        return self._values[name]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return "Credentials({!r})".format(sorted(self._values))
+
+    def resolve(self, value):
+        """Replace '{% credential name %}' tags with credential values.
+
+        Parameters
+        ----------
+        value : object
+            A string, or a dict or list (for example the options of an
+            agent) whose strings are resolved recursively. Other values are
+            returned unchanged.
+
+        Raises KeyError when a tag refers to an unknown credential.
+        """
+        if isinstance(value, str):
+            if "{%" not in value:
+                return value
+            return _CREDENTIAL_TAG.sub(
+                lambda match: str(self[match.group(1)]), value
+            )
+        if isinstance(value, dict):
+            return {key: self.resolve(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.resolve(item) for item in value]
+        return value
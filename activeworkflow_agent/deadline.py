@@ -0,0 +1,86 @@
+"""Deadlines for the handlers of an agent.
+
+ActiveWorkflow gives up on a request that takes too long, and the work done
+by the handler so far is lost. With AgentServer(deadlines=...) each 'check'
+or 'receive' request gets a Deadline, available to its handler as
+request.deadline. A handler that attaches its response to the deadline
+still has it sent if the deadline expires, with an error saying that it is
+partial:
+
+    async def check(request):
+        response = request.deadline.attach(aw.CheckResponse())
+        for url in request.options["urls"]:
+            response.add_messages(await fetch(url))
+        return response
+
+When the deadline expires, coroutine handlers are cancelled (they receive
+asyncio.CancelledError at their next await). Handlers running in threads or
+processes cannot be interrupted: the response is sent without waiting for
+them, and they should call request.deadline.check() regularly to stop
+working once it is too late. In a ProcessPool worker request.deadline is a
+copy of the deadline: a response attached to it is not sent, so a handler
+run in a process gets an empty partial response when it is too slow.
+"""
+
+import time
+
+from activeworkflow_agent import Response
+
+
+class DeadlineExceeded(Exception):
+    """Raised by Deadline.check() once the deadline has expired."""
+
+
+class Deadline:
+    """The time by which the response to a request has to be sent."""
+
+    __slots__ = ("timeout", "expires_at", "response", "clock")
+
+    def __init__(self, timeout, clock=time.monotonic):
+        """Create a Deadline object.
+
+        Parameters
+        ----------
+        timeout : float
+            The number of seconds from now until the deadline.
+        clock : callable
+            Returns the current time in seconds.
+        """
+        self.timeout = timeout
+        self.expires_at = clock() + timeout
+        self.response = None
+        self.clock = clock
+
+    def remaining(self):
+        """The number of seconds left, 0 when the deadline has expired."""
+        return max(0.0, self.expires_at - self.clock())
+
+    @property
+    def expired(self):
+        return self.clock() >= self.expires_at
+
+    def check(self):
+        """Raise DeadlineExceeded if the deadline has expired."""
+        if self.expired:
+            raise DeadlineExceeded(
+                "The deadline of {} seconds has expired.".format(self.timeout)
+            )
+
+    def attach(self, response):
+        """Set the response sent if the deadline expires, and return it."""
+        self.response = response
+        return response
+
+    def partial_response(self):
+        """Returns the encoded response to send once the deadline expired.
+
+        It is the attached response (or an empty one) with an error added.
+        """
+        response = self.response
+        if response is None:
+            response = Response()
+        response.add_errors(
+            "The agent did not finish within {} seconds; the response is "
+            "partial.".format(self.timeout)
+        )
+        return response.to_bytes()
@@ -0,0 +1,277 @@
+"""Execution policies for the handlers of an agent.
+
+By default AgentServer awaits coroutine handlers in the event loop and runs
+plain functions in the loop's default thread pool. An execution policy picks
+where a handler runs instead:
+
+    * Inline - in the event loop. Plain functions block the loop while they
+      run, so this only suits handlers that return quickly.
+    * ThreadPool - in a dedicated pool of threads, for blocking handlers.
+    * ProcessPool - in a pool of worker processes, for CPU-heavy handlers
+      that would otherwise hold the GIL.
+
+Policies are given to AgentServer for all handlers or per method:
+
+    from activeworkflow_agent.execution import ProcessPool
+
+    server = AgentServer(register, receive=receive,
+                         execution={"receive": ProcessPool(4, max_queue=16)})
+
+ThreadPool and ProcessPool accept a bounded number of requests (running and
+waiting); further requests raise Overloaded, which the server reports with a
+503 response instead of queueing them. Pools are created on first use, so a
+server can be preloaded and forked before they start. When a worker process
+dies (killed for using too much memory, for example), the requests it had
+fail and the next request starts a new pool of processes.
+"""
+
+import asyncio
+import concurrent.futures
+import inspect
+import logging
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+from activeworkflow_agent import ParsedRequest, Response
+from activeworkflow_agent.deadline import Deadline
+
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """Raised when a policy cannot accept more requests."""
+
+
+class ExecutionPolicy:
+    """Runs handlers. Subclasses implement run()."""
+
+    async def run(self, handler, request):
+        """Run handler with request and return the result."""
+        raise NotImplementedError
+
+    def shutdown(self, wait=True):
+        """Release the resources of the policy."""
+
+
+class Inline(ExecutionPolicy):
+    """Runs handlers in the event loop."""
+
+    async def run(self, handler, request):
+        result = handler(request)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+
+class _Pool(ExecutionPolicy):
+    def __init__(self, max_workers=None, max_queue=None):
+        if max_workers is not None and max_workers < 1:
+            raise ValueError("max_workers must be a positive integer.")
+        if max_queue is not None and max_queue < 0:
+            raise ValueError("max_queue must not be negative.")
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        # The number of workers, known once the executor is created.
+        self.workers = None
+        self.pending = 0
+        self._executor = None
+
+    async def _submit(self, fn, *args):
+        if self._executor is None:
+            self._start()
+        if self.max_queue is not None:
+            # The requests being run plus the ones waiting for a worker.
+            limit = self.workers + self.max_queue
+            if self.pending >= limit:
+                raise Overloaded("{} requests pending.".format(self.pending))
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BrokenProcessPool:
+            # A worker died since the last request was answered.
+            self._replace(self._executor)
+            future = self._executor.submit(fn, *args)
+        executor = self._executor
+        self.pending += 1
+        # Requests stay pending until they have run, even when the caller
+        # stops waiting for them (for example when a deadline expires).
+        # The requests of a broken pool fail, so they are counted too.
+        future.add_done_callback(
+            lambda _: _call_soon_threadsafe(loop, self._finished)
+        )
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            self._replace(executor)
+            raise
+
+    def _finished(self):
+        self.pending -= 1
+
+    def _start(self):
+        self.workers = self.max_workers or self._default_workers()
+        self._executor = self._create_executor(self.workers)
+
+    def _replace(self, executor):
+        """Replace a broken executor, unless that was done already."""
+        if self._executor is not executor:
+            return
+        logger.warning("A worker process died; starting new workers")
+        executor.shutdown(wait=False)
+        self._start()
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def _default_workers(self):
+        raise NotImplementedError
+
+    def _create_executor(self, workers):
+        raise NotImplementedError
+
+
+class ThreadPool(_Pool):
+    """Runs plain function handlers in a dedicated pool of threads.
+
+    Coroutine functions are awaited in the event loop.
+    """
+
+    def __init__(self, max_workers=None, max_queue=None):
+        """Create a ThreadPool object.
+
+        Parameters
+        ----------
+        max_workers : int, optional
+            The number of threads; the number of CPUs plus 4, at most 32,
+            when omitted (the default of ThreadPoolExecutor).
+        max_queue : int, optional
+            The number of requests that can wait for a free thread. Requests
+            above the limit raise Overloaded. Unbounded when omitted.
+        """
+        super().__init__(max_workers, max_queue)
+
+    async def run(self, handler, request):
+        if asyncio.iscoroutinefunction(handler):
+            return await handler(request)
+        result = await self._submit(handler, request)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    def _default_workers(self):
+        return min(32, (os.cpu_count() or 1) + 4)
+
+    def _create_executor(self, workers):
+        return concurrent.futures.ThreadPoolExecutor(
+            workers, thread_name_prefix="agent-handler"
+        )
+
+
+class ProcessPool(_Pool):
+    """Runs handlers in a pool of worker processes.
+
+    Handlers must be picklable, that is defined at the top level of a
+    module. The request is sent to the worker as a tuple of its fields (or
+    the raw body of a LazyParsedRequest) and the response comes back
+    encoded as JSON, so it is pickled as a single bytes object. As a
+    result, responses of handlers run in a process are never streamed.
+    The deadline of the request, if any, is sent as the time remaining and
+    request.deadline is a new Deadline in the worker: its check() method
+    works, but a response attached to it is not sent.
+    Coroutine function handlers are run with asyncio.run() in the worker.
+    """
+
+    def __init__(self, max_workers=None, max_queue=None, mp_context=None):
+        """Create a ProcessPool object.
+
+        Parameters
+        ----------
+        max_workers : int, optional
+            The number of worker processes; the number of CPUs when omitted.
+        max_queue : int, optional
+            The number of requests that can wait for a free worker. Requests
+            above the limit raise Overloaded. Unbounded when omitted.
+        mp_context : multiprocessing context, optional
+            The context used to start the workers.
+        """
+        super().__init__(max_workers, max_queue)
+        self.mp_context = mp_context
+
+    async def run(self, handler, request):
+        return await self._submit(_run_packed, handler, _pack(request))
+
+    def _default_workers(self):
+        return os.cpu_count() or 1
+
+    def _create_executor(self, workers):
+        return concurrent.futures.ProcessPoolExecutor(
+            workers, mp_context=self.mp_context
+        )
+
+
+def _call_soon_threadsafe(loop, callback):
+    try:
+        loop.call_soon_threadsafe(callback)
+    except RuntimeError:
+        # The loop is closed, so it does not run callbacks any more.
+        callback()
+
+
+def _pack(request):
+    """Returns (fields, deadline) where deadline is (timeout, remaining)."""
+    deadline = request.deadline
+    if deadline is not None:
+        deadline = (deadline.timeout, deadline.remaining())
+    data = getattr(request, "_data", None)
+    if data is not None:
+        return (bytes(data),), deadline
+    fields = (
+        request.method,
+        request.options,
+        request.memory,
+        request.credentials,
+        request.message,
+    )
+    return fields, deadline
+
+
+def _unpack(packed):
+    fields, deadline = packed
+    if len(fields) == 1:
+        request = ParsedRequest.from_bytes(fields[0], lazy=True)
+    else:
+        request = ParsedRequest.__new__(ParsedRequest)
+        (
+            request.method,
+            request.options,
+            request.memory,
+            request.credentials,
+            request.message,
+        ) = fields
+    if deadline is not None:
+        timeout, remaining = deadline
+        request.deadline = Deadline(timeout)
+        # The time spent sending the request counts against the deadline.
+        request.deadline.expires_at -= timeout - remaining
+    return request
+
+
+def _run_packed(handler, packed):
+    """Runs in a worker process: returns the encoded response."""
+    result = handler(_unpack(packed))
+    if inspect.isawaitable(result) or (
+        isinstance(result, Response) and result._sources
+    ):
+        return asyncio.run(_encode(result))
+    return result.to_bytes()
+
+
+async def _encode(result):
+    if inspect.isawaitable(result):
+        result = await result
+    if isinstance(result, Response) and result._sources:
+        return b"".join([chunk async for chunk in result.aiter_chunks()])
+    return result.to_bytes()
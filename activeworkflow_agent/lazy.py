@@ -0,0 +1,298 @@
+"""Lazy decoding of requests from ActiveWorkflow.
+
+A LazyParsedRequest keeps the raw body of a request and, when it is created,
+only locates the options, memory, credentials and message in it. Each of them
+is decoded the first time it is accessed and the result is cached, so a
+handler that never looks at a large memory does not pay for decoding it.
+
+The body is scanned with msgspec when it is installed (it validates the JSON
+without building any Python objects for the fields); otherwise a pure Python
+scanner is used. The pure Python scanner is fast for fields made of a few
+large values but can be slower than decoding a field made of many small
+objects, so install msgspec to use lazy requests. With the pure Python
+scanner, malformed JSON inside a field is only reported (as ValueError) when
+that field is accessed.
+"""
+
+import re
+
+from activeworkflow_agent import ParsedRequest, _digest, codec
+from activeworkflow_agent.credentials import Credentials
+
+
+_FIELDS = ("options", "memory", "credentials", "message")
+
+_WHITESPACE = re.compile(rb"[ \t\n\r]*")
+_STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+# Everything up to the next bracket that is not part of a string.
+_UNTIL_BRACKET = re.compile(
+    rb'[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*', re.DOTALL
+)
+_SCALAR = re.compile(rb"[^,\]}\s]+")
+
+
+class _LazyField:
+    """Decodes a field on first access and caches it in ParsedRequest's slot."""
+
+    def __init__(self, name, default):
+        self.name = name
+        self.default = default
+        self.slot = ParsedRequest.__dict__[name]
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        try:
+            return self.slot.__get__(instance, owner)
+        except AttributeError:
+            pass
+        raw = instance._raw.get(self.name)
+        if raw is None:
+            value = self.default()
+        else:
+            value = codec.loads(raw)
+        self.slot.__set__(instance, value)
+        # Read it back, as ParsedRequest.memory decompresses on access.
+        return self.slot.__get__(instance, owner)
+
+    def __set__(self, instance, value):
+        self.slot.__set__(instance, value)
+
+    def is_decoded(self, instance):
+        try:
+            self.slot.__get__(instance, type(instance))
+        except AttributeError:
+            return False
+        return True
+
+
+class LazyParsedRequest(ParsedRequest):
+    """A ParsedRequest that decodes its fields on first access."""
+
+    __slots__ = ("_data", "_raw")
+
+    options = _LazyField("options", dict)
+    memory = _LazyField("memory", dict)
+    credentials = _LazyField("credentials", list)
+    message = _LazyField("message", lambda: None)
+
+    def __init__(self, data):
+        """Create a LazyParsedRequest object.
+
+        Parameters
+        ----------
+        data : bytes, bytearray or memoryview
+            The JSON encoded request received from ActiveWorkflow's API. It
+            must not be modified while the request is in use.
+
+        The attributes are the same as those of ParsedRequest. A KeyError is
+        raised if the request lacks a parameter its method requires, as
+        ParsedRequest does.
+        """
+        self._data = data
+        self.method, params = _scan(data)
+        self._raw = {}
+        if self.method in ("check", "receive"):
+            for name in ("options", "memory", "credentials"):
+                self._raw[name] = params[name]
+        if self.method == "receive":
+            self._raw["message"] = params["message"]
+
+    @property
+    def credentials_index(self):
+        """See ParsedRequest.credentials_index.
+
+        Interned indexes are looked up by the raw JSON of the credentials, so
+        the credentials are not decoded when an index is found.
+        """
+        try:
+            return self._credentials_index
+        except AttributeError:
+            pass
+        raw = self._raw.get("credentials")
+        if self.intern_credentials and raw is not None:
+            index = Credentials._interned(
+                bytes(raw), lambda: self.credentials
+            )
+            self._credentials_index = index
+            return index
+        return super().credentials_index
+
+    @property
+    def options_hash(self):
+        """See ParsedRequest.options_hash.
+
+        The hash is computed from the raw JSON of the options as received,
+        without decoding them. It can therefore differ from the hash of the
+        same options in a ParsedRequest.
+        """
+        raw = self._raw.get("options")
+        if raw is None:
+            return super().options_hash
+        return _digest(raw)
+
+    def _memory_size(self):
+        raw = self._raw.get("memory")
+        return None if raw is None else len(raw)
+
+    @property
+    def content_hash(self):
+        """See ParsedRequest.content_hash.
+
+        The hash is computed from the raw body of the request, without
+        decoding it.
+        """
+        return _digest(self._data)
+
+    @property
+    def decoded_fields(self):
+        """The names of the fields that have been decoded so far."""
+        cls = type(self)
+        return [
+            name for name in _FIELDS if getattr(cls, name).is_decoded(self)
+        ]
+
+
+def _scan(data):
+    """Returns the method and a dict with the raw fields of a request.
+
+    The raw message is the message's payload.
+    """
+    if _msgspec_scan is not None:
+        return _msgspec_scan(data)
+    return _python_scan(data)
+
+
+def _python_scan(data):
+    view = memoryview(data)
+    members = _object_members(data, _skip_whitespace(data, 0), top=True)
+    if "method" not in members:
+        raise KeyError("method")
+    method = codec.loads(view[slice(*members["method"])])
+    params = {}
+    if "params" in members and data[members["params"][0]] == 0x7B:
+        spans = _object_members(data, members["params"][0])
+        message = spans.pop("message", None)
+        if message is not None and data[message[0]] == 0x7B:
+            message = _object_members(data, message[0])
+            if "payload" in message:
+                spans["message"] = message["payload"]
+        for name in _FIELDS:
+            if name in spans:
+                params[name] = view[slice(*spans[name])]
+    return method, params
+
+
+def _object_members(data, pos, top=False):
+    """Returns the spans of the values of the JSON object starting at pos."""
+    if data[pos : pos + 1] != b"{":
+        raise ValueError("Expecting an object at {}".format(pos))
+    members = {}
+    pos = _skip_whitespace(data, pos + 1)
+    if data[pos : pos + 1] == b"}":
+        end = pos + 1
+    else:
+        while True:
+            match = _STRING.match(data, pos)
+            if match is None:
+                raise ValueError("Expecting a key at {}".format(pos))
+            key = match.group()
+            key = codec.loads(key) if b"\\" in key else key[1:-1].decode()
+            pos = _skip_whitespace(data, match.end())
+            if data[pos : pos + 1] != b":":
+                raise ValueError("Expecting ':' at {}".format(pos))
+            start = _skip_whitespace(data, pos + 1)
+            end = _skip_value(data, start)
+            members[key] = (start, end)
+            pos = _skip_whitespace(data, end)
+            delimiter = data[pos : pos + 1]
+            pos = _skip_whitespace(data, pos + 1)
+            if delimiter == b"}":
+                end = pos
+                break
+            if delimiter != b",":
+                raise ValueError("Expecting ',' or '}}' at {}".format(pos))
+    if top and end != len(data):
+        raise ValueError("Extra data at {}".format(end))
+    return members
+
+
+def _skip_whitespace(data, pos):
+    return _WHITESPACE.match(data, pos).end()
+
+
+def _skip_value(data, pos):
+    """Returns the position after the JSON value starting at pos."""
+    first = data[pos : pos + 1]
+    if first == b'"':
+        match = _STRING.match(data, pos)
+    elif first in (b"{", b"["):
+        depth = 0
+        end = len(data)
+        while pos < end:
+            token = data[pos]
+            if token in (0x7B, 0x5B):
+                depth += 1
+            elif token in (0x7D, 0x5D):
+                depth -= 1
+                if depth == 0:
+                    return pos + 1
+            else:
+                break
+            pos = _UNTIL_BRACKET.match(data, pos + 1).end()
+        match = None
+    else:
+        match = _SCALAR.match(data, pos)
+    if match is None:
+        raise ValueError("Invalid value at {}".format(pos))
+    return match.end()
+
+
+def _make_msgspec_scan():
+    try:
+        import msgspec
+    except ImportError:
+        return None
+    from typing import Optional
+
+    # An empty Raw marks a missing member; JSON null is a non-empty Raw.
+    missing = msgspec.Raw()
+
+    class Message(msgspec.Struct):
+        payload: msgspec.Raw = missing
+
+    class Params(msgspec.Struct):
+        options: msgspec.Raw = missing
+        memory: msgspec.Raw = missing
+        credentials: msgspec.Raw = missing
+        message: msgspec.Raw = missing
+
+    class Request(msgspec.Struct):
+        method: msgspec.Raw = missing
+        params: Optional[Params] = None
+
+    def scan(data):
+        try:
+            request = msgspec.json.decode(data, type=Request)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+        if not request.method:
+            raise KeyError("method")
+        method = codec.loads(memoryview(request.method))
+        params = {}
+        if request.params is not None:
+            for name in _FIELDS:
+                raw = getattr(request.params, name)
+                if raw:
+                    params[name] = memoryview(raw)
+            message = params.pop("message", None)
+            if message is not None and message[:1] == b"{":
+                payload = msgspec.json.decode(message, type=Message).payload
+                if payload:
+                    params["message"] = memoryview(payload)
+        return method, params
+
+    return scan
+
+
+_msgspec_scan = _make_msgspec_scan()
@@ -0,0 +1,143 @@
+"""Limits on the logs and errors of a response.
+
+By default a Response keeps every log entry and error added to it. An agent
+that logs in a loop can thus build a response of any size. To bound them,
+set the log_limits and error_limits class attributes of Response:
+
+    aw.Response.log_limits = EntryLimits(max_entries=100, max_bytes=65536)
+
+When a limit is reached the oldest entries are dropped (or the newest ones,
+with keep='first') and a summary entry saying how many were dropped is added
+when the response is serialised.
+"""
+
+
+class EntryLimits:
+    """Limits on the number and size of log entries or errors."""
+
+    __slots__ = ("max_entries", "max_entry_length", "max_bytes", "keep")
+
+    def __init__(
+        self,
+        max_entries=None,
+        max_entry_length=None,
+        max_bytes=None,
+        keep="last",
+    ):
+        """Create an EntryLimits object.
+
+        Parameters
+        ----------
+        max_entries : int, optional
+            The maximum number of entries kept.
+        max_entry_length : int, optional
+            The maximum length (in characters) of an entry. Longer entries
+            are shortened.
+        max_bytes : int, optional
+            The maximum total size (in UTF-8 encoded bytes) of the entries.
+        keep : str
+            Which entries are kept when there are too many: the 'last' ones
+            (the oldest entries are dropped) or the 'first' ones (further
+            entries are dropped).
+        """
+        if keep not in ("first", "last"):
+            raise ValueError("keep must be 'first' or 'last'.")
+        for name, value in (
+            ("max_entries", max_entries),
+            ("max_entry_length", max_entry_length),
+            ("max_bytes", max_bytes),
+        ):
+            if value is not None and value < 1:
+                raise ValueError("{} must be a positive integer.".format(name))
+        self.max_entries = max_entries
+        self.max_entry_length = max_entry_length
+        self.max_bytes = max_bytes
+        self.keep = keep
+
+
+class BoundedEntries:
+    """Log entries or errors kept within EntryLimits."""
+
+    __slots__ = ("limits", "noun", "dropped", "_entries", "_bytes")
+
+    def __init__(self, limits, noun):
+        """Create a BoundedEntries object.
+
+        Parameters
+        ----------
+        limits : EntryLimits
+            The limits to keep the entries within.
+        noun : tuple of str
+            The singular and plural nouns for the entries, used in the
+            summary of the dropped entries.
+        """
+        self.limits = limits
+        self.noun = noun
+        self.dropped = 0
+        from collections import deque
+
+        self._entries = deque()
+        self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries) + (1 if self.dropped else 0)
+
+    def extend(self, entries):
+        for entry in entries:
+            self.append(entry)
+
+    def append(self, entry):
+        limits = self.limits
+        if (
+            limits.max_entry_length is not None
+            and len(entry) > limits.max_entry_length
+        ):
+            entry = "{}... ({} characters truncated)".format(
+                entry[: limits.max_entry_length],
+                len(entry) - limits.max_entry_length,
+            )
+        size = 0 if limits.max_bytes is None else _size(entry)
+        if limits.keep == "first":
+            if (
+                limits.max_entries is not None
+                and len(self._entries) >= limits.max_entries
+            ) or (
+                limits.max_bytes is not None
+                and self._bytes + size > limits.max_bytes
+            ):
+                self.dropped += 1
+                return
+            self._entries.append(entry)
+            self._bytes += size
+            return
+        # Keep the last entries: a ring buffer.
+        self._entries.append(entry)
+        self._bytes += size
+        while self._entries and (
+            (
+                limits.max_entries is not None
+                and len(self._entries) > limits.max_entries
+            )
+            or (limits.max_bytes is not None and self._bytes > limits.max_bytes)
+        ):
+            oldest = self._entries.popleft()
+            if limits.max_bytes is not None:
+                self._bytes -= _size(oldest)
+            self.dropped += 1
+
+    def to_list(self):
+        """Returns the entries, with a summary of the dropped ones."""
+        entries = list(self._entries)
+        if self.dropped:
+            summary = "{} {} dropped to keep the response small.".format(
+                self.dropped, self.noun[self.dropped != 1]
+            )
+            if self.limits.keep == "first":
+                entries.append(summary)
+            else:
+                entries.insert(0, summary)
+        return entries
+
+
+def _size(entry):
+    return len(entry.encode("utf-8"))
@@ -0,0 +1,115 @@
+"""Compressed encoding of the memory of an agent.
+
+Agents that remember what they have seen send an ever-growing memory with
+every response and receive it back with every request. A MemoryCodec stores
+large memories as a single compressed string instead:
+
+    {"_aw_memory": "1:zlib:eJyrVkrLz1eyUkpKLFKqBQAe1wQz"}
+
+To compress the memory of all responses, set the memory_codec class attribute
+of Response:
+
+    aw.Response.memory_codec = MemoryCodec(threshold=4096)
+
+Memories whose JSON is smaller than the threshold are sent unchanged.
+ParsedRequest decodes compressed memories transparently when its memory is
+first accessed, whether or not a codec is set.
+"""
+
+from activeworkflow_agent import codec
+
+
+RESERVED_KEY = "_aw_memory"
+VERSION = "1"
+
+# The compression modules, imported when first used, and their exceptions.
+_COMPRESSORS = {"zlib": "error", "lzma": "LZMAError"}
+
+
+def _module(algorithm):
+    return __import__(algorithm)
+
+
+class MemoryCodec:
+    """Encodes memories as compressed strings."""
+
+    __slots__ = ("threshold", "algorithm", "level", "_compress")
+
+    def __init__(self, threshold=4096, algorithm="zlib", level=None):
+        """Create a MemoryCodec object.
+
+        Parameters
+        ----------
+        threshold : int
+            Memories whose JSON is smaller than this (in bytes) are not
+            compressed.
+        algorithm : str
+            'zlib' (fast) or 'lzma' (smaller, but several times slower).
+        level : int, optional
+            The compression level (zlib) or preset (lzma); the default of
+            the algorithm when omitted.
+        """
+        if algorithm not in _COMPRESSORS:
+            raise ValueError(
+                "Unknown compression algorithm: {!r}.".format(algorithm)
+            )
+        self.threshold = threshold
+        self.algorithm = algorithm
+        self.level = level
+        compress = _module(algorithm).compress
+        if level is None:
+            self._compress = compress
+        elif algorithm == "zlib":
+            self._compress = lambda data: compress(data, level)
+        else:
+            self._compress = lambda data: compress(data, preset=level)
+
+    def encode(self, memory):
+        """Returns the memory, compressed if it is large enough."""
+        data = codec.dumps(memory)
+        if len(data) < self.threshold:
+            return memory
+        return {RESERVED_KEY: self._pack(data)}
+
+    def dumps(self, memory):
+        """Returns the JSON of the memory, compressed if large enough."""
+        data = codec.dumps(memory)
+        if len(data) < self.threshold:
+            return data
+        return codec.dumps({RESERVED_KEY: self._pack(data)})
+
+    def _pack(self, data):
+        import base64
+
+        blob = base64.b64encode(self._compress(data)).decode("ascii")
+        return "{}:{}:{}".format(VERSION, self.algorithm, blob)
+
+
+def is_compressed(memory):
+    """Whether a memory was compressed by a MemoryCodec."""
+    return type(memory) is dict and len(memory) == 1 and RESERVED_KEY in memory
+
+
+def decode_memory(memory):
+    """Returns the memory, decompressed if it was compressed.
+
+    Raises ValueError when a compressed memory cannot be decoded.
+    """
+    if not is_compressed(memory):
+        return memory
+    try:
+        version, algorithm, blob = memory[RESERVED_KEY].split(":", 2)
+    except (AttributeError, ValueError):
+        raise ValueError("Invalid compressed memory.") from None
+    if version != VERSION or algorithm not in _COMPRESSORS:
+        raise ValueError(
+            "Unsupported compressed memory: {}:{}.".format(version, algorithm)
+        )
+    import base64
+
+    module = _module(algorithm)
+    try:
+        data = module.decompress(base64.b64decode(blob))
+    except (ValueError, getattr(module, _COMPRESSORS[algorithm])) as e:
+        raise ValueError("Invalid compressed memory: {}".format(e)) from e
+    return codec.loads(data)
@@ -0,0 +1,167 @@
+"""Metrics about the requests served by an agent.
+
+With AgentServer(metrics=True) the server records, for each method, how long
+requests take to parse, handle and serialise, the size of requests and
+responses and the number of messages sent. They are served in the Prometheus
+text format on GET /metrics.
+
+The histograms have fixed buckets and are only updated from the event loop,
+so recording a request costs a few additions.
+"""
+
+from activeworkflow_agent.stats import Histogram
+
+
+PREFIX = "activeworkflow_agent_"
+
+LATENCY_BUCKETS = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+    10.0,
+)
+SIZE_BUCKETS = tuple(256 * 4 ** n for n in range(10))
+MESSAGE_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+# Name, help and buckets of the histograms recorded for each method.
+HISTOGRAMS = (
+    ("parse_seconds", "Time spent parsing requests.", LATENCY_BUCKETS),
+    ("handle_seconds", "Time spent in handlers.", LATENCY_BUCKETS),
+    (
+        "serialize_seconds",
+        "Time spent serialising responses (for streamed responses, the "
+        "time spent encoding chunks, not waiting for the client).",
+        LATENCY_BUCKETS,
+    ),
+    ("request_bytes", "Size of request bodies.", SIZE_BUCKETS),
+    ("response_bytes", "Size of response bodies.", SIZE_BUCKETS),
+    (
+        "response_messages",
+        "Number of messages in responses.",
+        MESSAGE_BUCKETS,
+    ),
+)
+
+
+class Metrics:
+    """Per-method histograms and request counters."""
+
+    def __init__(self):
+        self.requests = {}
+        self._histograms = {name: {} for name, _, _ in HISTOGRAMS}
+        self._buckets = {name: buckets for name, _, buckets in HISTOGRAMS}
+
+    def observe(self, name, method, value):
+        """Record a value in the histogram called name for a method."""
+        histograms = self._histograms[name]
+        histogram = histograms.get(method)
+        if histogram is None:
+            histogram = histograms[method] = Histogram(self._buckets[name])
+        histogram.observe(value)
+
+    def count(self, method, status):
+        """Count a request by method and response status."""
+        key = (method, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+
+    def histogram(self, name, method):
+        """Returns a histogram, or None if nothing was recorded in it."""
+        return self._histograms[name].get(method)
+
+    def render(self, server=None):
+        """Returns the metrics in the Prometheus text format.
+
+        When server is given, the statistics of its batcher and single-flight
+        coalescing are included.
+        """
+        lines = [
+            "# HELP {}requests_total Requests served.".format(PREFIX),
+            "# TYPE {}requests_total counter".format(PREFIX),
+        ]
+        for (method, status), count in sorted(self.requests.items()):
+            lines.append(
+                '{}requests_total{{method="{}",status="{}"}} {}'.format(
+                    PREFIX, method, status, count
+                )
+            )
+        for name, description, _ in HISTOGRAMS:
+            _histogram_lines(
+                lines,
+                name,
+                description,
+                [
+                    ('method="{}"'.format(method), histogram)
+                    for method, histogram in sorted(
+                        self._histograms[name].items()
+                    )
+                ],
+            )
+        if server is not None:
+            _server_lines(lines, server)
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _histogram_lines(lines, name, description, histograms):
+    name = PREFIX + name
+    lines.append("# HELP {} {}".format(name, description))
+    lines.append("# TYPE {} histogram".format(name))
+    for labels, histogram in histograms:
+        prefix = labels + "," if labels else ""
+        for bound, count in histogram.cumulative():
+            lines.append(
+                '{}_bucket{{{}le="{}"}} {}'.format(
+                    name, prefix, _number(bound), count
+                )
+            )
+        suffix = "{" + labels + "}" if labels else ""
+        lines.append(
+            "{}_sum{} {}".format(name, suffix, _number(histogram.sum))
+        )
+        lines.append("{}_count{} {}".format(name, suffix, histogram.count))
+
+
+def _server_lines(lines, server):
+    if server.batcher is not None:
+        _histogram_lines(
+            lines,
+            "batch_size",
+            "Number of requests in receive batches.",
+            [("", server.batcher.batch_sizes)],
+        )
+        _histogram_lines(
+            lines,
+            "batch_wait_seconds",
+            "Time requests waited for their receive batch.",
+            [("", server.batcher.wait_times)],
+        )
+    flight = server.single_flight
+    if flight is not None:
+        for name, description, value in (
+            ("check_calls_total", "Check handler calls.", flight.calls),
+            (
+                "check_coalesced_total",
+                "Check requests that shared a handler call.",
+                flight.coalesced,
+            ),
+            (
+                "check_cache_hits_total",
+                "Check requests answered from the idempotent cache.",
+                flight.cache_hits,
+            ),
+        ):
+            lines.append("# HELP {}{} {}".format(PREFIX, name, description))
+            lines.append("# TYPE {}{} counter".format(PREFIX, name))
+            lines.append("{}{} {}".format(PREFIX, name, value))
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
@@ -0,0 +1,159 @@
+"""Validation of agent options.
+
+A schema describes the options an agent accepts. It is a dict that maps the
+name of each option to an Option, or simply to the type (or tuple of types)
+of the option's value:
+
+    schema = {
+        "url": Option(str, required=True),
+        "mode": Option(str, choices=("all", "new")),
+        "limit": int,
+    }
+
+The schema is compiled once into an OptionsValidator. As the options of an
+agent rarely change from one request to the next, the validator remembers
+the result of validating each set of options it has seen.
+"""
+
+from activeworkflow_agent import codec
+
+
+_NUMBER = (int, float)
+MAX_CACHED = 256
+
+
+class Option:
+    """Describes a single option of an agent."""
+
+    __slots__ = ("types", "required", "choices", "check")
+
+    def __init__(self, types=None, required=False, choices=None, check=None):
+        """Create an Option object.
+
+        Parameters
+        ----------
+        types : type or tuple of types, optional
+            The accepted types of the option's value; any type when omitted.
+            An int is accepted where a float is.
+        required : bool
+            Whether the option must be set.
+        choices : collection, optional
+            The values the option can have.
+        check : callable, optional
+            Called with the option's value; returns an error message (str)
+            when the value is invalid and None otherwise.
+        """
+        if isinstance(types, type):
+            types = (types,)
+        if types is not None and float in types and int not in types:
+            types = tuple(types) + (int,)
+        self.types = types
+        self.required = required
+        self.choices = choices
+        self.check = check
+
+
+def infer_schema(default_options):
+    """Returns a schema that matches the types of the default options.
+
+    Every option with a default value other than None is required and must
+    have a value of the same type as the default (int and float are
+    interchangeable, bool is not).
+    """
+    schema = {}
+    for name, value in default_options.items():
+        if value is None:
+            schema[name] = Option()
+        elif isinstance(value, bool):
+            schema[name] = Option(bool, required=True)
+        elif isinstance(value, _NUMBER):
+            schema[name] = Option(_NUMBER, required=True)
+        else:
+            schema[name] = Option(type(value), required=True)
+    return schema
+
+
+class OptionsValidator:
+    """Validates options against a compiled schema."""
+
+    def __init__(self, schema):
+        """Create an OptionsValidator object.
+
+        Parameters
+        ----------
+        schema : dict
+            Maps option names to an Option or a type (or tuple of types).
+        """
+        self._checks = tuple(
+            (name, _compile(name, spec)) for name, spec in schema.items()
+        )
+        self._cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def validate(self, options):
+        """Returns a list with an error message for each invalid option."""
+        if not isinstance(options, dict):
+            return ["Options must be an object."]
+        errors = []
+        for name, check in self._checks:
+            error = check(options)
+            if error is not None:
+                errors.append(error)
+        return errors
+
+    def validate_request(self, request):
+        """Returns the errors of the options of a ParsedRequest.
+
+        Results are cached by the options' hash (see
+        ParsedRequest.options_hash). The returned list must not be modified.
+        """
+        key = request.options_hash
+        errors = self._cache.get(key)
+        if errors is not None:
+            self.hits += 1
+            return errors
+        self.misses += 1
+        errors = self.validate(request.options)
+        if len(self._cache) >= MAX_CACHED:
+            self._cache.clear()
+        self._cache[key] = errors
+        return errors
+
+
+def _compile(name, spec):
+    if not isinstance(spec, Option):
+        spec = Option(spec)
+    types = spec.types
+    required = spec.required
+    choices = spec.choices
+    extra_check = spec.check
+    if types is not None:
+        expected = " or ".join(t.__name__ for t in types)
+        # bool is a subclass of int but not a valid number option.
+        reject_bool = bool not in types
+
+    def check(options):
+        if name not in options:
+            if required:
+                return "Missing option '{}'.".format(name)
+            return None
+        value = options[name]
+        if types is not None and (
+            not isinstance(value, types)
+            or (reject_bool and isinstance(value, bool))
+        ):
+            return "Invalid option '{}': expected {}, got {}.".format(
+                name, expected, type(value).__name__
+            )
+        if choices is not None and value not in choices:
+            return "Invalid option '{}': must be one of {}.".format(
+                name, ", ".join(codec.dumps(c).decode() for c in choices)
+            )
+        if extra_check is not None:
+            error = extra_check(value)
+            if error is not None:
+                return "Invalid option '{}': {}".format(name, error)
+        return None
+
+    return check
@@ -0,0 +1,329 @@
+"""Prefork multi-process mode for the agent server.
+
+The parent process prepares an AgentServer once (see AgentServer.preload())
+and then forks a number of worker processes which serve requests on the same
+port. Everything prepared before forking, including the imported agent
+module, is shared copy-on-write by the workers.
+
+Where the platform supports SO_REUSEPORT every worker listens on its own
+socket and the kernel balances new connections between them. Otherwise the
+workers accept connections from a single listening socket created by the
+parent.
+
+The parent reacts to the following signals:
+
+    * SIGTERM, SIGINT - stop the workers gracefully and exit.
+    * SIGHUP - graceful restart: fork a new set of workers and gracefully
+      stop the old ones.
+
+Workers are replaced when they exit, which is also how they are recycled
+after serving max_requests requests or growing beyond max_rss bytes. A
+worker that fails to start serving (for example because it cannot listen
+on the port) would fail again if replaced: the parent then stops the other
+workers and run() raises RuntimeError.
+
+Prefork mode requires os.fork() and is therefore only available on POSIX
+systems.
+"""
+
+import asyncio
+import gc
+import logging
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import time
+
+
+logger = logging.getLogger(__name__)
+
+EXIT_RECYCLE = 3
+EXIT_BOOT_ERROR = 4
+
+
+class PreforkServer:
+    """Serve an AgentServer from several forked worker processes."""
+
+    def __init__(
+        self,
+        server,
+        workers=None,
+        host="0.0.0.0",
+        port=5000,
+        reuse_port=None,
+        max_requests=0,
+        max_requests_jitter=0,
+        max_rss=0,
+        graceful_timeout=30.0,
+    ):
+        """Create a PreforkServer object.
+
+        Parameters
+        ----------
+        server : AgentServer
+            The server run by each worker.
+        workers : int, optional
+            The number of worker processes; defaults to the number of CPUs.
+        host : str
+            The address to listen on.
+        port : int
+            The port to listen on. Port 0 picks a free port, which is then
+            available as the port attribute once run() has been called.
+        reuse_port : bool, optional
+            Give every worker its own SO_REUSEPORT socket. Defaults to True
+            where SO_REUSEPORT is available.
+        max_requests : int
+            Recycle a worker after it has handled this many requests; 0
+            disables recycling by request count.
+        max_requests_jitter : int
+            Add a random number of requests up to this value to max_requests
+            for each worker, so that workers are not all recycled at once.
+        max_rss : int
+            Recycle a worker once its resident set size exceeds this many
+            bytes; 0 disables recycling by memory usage.
+        graceful_timeout : float
+            Seconds a stopping worker is given to finish requests in flight
+            before it is killed.
+        """
+        if not hasattr(os, "fork"):
+            raise RuntimeError("Prefork mode requires os.fork().")
+        if reuse_port is None:
+            reuse_port = hasattr(socket, "SO_REUSEPORT")
+        if reuse_port and not hasattr(socket, "SO_REUSEPORT"):
+            raise ValueError("SO_REUSEPORT is not supported on this platform.")
+
+        self.server = server
+        self.workers = workers or os.cpu_count() or 1
+        self.host = host
+        self.port = port
+        self.reuse_port = reuse_port
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.max_rss = max_rss
+        self.graceful_timeout = graceful_timeout
+        self._socket = None
+        self._children = {}
+        self._stopping = {}
+        self._signals = []
+        self._boot_failed = False
+
+    def run(self):
+        """Fork the workers and supervise them until asked to stop."""
+        self.server.preload()
+        self._socket = self._bind()
+        self.port = self._socket.getsockname()[1]
+
+        wakeup_r, wakeup_w = os.pipe()
+        os.set_blocking(wakeup_r, False)
+        os.set_blocking(wakeup_w, False)
+        old_wakeup_fd = signal.set_wakeup_fd(wakeup_w)
+        handled = (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGCHLD)
+        old_handlers = {
+            signum: signal.signal(signum, self._on_signal)
+            for signum in handled
+        }
+
+        # Objects created so far are never collected in the workers, so the
+        # memory pages holding them are not touched and stay shared.
+        gc.collect()
+        if hasattr(gc, "freeze"):
+            gc.freeze()
+
+        logger.info(
+            "Serving agent on %s:%s with %s workers",
+            self.host,
+            self.port,
+            self.workers,
+        )
+        try:
+            self._spawn_workers()
+            self._supervise(wakeup_r)
+        finally:
+            signal.set_wakeup_fd(old_wakeup_fd)
+            for signum, handler in old_handlers.items():
+                signal.signal(signum, handler)
+            os.close(wakeup_r)
+            os.close(wakeup_w)
+            self._socket.close()
+            if hasattr(gc, "unfreeze"):
+                gc.unfreeze()
+        if self._boot_failed:
+            raise RuntimeError("A worker failed to start.")
+
+    def _bind(self):
+        family = socket.AF_INET6 if ":" in self.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((self.host, self.port))
+        if not self.reuse_port:
+            # Workers inherit and share this socket. With SO_REUSEPORT the
+            # socket only reserves the address; as it never listens the
+            # kernel does not route connections to it.
+            sock.listen(max(self.server.max_concurrency, 1024))
+        sock.set_inheritable(True)
+        return sock
+
+    def _on_signal(self, signum, frame):
+        self._signals.append(signum)
+
+    def _supervise(self, wakeup_fd):
+        shutdown_at = None
+        while True:
+            self._reap()
+            if self._boot_failed and shutdown_at is None:
+                logger.error("A worker failed to start; shutting down")
+                self._signals.insert(0, signal.SIGTERM)
+            while self._signals:
+                signum = self._signals.pop(0)
+                if signum in (signal.SIGTERM, signal.SIGINT):
+                    if shutdown_at is None:
+                        logger.info("Shutting down workers")
+                        shutdown_at = time.monotonic()
+                        for pid in list(self._children):
+                            self._stop_worker(pid)
+                elif signum == signal.SIGHUP and shutdown_at is None:
+                    logger.info("Gracefully restarting workers")
+                    old = list(self._children)
+                    for pid in old:
+                        self._stop_worker(pid)
+                    self._spawn_workers()
+
+            self._kill_overdue()
+            if shutdown_at is None:
+                self._spawn_workers()
+            elif not self._children and not self._stopping:
+                return
+
+            try:
+                select.select([wakeup_fd], [], [], 1.0)
+                os.read(wakeup_fd, 4096)
+            except (BlockingIOError, InterruptedError):
+                pass
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            code = _exit_code(status)
+            if pid in self._children:
+                del self._children[pid]
+                if code == EXIT_RECYCLE:
+                    logger.info("Worker %s recycled", pid)
+                elif code == EXIT_BOOT_ERROR:
+                    self._boot_failed = True
+                else:
+                    logger.warning("Worker %s exited with code %s", pid, code)
+            self._stopping.pop(pid, None)
+
+    def _stop_worker(self, pid):
+        self._children.pop(pid, None)
+        self._stopping[pid] = time.monotonic() + self.graceful_timeout
+        _kill(pid, signal.SIGTERM)
+
+    def _kill_overdue(self):
+        now = time.monotonic()
+        for pid, deadline in list(self._stopping.items()):
+            if now > deadline:
+                logger.warning("Killing worker %s", pid)
+                _kill(pid, signal.SIGKILL)
+                self._stopping[pid] = float("inf")
+
+    def _spawn_workers(self):
+        while len(self._children) < self.workers:
+            pid = os.fork()
+            if pid == 0:
+                code = 1
+                try:
+                    code = self._worker()
+                except BaseException:
+                    logger.exception("Worker failed")
+                finally:
+                    os._exit(code)
+            self._children[pid] = None
+
+    def _worker(self):
+        signal.set_wakeup_fd(-1)
+        for signum in (signal.SIGINT, signal.SIGHUP):
+            # The parent decides when workers stop.
+            signal.signal(signum, signal.SIG_IGN)
+        for signum in (signal.SIGTERM, signal.SIGCHLD):
+            signal.signal(signum, signal.SIG_DFL)
+        random.seed()
+        return asyncio.run(self._serve_worker())
+
+    async def _serve_worker(self):
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        loop.add_signal_handler(signal.SIGTERM, stop.set)
+
+        try:
+            if self.reuse_port:
+                await self.server.start(
+                    self.host, self.port, reuse_address=True, reuse_port=True
+                )
+            else:
+                await self.server.start(sock=self._socket)
+        except Exception:
+            logger.exception("Worker %s failed to start", os.getpid())
+            # The worker exits anyway; a SIGTERM from the parent must not
+            # arrive while the loop is being closed.
+            loop.remove_signal_handler(signal.SIGTERM)
+            signal.signal(signal.SIGTERM, signal.SIG_IGN)
+            return EXIT_BOOT_ERROR
+        self._socket.close()
+
+        max_requests = self.max_requests
+        if max_requests and self.max_requests_jitter:
+            max_requests += random.randint(0, self.max_requests_jitter)
+
+        code = 0
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), 0.5)
+            except asyncio.TimeoutError:
+                pass
+            if max_requests and self.server.requests_handled >= max_requests:
+                code = EXIT_RECYCLE
+                break
+            if self.max_rss and _rss() > self.max_rss:
+                code = EXIT_RECYCLE
+                break
+
+        await self.server.close(self.graceful_timeout)
+        return code
+
+
+def _kill(pid, signum):
+    try:
+        os.kill(pid, signum)
+    except ProcessLookupError:
+        pass
+
+
+def _exit_code(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _rss():
+    """Returns the resident set size of the current process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    import resource
+
+    # This is the peak RSS: kilobytes on Linux, bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
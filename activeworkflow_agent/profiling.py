@@ -0,0 +1,250 @@
+"""Profiling of a sample of the requests served by an agent.
+
+Give AgentServer a Profiler to profile a fraction of the requests with
+cProfile. The parsing of the request, the handler and the serialisation of
+the response are profiled separately, and the results are aggregated by
+method, options hash (see ParsedRequest.options_hash) and phase.
+
+The results are available from the Profiler, and from the server's admin
+endpoint:
+
+    GET  /admin/profile
+        A JSON summary of the profiles collected so far.
+    GET  /admin/profile?method=receive&phase=handle
+        The aggregated profile of the matching requests, as a pstats file
+        (add format=text for the output of pstats.Stats.print_stats()). An
+        options_hash parameter restricts it to the requests with some
+        options.
+    POST /admin/profile?sample_rate=0.01
+        Change the fraction of the requests profiled (0 disables profiling).
+    POST /admin/profile?reset=1
+        Discard the profiles collected so far.
+
+The endpoint is served on the same host and port as the Remote Agent API.
+It is therefore only served when the server is given an admin token, which
+every request to it must send in an 'Authorization: Bearer <token>' header
+(other requests get a 401 response):
+
+    server = AgentServer(register, check=check, profiler=Profiler(0.01),
+                         admin_token=os.environ["AGENT_ADMIN_TOKEN"])
+
+A pstats file can be read with pstats.Stats(filename), or converted for
+viewers such as snakeviz or gprof2dot.
+
+Only one request is profiled at a time, so that the profiles of concurrent
+requests do not mix. Coroutine handlers are profiled only while they run,
+not while they wait. Handlers run in a ProcessPool are not profiled. From
+Python 3.12 cProfile profiles every thread while it is enabled, so the
+profiles of sync handlers can include some work done for other requests.
+"""
+
+import asyncio
+import cProfile
+import contextlib
+import contextvars
+import io
+import marshal
+import pstats
+import random
+
+
+PHASES = ("parse", "handle", "serialize")
+
+# The profile of the request being handled by the current task, if any.
+current = contextvars.ContextVar("activeworkflow_agent_profile", default=None)
+
+
+def phase(name):
+    """Profile a with block as phase name of the current request's profile.
+
+    Does nothing when the current request is not profiled.
+    """
+    profile = current.get()
+    if profile is None:
+        return contextlib.nullcontext()
+    return profile.phase(name)
+
+
+class Profiler:
+    """Profiles a fraction of the requests and aggregates the results."""
+
+    def __init__(self, sample_rate=0.0):
+        """Create a Profiler object.
+
+        Parameters
+        ----------
+        sample_rate : float
+            The fraction of the requests profiled, between 0 and 1. It can be
+            changed at any time.
+        """
+        self.sample_rate = sample_rate
+        self.requests_profiled = 0
+        self._active = False
+        # Maps (method, options hash, phase) to [pstats.Stats, count].
+        self._results = {}
+
+    @property
+    def sample_rate(self):
+        return self._sample_rate
+
+    @sample_rate.setter
+    def sample_rate(self, value):
+        if not 0 <= value <= 1:
+            raise ValueError("sample_rate must be between 0 and 1.")
+        self._sample_rate = value
+
+    def sample(self):
+        """Returns a RequestProfile for a request to profile, or None."""
+        if (
+            self._active
+            or not self._sample_rate
+            or random.random() >= self._sample_rate
+        ):
+            return None
+        self._active = True
+        return RequestProfile(self)
+
+    def reset(self):
+        """Discard the profiles collected so far."""
+        self._results.clear()
+        self.requests_profiled = 0
+
+    def summary(self):
+        """Returns a list of dicts describing the profiles collected."""
+        return [
+            {
+                "method": method,
+                "options_hash": options_hash,
+                "phase": phase,
+                "requests": count,
+                "seconds": stats.total_tt,
+            }
+            for (method, options_hash, phase), (stats, count) in sorted(
+                self._results.items()
+            )
+        ]
+
+    def stats(self, method=None, phase=None, options_hash=None):
+        """Returns the aggregated pstats.Stats of the matching profiles.
+
+        Returns None when no profile matches.
+        """
+        result = None
+        for (m, h, p), (stats, _) in self._results.items():
+            if (
+                (method is None or m == method)
+                and (phase is None or p == phase)
+                and (options_hash is None or h == options_hash)
+            ):
+                if result is None:
+                    result = pstats.Stats()
+                result.add(stats)
+        return result
+
+    def _record(self, profile):
+        self._active = False
+        if profile.method is None:
+            return
+        self.requests_profiled += 1
+        for phase, prof in profile.profiles.items():
+            key = (profile.method, profile.options_hash, phase)
+            entry = self._results.get(key)
+            if entry is None:
+                self._results[key] = [pstats.Stats(prof), 1]
+            else:
+                entry[0].add(prof)
+                entry[1] += 1
+
+
+class RequestProfile:
+    """The profiles of the phases of a single request."""
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.method = None
+        self.options_hash = None
+        self.profiles = {}
+
+    def tag(self, request):
+        """Record the method and options hash of the profiled request."""
+        self.method = request.method
+        self.options_hash = request.options_hash
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Profile the code run in the with block as phase name."""
+        profile = self._profile(name)
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+
+    def wrap(self, handler):
+        """Returns handler profiled as the 'handle' phase."""
+        profile = self._profile("handle")
+        if asyncio.iscoroutinefunction(handler):
+
+            async def profiled_coroutine(*args):
+                return await _Profiled(handler(*args), profile)
+
+            return profiled_coroutine
+
+        def profiled(*args):
+            profile.enable()
+            try:
+                return handler(*args)
+            finally:
+                profile.disable()
+
+        return profiled
+
+    def finish(self):
+        """Add the profiles to the profiler's results."""
+        self.profiler._record(self)
+
+    def _profile(self, phase):
+        profile = self.profiles.get(phase)
+        if profile is None:
+            profile = self.profiles[phase] = cProfile.Profile()
+        return profile
+
+
+class _Profiled:
+    """Awaits a coroutine with a profile enabled only while it runs."""
+
+    def __init__(self, coroutine, profile):
+        self.coroutine = coroutine
+        self.profile = profile
+
+    def __await__(self):
+        steps = self.coroutine.__await__()
+        value, error = None, None
+        while True:
+            self.profile.enable()
+            try:
+                if error is None:
+                    future = steps.send(value)
+                else:
+                    future = steps.throw(error)
+            except StopIteration as e:
+                return e.value
+            finally:
+                self.profile.disable()
+            try:
+                value, error = (yield future), None
+            except BaseException as e:
+                value, error = None, e
+
+
+def dumps(stats):
+    """Returns a pstats.Stats object in the format of a pstats file."""
+    return marshal.dumps(stats.stats)
+
+
+def text(stats, limit=50):
+    """Returns the output of stats.print_stats(), sorted by cumulative time."""
+    stream = io.StringIO()
+    stats.stream = stream
+    stats.sort_stats("cumulative").print_stats(limit)
+    return stream.getvalue()
@@ -0,0 +1,398 @@
+"""Recording and replaying the traffic of an agent.
+
+To plan the capacity of an agent, record the requests it receives from
+ActiveWorkflow and replay them later against a local server:
+
+    python -m activeworkflow_agent serve my_agent --record traffic.jsonl.gz
+    python -m activeworkflow_agent replay traffic.jsonl.gz --agent my_agent \\
+        --concurrency 32
+
+Each line of a recording is a JSON object with the time the request was
+received ('t', in seconds since the epoch), the time taken to respond
+('seconds'), the HTTP status, and the request and response bodies as sent
+('request' and 'response'). Files whose name ends with '.gz' are compressed.
+Requests rejected as invalid (with status 400) are not recorded. Recordings
+contain the credentials sent with the requests: keep them safe.
+
+Replaying sends the recorded requests as fast as possible (with at most
+concurrency requests in flight), at a fixed rate, or with the recorded
+timing sped up by some factor. The Report gives latency percentiles,
+throughput, the statuses received and the responses that differ from the
+recorded ones. With a rate or recorded timing the latency of a request is
+measured from the time it was due, so that requests waiting for a free
+connection to an overloaded agent count as slow.
+"""
+
+import asyncio
+import gzip
+import json
+import random
+import time
+
+
+class Recorder:
+    """Writes the requests handled by an AgentServer to a JSONL file."""
+
+    def __init__(self, path, sample_rate=1.0, max_records=None):
+        """Create a Recorder object.
+
+        Parameters
+        ----------
+        path : str
+            The file the records are appended to. Names ending with '.gz'
+            are gzip compressed.
+        sample_rate : float
+            The fraction of the requests recorded, between 0 and 1.
+        max_records : int, optional
+            Stop recording after this many records.
+        """
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1.")
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_records = max_records
+        self.records = 0
+        if str(path).endswith(".gz"):
+            self._file = gzip.open(path, "ab")
+        else:
+            self._file = open(path, "ab")
+
+    def record(self, request, status, response, seconds):
+        """Record a request and its response.
+
+        Parameters
+        ----------
+        request : bytes
+            The JSON body of the request.
+        status : int
+            The HTTP status of the response.
+        response : bytes
+            The JSON body of the response.
+        seconds : float
+            The time taken to respond.
+        """
+        if self._file.closed or (
+            self.max_records is not None and self.records >= self.max_records
+        ):
+            return
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        self.records += 1
+        self._file.write(
+            b'{"t":%.6f,"seconds":%.6f,"status":%d,"request":'
+            % (time.time(), seconds, status)
+        )
+        # Line breaks can only be whitespace in JSON.
+        self._file.write(_one_line(request))
+        self._file.write(b',"response":')
+        self._file.write(_one_line(response))
+        self._file.write(b"}\n")
+
+    def flush(self):
+        if not self._file.closed:
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def _one_line(data):
+    if b"\n" in data or b"\r" in data:
+        return data.replace(b"\r", b" ").replace(b"\n", b" ")
+    return data
+
+
+def load(path):
+    """Yields the records of a recording as dicts."""
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rb") as fp:
+        for line in fp:
+            if line.strip():
+                yield json.loads(line)
+
+
+def diff(expected, actual, path="", ignore=(), limit=10):
+    """Returns the paths at which two decoded JSON documents differ.
+
+    Paths look like 'result.messages[3].title'. The paths in ignore, and
+    everything below them, are not compared. At most limit paths are
+    returned.
+    """
+    differences = []
+    _diff(expected, actual, path, frozenset(ignore), differences, limit)
+    return differences
+
+
+def _diff(expected, actual, path, ignore, differences, limit):
+    if len(differences) >= limit or path in ignore:
+        return
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        for key in sorted(expected.keys() | actual.keys(), key=str):
+            child = "{}.{}".format(path, key) if path else str(key)
+            if key not in expected or key not in actual:
+                if child not in ignore and len(differences) < limit:
+                    differences.append(child)
+                continue
+            _diff(expected[key], actual[key], child, ignore, differences, limit)
+    elif isinstance(expected, list) and isinstance(actual, list):
+        for index, (a, b) in enumerate(zip(expected, actual)):
+            child = "{}[{}]".format(path, index)
+            _diff(a, b, child, ignore, differences, limit)
+        if len(expected) != len(actual) and len(differences) < limit:
+            shorter = min(len(expected), len(actual))
+            differences.append("{}[{}:]".format(path, shorter))
+    elif expected != actual or type(expected) is not type(actual):
+        differences.append(path or "$")
+
+
+class Report:
+    """The results of a replay."""
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.failures = 0
+        self.mismatches = 0
+        # Examples of mismatches: (record index, list of paths).
+        self.diffs = []
+        self.duration = 0.0
+
+    @property
+    def requests(self):
+        return len(self.latencies) + self.failures
+
+    @property
+    def throughput(self):
+        """Requests completed per second."""
+        if not self.duration:
+            return 0.0
+        return len(self.latencies) / self.duration
+
+    def percentile(self, q):
+        """Returns the latency below which q percent of the requests were."""
+        if not self.latencies:
+            return None
+        latencies = sorted(self.latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * q / 100))
+        return latencies[index]
+
+    def summary(self):
+        """Returns the results as a dict."""
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "duration": self.duration,
+            "throughput": self.throughput,
+            "latency": {
+                "p50": self.percentile(50),
+                "p90": self.percentile(90),
+                "p99": self.percentile(99),
+                "max": max(self.latencies) if self.latencies else None,
+            },
+            "statuses": {str(s): n for s, n in sorted(self.statuses.items())},
+            "mismatches": self.mismatches,
+            "diffs": [
+                {"record": index, "paths": paths} for index, paths in self.diffs
+            ],
+        }
+
+    def format(self):
+        """Returns the results as text."""
+        lines = [
+            "Requests:   {} ({} failed) in {:.2f} s".format(
+                self.requests, self.failures, self.duration
+            ),
+            "Throughput: {:.1f} requests/s".format(self.throughput),
+        ]
+        if self.latencies:
+            lines.append(
+                "Latency:    p50 {:.1f} ms, p90 {:.1f} ms, p99 {:.1f} ms, "
+                "max {:.1f} ms".format(
+                    *(
+                        1000 * value
+                        for value in (
+                            self.percentile(50),
+                            self.percentile(90),
+                            self.percentile(99),
+                            max(self.latencies),
+                        )
+                    )
+                )
+            )
+        lines.append(
+            "Statuses:   {}".format(
+                ", ".join(
+                    "{}: {}".format(status, count)
+                    for status, count in sorted(self.statuses.items())
+                )
+                or "none"
+            )
+        )
+        lines.append(
+            "Responses different from the recording: {}".format(
+                self.mismatches
+            )
+        )
+        for index, paths in self.diffs:
+            lines.append("  record {}: {}".format(index, ", ".join(paths)))
+        return "\n".join(lines)
+
+
+async def replay(
+    records,
+    host="127.0.0.1",
+    port=5000,
+    concurrency=16,
+    rate=None,
+    speed=None,
+    timeout=30.0,
+    ignore=(),
+    max_diffs=10,
+):
+    """Send recorded requests to an agent and compare the responses.
+
+    Parameters
+    ----------
+    records : iterable of dict
+        The records to replay, as returned by load().
+    host, port : str, int
+        The address of the agent.
+    concurrency : int
+        The maximum number of requests in flight (and of connections).
+    rate : float, optional
+        Send this many requests per second instead of as fast as possible.
+    speed : float, optional
+        Send the requests with their recorded timing, sped up by this
+        factor (2 replays twice as fast as recorded).
+    timeout : float
+        Seconds to wait for a response before counting a failure.
+    ignore : iterable of str
+        Paths not compared in responses (see diff()), for example
+        'result.logs'.
+    max_diffs : int
+        The number of mismatches kept as examples in the report.
+
+    Returns
+    -------
+    Report
+    """
+    if rate is not None and speed is not None:
+        raise ValueError("Pass either rate or speed.")
+    if concurrency < 1:
+        raise ValueError("concurrency must be a positive integer.")
+    loop = asyncio.get_running_loop()
+    report = Report()
+    semaphore = asyncio.Semaphore(concurrency)
+    idle = []
+    tasks = set()
+    start = loop.time()
+    first = None
+
+    async def send(index, record, due):
+        try:
+            conn = idle.pop() if idle else None
+            body = json.dumps(record["request"]).encode("utf-8")
+            try:
+                if conn is None:
+                    conn = await asyncio.wait_for(
+                        asyncio.open_connection(host, port), timeout
+                    )
+                status, payload, keep_alive = await asyncio.wait_for(
+                    _post(conn, host, body), timeout
+                )
+            except (
+                OSError,
+                ValueError,
+                asyncio.TimeoutError,
+                asyncio.IncompleteReadError,
+            ):
+                report.failures += 1
+                if conn is not None:
+                    conn[1].close()
+                return
+            report.latencies.append(loop.time() - due)
+            if keep_alive:
+                idle.append(conn)
+            else:
+                conn[1].close()
+            report.statuses[status] = report.statuses.get(status, 0) + 1
+            _compare(report, index, record, status, payload, ignore, max_diffs)
+        finally:
+            semaphore.release()
+
+    for index, record in enumerate(records):
+        if rate is not None:
+            due = start + index / rate
+        elif speed is not None:
+            if first is None:
+                first = record["t"]
+            due = start + (record["t"] - first) / speed
+        else:
+            due = None
+        if due is not None and due > loop.time():
+            await asyncio.sleep(due - loop.time())
+        await semaphore.acquire()
+        task = loop.create_task(
+            send(index, record, loop.time() if due is None else due)
+        )
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.wait(tasks)
+    report.duration = loop.time() - start
+    for _, writer in idle:
+        writer.close()
+    return report
+
+
+def _compare(report, index, record, status, payload, ignore, max_diffs):
+    if status != record["status"]:
+        paths = ["status {} instead of {}".format(status, record["status"])]
+    else:
+        try:
+            actual = json.loads(payload)
+        except ValueError:
+            actual = payload.decode("utf-8", "replace")
+        paths = diff(record["response"], actual, ignore=ignore)
+    if paths:
+        report.mismatches += 1
+        if len(report.diffs) < max_diffs:
+            report.diffs.append((index, paths))
+
+
+async def _post(conn, host, body):
+    """Send a POST request and return (status, body, keep alive)."""
+    reader, writer = conn
+    writer.write(
+        (
+            "POST / HTTP/1.1\r\n"
+            "Host: {}\r\n"
+            "Content-Type: application/json\r\n"
+            "Content-Length: {}\r\n"
+            "\r\n".format(host, len(body))
+        ).encode("latin-1")
+    )
+    writer.write(body)
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ", 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if headers.get("transfer-encoding") == "chunked":
+        chunks = []
+        while True:
+            size = int(await reader.readuntil(b"\r\n"), 16)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+            if not size:
+                break
+        payload = b"".join(chunks)
+    else:
+        payload = await reader.readexactly(
+            int(headers.get("content-length", "0"))
+        )
+    keep_alive = headers.get("connection", "").lower() != "close"
+    return status, payload, keep_alive
@@ -0,0 +1,806 @@
+"""Asyncio HTTP server for the Remote Agent API.
+
+The server accepts the POST requests sent by ActiveWorkflow, builds a
+ParsedRequest for each one, dispatches it to the handler registered for the
+request's method and serialises the Response returned by the handler.
+
+A minimal agent looks like this:
+
+    import activeworkflow_agent as aw
+    from activeworkflow_agent.server import run
+
+    register = aw.RegisterResponse(
+        name="MyAgent",
+        display_name="My Agent",
+        description="Emits the messages it receives.",
+    )
+
+    async def receive(request):
+        response = aw.ReceiveResponse()
+        response.add_messages(request.message)
+        return response
+
+    run(register, receive=receive, port=5000)
+
+Handlers can be plain functions or coroutine functions. Plain functions are
+executed in the event loop's default executor so that a slow handler does not
+block the other requests being served.
+"""
+
+import asyncio
+import functools
+import hmac
+import inspect
+import json
+import logging
+import time
+import urllib.parse
+from http import HTTPStatus
+
+from activeworkflow_agent import (
+    ParsedRequest,
+    RegisterResponse,
+    Response,
+    _MessageBudget,
+    warm_up,
+)
+from activeworkflow_agent.batching import Batcher
+from activeworkflow_agent.buffers import BufferPool, OutputBuffer
+from activeworkflow_agent.coalesce import SingleFlight
+from activeworkflow_agent.deadline import Deadline, DeadlineExceeded
+from activeworkflow_agent import profiling
+from activeworkflow_agent.execution import Overloaded, ProcessPool
+from activeworkflow_agent.metrics import Metrics
+
+
+logger = logging.getLogger(__name__)
+
+METHODS = ("register", "check", "receive")
+
+_PROMETHEUS_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Room left before the data of streamed chunks for their size line.
+_CHUNK_HEAD_ROOM = 16
+
+
+class HTTPError(Exception):
+    """An error that is reported to the client with an HTTP status code."""
+
+    def __init__(self, status, message=None):
+        self.status = HTTPStatus(status)
+        self.message = message or self.status.phrase
+        super().__init__(self.message)
+
+
+class AgentServer:
+    """Serve an agent over HTTP using asyncio."""
+
+    def __init__(
+        self,
+        register,
+        check=None,
+        receive=None,
+        max_concurrency=1024,
+        keep_alive_timeout=75.0,
+        max_body_size=64 * 1024 * 1024,
+        lazy_requests=False,
+        streaming_threshold=1000,
+        chunk_size=65536,
+        validate_options=False,
+        execution=None,
+        receive_batch=None,
+        max_batch_size=32,
+        max_batch_wait=0.005,
+        coalesce_checks=False,
+        deadlines=None,
+        metrics=False,
+        profiler=None,
+        recorder=None,
+        buffer_pool=True,
+        admin_token=None,
+    ):
+        """Create an AgentServer object.
+
+        Parameters
+        ----------
+        register : RegisterResponse or callable
+            The agent's metadata, or a handler that takes a ParsedRequest and
+            returns a RegisterResponse.
+        check : callable, optional
+            A handler for the 'check' method. It takes a ParsedRequest and
+            returns a Response. When omitted an empty Response is returned.
+        receive : callable, optional
+            A handler for the 'receive' method. It takes a ParsedRequest and
+            returns a Response. When omitted an empty Response is returned.
+        max_concurrency : int
+            The maximum number of requests handled at the same time. Requests
+            above the limit wait for a free slot.
+        keep_alive_timeout : float
+            Seconds an idle keep-alive connection is kept open.
+        max_body_size : int
+            The largest request body (in bytes) the server accepts.
+        lazy_requests : bool
+            Pass handlers LazyParsedRequest objects, which decode the fields
+            of a request only when they are accessed.
+        streaming_threshold : int, optional
+            Responses with at least this many messages are streamed to the
+            client with chunked transfer encoding, so that their JSON is
+            never held in memory in full. None disables streaming.
+        chunk_size : int
+            The size (in bytes) of the chunks of streamed responses.
+        validate_options : bool
+            Validate the options of 'check' and 'receive' requests with
+            register.options_validator. Requests with invalid options get a
+            Response with the errors, without calling the handler. Requires
+            register to be a RegisterResponse.
+        execution : ExecutionPolicy or dict, optional
+            Where handlers run (see activeworkflow_agent.execution): a policy
+            for every handler, or a dict that maps method names to policies.
+            Handlers without a policy are run as described in the module's
+            documentation. Requests rejected by a policy get a 503 response.
+        receive_batch : callable, optional
+            A handler for batches of 'receive' requests, used instead of
+            receive (see activeworkflow_agent.batching). It takes a list of
+            ParsedRequest objects and returns a list of Response objects.
+        max_batch_size : int
+            The largest number of requests passed to receive_batch at once.
+        max_batch_wait : float
+            The longest time (in seconds) a request waits for its batch to
+            fill up.
+        coalesce_checks : bool
+            Share a single call of the check handler between concurrent
+            'check' requests with the same content (see
+            activeworkflow_agent.coalesce). This is always done for check
+            handlers marked as idempotent, whose results are also reused
+            for requests received shortly after.
+        deadlines : float or dict, optional
+            The number of seconds handlers have to respond: for 'check' and
+            'receive', or a dict that maps method names to seconds. When a
+            deadline expires, the response attached to request.deadline is
+            sent with an error (see activeworkflow_agent.deadline).
+        metrics : bool
+            Record latency and size metrics for each method and serve them
+            on GET /metrics (see activeworkflow_agent.metrics).
+        profiler : Profiler, optional
+            Profile a sample of the requests (see
+            activeworkflow_agent.profiling). The results are served on
+            /admin/profile when admin_token is set.
+        recorder : Recorder, optional
+            Record the requests and responses to a file, to replay them
+            later (see activeworkflow_agent.replay).
+        buffer_pool : BufferPool or bool
+            The pool of buffers that streamed responses are encoded into
+            (see activeworkflow_agent.buffers). True uses a pool of buffers
+            of twice chunk_size, False allocates new buffers every time.
+        admin_token : str, optional
+            The token that requests to the admin endpoint (/admin/profile)
+            must send in an 'Authorization: Bearer <token>' header. The
+            endpoint is served on the same port as the Remote Agent API, so
+            it is only served when a token is set.
+        """
+        if not (isinstance(register, RegisterResponse) or callable(register)):
+            raise TypeError("register must be a RegisterResponse or callable.")
+        for name, handler in (("check", check), ("receive", receive)):
+            if handler is not None and not callable(handler):
+                raise TypeError("{} must be callable.".format(name))
+        if receive is not None and receive_batch is not None:
+            raise ValueError("Pass either receive or receive_batch.")
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be a positive integer.")
+        if validate_options and not isinstance(register, RegisterResponse):
+            raise TypeError(
+                "validate_options requires register to be a RegisterResponse."
+            )
+
+        self.handlers = {
+            "register": register,
+            "check": check,
+            "receive": receive,
+        }
+        self.max_concurrency = max_concurrency
+        self.keep_alive_timeout = keep_alive_timeout
+        self.max_body_size = max_body_size
+        self.lazy_requests = lazy_requests
+        self.streaming_threshold = streaming_threshold
+        self.chunk_size = chunk_size
+        self.validate_options = validate_options
+        if execution is None or isinstance(execution, dict):
+            self.execution = dict(execution or {})
+        else:
+            self.execution = {method: execution for method in METHODS}
+        if deadlines is None or isinstance(deadlines, dict):
+            self.deadlines = dict(deadlines or {})
+        else:
+            self.deadlines = {"check": deadlines, "receive": deadlines}
+        self.metrics = Metrics() if metrics else None
+        self.profiler = profiler
+        self.admin_token = admin_token
+        self.recorder = recorder
+        if buffer_pool is True:
+            buffer_pool = BufferPool(size=2 * chunk_size)
+        elif buffer_pool is False:
+            buffer_pool = None
+        self.buffer_pool = buffer_pool
+        self.single_flight = None
+        ttl = getattr(check, "idempotent_ttl", 0)
+        if coalesce_checks or ttl:
+            self.single_flight = SingleFlight(ttl)
+        self.batcher = None
+        if receive_batch is not None:
+            self.batcher = Batcher(
+                receive_batch, max_batch_size, max_batch_wait
+            )
+        self.requests_handled = 0
+        self._semaphore = None
+        self._server = None
+        self._connections = set()
+        self._closing = False
+
+    def preload(self):
+        """Prepare state shared by every request before serving.
+
+        A static RegisterResponse is encoded once (it caches the result), so
+        that 'register' requests are answered from the encoded body, and its
+        options validator is compiled. The JSON codec, and the modules that
+        are imported when first used, are imported (see warm_up()). Call
+        this before forking worker processes so that they share the results.
+        """
+        register = self.handlers["register"]
+        if isinstance(register, RegisterResponse):
+            warm_up(register)
+            if self.validate_options:
+                register.options_validator
+        else:
+            warm_up()
+        # Imported by the first request that needs them otherwise.
+        import activeworkflow_agent.credentials  # noqa: F401
+
+        if self.lazy_requests:
+            import activeworkflow_agent.lazy  # noqa: F401
+
+    async def handle(self, body):
+        """Handle the body of a single Remote Agent API request.
+
+        Parameters
+        ----------
+        body : bytes
+            The raw JSON body of the request.
+
+        Returns
+        -------
+        bytes
+            The JSON encoded response.
+        """
+        start = time.perf_counter()
+        request = self._parse(body)
+        return await _encode(await self._respond(request, body, start))
+
+    def _parse(self, body):
+        """Returns the ParsedRequest of a body; raises HTTPError 400."""
+        with profiling.phase("parse"):
+            try:
+                request = ParsedRequest.from_bytes(
+                    body, lazy=self.lazy_requests
+                )
+            except (ValueError, TypeError, KeyError) as e:
+                raise HTTPError(400, "Invalid request: {}".format(e)) from e
+
+        if request.method not in METHODS:
+            raise HTTPError(
+                400, "Unknown method: {!r}".format(request.method)
+            )
+        profile = profiling.current.get()
+        if profile is not None:
+            profile.tag(request)
+        return request
+
+    async def _respond(self, request, body, start):
+        """Returns the response to a request (encoded or not).
+
+        start is the time at which parsing the body started.
+        """
+        parsed = time.perf_counter()
+        result = await self._dispatch(request)
+        if self.metrics is not None:
+            method = request.method
+            self.metrics.observe("parse_seconds", method, parsed - start)
+            self.metrics.observe(
+                "handle_seconds", method, time.perf_counter() - parsed
+            )
+            self.metrics.observe("request_bytes", method, len(body))
+        return result
+
+    async def _dispatch(self, request):
+        handler = self.handlers[request.method]
+        if isinstance(handler, RegisterResponse):
+            return handler
+        if self.validate_options:
+            validator = self.handlers["register"].options_validator
+            errors = validator.validate_request(request)
+            if errors:
+                response = Response()
+                response.add_errors(*errors)
+                return response
+        if request.method == "receive" and self.batcher is not None:
+            return await self.batcher.submit(request)
+        if handler is None:
+            return Response()
+        if request.method == "check" and self.single_flight is not None:
+            return await self.single_flight.run(
+                request.content_hash,
+                functools.partial(self._run_encoded, handler, request),
+            )
+        return await self._run(handler, request)
+
+    async def _run_encoded(self, handler, request):
+        return await _encode(await self._run(handler, request))
+
+    async def _run(self, handler, request):
+        timeout = self.deadlines.get(request.method)
+        if timeout is None:
+            return await self._execute(handler, request)
+        request.deadline = Deadline(timeout)
+        try:
+            return await asyncio.wait_for(
+                self._execute(handler, request), timeout
+            )
+        except (asyncio.TimeoutError, DeadlineExceeded):
+            return request.deadline.partial_response()
+
+    async def _execute(self, handler, request):
+        policy = self.execution.get(request.method)
+        profile = profiling.current.get()
+        if profile is not None and not isinstance(policy, ProcessPool):
+            handler = profile.wrap(handler)
+        if policy is None:
+            return await self._call(handler, request)
+        try:
+            return await policy.run(handler, request)
+        except Overloaded as e:
+            raise HTTPError(503, "The agent is overloaded.") from e
+
+    async def _call(self, handler, *args):
+        if asyncio.iscoroutinefunction(handler):
+            return await handler(*args)
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, handler, *args)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def start(self, host="0.0.0.0", port=5000, sock=None, **kwargs):
+        """Start listening for connections.
+
+        Either host and port or an already bound socket (sock) are used.
+        Additional keyword arguments are passed to asyncio.start_server().
+
+        Returns
+        -------
+        asyncio.AbstractServer
+            The underlying asyncio server.
+        """
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._closing = False
+        kwargs.setdefault("backlog", max(self.max_concurrency, 1024))
+        if sock is not None:
+            self._server = await asyncio.start_server(
+                self._handle_connection, sock=sock, **kwargs
+            )
+        else:
+            self._server = await asyncio.start_server(
+                self._handle_connection, host, port, **kwargs
+            )
+        return self._server
+
+    async def serve_forever(
+        self, host="0.0.0.0", port=5000, sock=None, **kwargs
+    ):
+        """Start the server and serve requests until it is closed."""
+        server = await self.start(host, port, sock=sock, **kwargs)
+        for s in server.sockets:
+            logger.info("Serving agent on %s", s.getsockname())
+        try:
+            await server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await self.close()
+
+    async def close(self, timeout=30.0):
+        """Stop accepting connections and wait for requests in flight.
+
+        Idle keep-alive connections are closed immediately, the ones with a
+        request in progress are closed once the response has been sent.
+        Connections still open after timeout seconds are aborted.
+        """
+        self._closing = True
+        if self._server is not None:
+            self._server.close()
+        for conn in list(self._connections):
+            if conn.idle:
+                conn.writer.close()
+        if self._connections:
+            tasks = [conn.task for conn in self._connections]
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+        for policy in set(self.execution.values()):
+            policy.shutdown(wait=False)
+        if self.recorder is not None:
+            self.recorder.flush()
+        if self._server is not None:
+            await self._server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+        conn = _Connection(reader, writer, asyncio.current_task())
+        self._connections.add(conn)
+        try:
+            keep_alive = True
+            while keep_alive and not self._closing:
+                keep_alive = await self._handle_http_request(conn)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.discard(conn)
+            writer.close()
+
+    async def _handle_http_request(self, conn):
+        conn.idle = True
+        try:
+            head = await asyncio.wait_for(
+                conn.reader.readuntil(b"\r\n\r\n"), self.keep_alive_timeout
+            )
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+            return False
+        except asyncio.LimitOverrunError:
+            await self._write_error(conn, HTTPError(431), False)
+            return False
+        conn.idle = False
+        self.requests_handled += 1
+
+        try:
+            method, target, version, headers = _parse_head(head)
+            keep_alive = _keep_alive(version, headers)
+            path, _, query = target.partition("?")
+            if (
+                path == "/admin/profile"
+                and self.profiler is not None
+                and self.admin_token is not None
+            ):
+                self._authorize(headers)
+                if method == "POST":
+                    await self._read_body(conn.reader, headers)
+                payload, content_type = self._profile_endpoint(method, query)
+                await self._write(
+                    conn, 200, payload, keep_alive, content_type=content_type
+                )
+                return keep_alive
+            if (
+                method == "GET"
+                and target == "/metrics"
+                and self.metrics is not None
+            ):
+                await self._write(
+                    conn,
+                    200,
+                    self.metrics.render(self),
+                    keep_alive,
+                    content_type=_PROMETHEUS_TYPE,
+                )
+                return keep_alive
+            if method != "POST":
+                raise HTTPError(405, "Only POST requests are supported.")
+            body = await self._read_body(conn.reader, headers)
+        except HTTPError as e:
+            await self._write_error(conn, e, False)
+            return False
+
+        if self.profiler is None:
+            return await self._serve(conn, body, version, keep_alive)
+        profile = self.profiler.sample()
+        profiling.current.set(profile)
+        try:
+            return await self._serve(conn, body, version, keep_alive)
+        finally:
+            if profile is not None:
+                profile.finish()
+
+    async def _serve(self, conn, body, version, keep_alive):
+        """Respond to the body of a POST request."""
+        method = "unknown"
+        received = time.perf_counter()
+        try:
+            async with self._semaphore:
+                start = time.perf_counter()
+                request = self._parse(body)
+                # Requests that can not be parsed are counted as "unknown".
+                method = request.method
+                result = await self._respond(request, body, start)
+            if self._should_stream(result, version):
+                return await self._write_chunked(
+                    conn, result, keep_alive, method, body, received
+                )
+            start = time.perf_counter()
+            headers = ()
+            if isinstance(result, RegisterResponse):
+                headers = ("ETag: " + result.etag,)
+            messages = None
+            with profiling.phase("serialize"):
+                if isinstance(result, Response):
+                    if result._sources:
+                        budget = _MessageBudget(result, encode=True)
+                        buffers = result._aiter_buffers(
+                            self.chunk_size, bytearray, budget
+                        )
+                        result = b"".join([b async for b in buffers])
+                        messages = budget.count
+                    else:
+                        response, result = result, result.to_bytes()
+                        # Counted once the limits have been applied.
+                        messages = len(response._messages)
+                elif not isinstance(result, bytes):
+                    result = result.to_bytes()
+        except HTTPError as e:
+            error = e
+        except Exception:
+            logger.exception("Error while handling request")
+            error = HTTPError(500)
+        else:
+            error = None
+        if error is not None:
+            self._count(method, error.status)
+            # Invalid requests are not recorded: they can not be replayed.
+            if error.status != 400 and self.recorder is not None:
+                payload = _error_payload(error)
+                self._record(body, error.status, payload, received)
+            await self._write_error(conn, error, keep_alive)
+            return keep_alive
+
+        if self.metrics is not None:
+            elapsed = time.perf_counter() - start
+            self.metrics.observe("serialize_seconds", method, elapsed)
+            self.metrics.observe("response_bytes", method, len(result))
+            if messages is not None:
+                self.metrics.observe("response_messages", method, messages)
+            self.metrics.count(method, 200)
+        self._record(body, 200, result, received)
+        await self._write(conn, 200, result, keep_alive, headers)
+        return keep_alive
+
+    def _record(self, body, status, payload, received):
+        if self.recorder is not None:
+            elapsed = time.perf_counter() - received
+            self.recorder.record(body, int(status), payload, elapsed)
+
+    def _authorize(self, headers):
+        """Raise HTTPError 401 unless headers carry the admin token."""
+        expected = "Bearer " + self.admin_token
+        given = headers.get("authorization", "")
+        if not hmac.compare_digest(given.encode(), expected.encode()):
+            raise HTTPError(401)
+
+    def _profile_endpoint(self, method, query):
+        """Returns the payload and content type of an /admin/profile reply."""
+        profiler = self.profiler
+        params = dict(urllib.parse.parse_qsl(query))
+        if method == "POST":
+            if "sample_rate" in params:
+                try:
+                    profiler.sample_rate = float(params["sample_rate"])
+                except ValueError:
+                    raise HTTPError(400, "Invalid sample_rate.") from None
+            if params.get("reset"):
+                profiler.reset()
+        elif method != "GET":
+            raise HTTPError(405, "Only GET and POST requests are supported.")
+        filters = {
+            name: params[name]
+            for name in ("method", "phase", "options_hash")
+            if name in params
+        }
+        if method == "POST" or not filters:
+            payload = {
+                "sample_rate": profiler.sample_rate,
+                "requests_profiled": profiler.requests_profiled,
+                "profiles": profiler.summary(),
+            }
+            return json.dumps(payload).encode("utf-8"), "application/json"
+        stats = profiler.stats(**filters)
+        if stats is None:
+            raise HTTPError(404, "No matching profile.")
+        if params.get("format") == "text":
+            text = profiling.text(stats).encode("utf-8")
+            return text, "text/plain; charset=utf-8"
+        return profiling.dumps(stats), "application/octet-stream"
+
+    def _count(self, method, status):
+        if self.metrics is not None:
+            self.metrics.count(method, int(status))
+
+    def _should_stream(self, result, version):
+        return (
+            self.streaming_threshold is not None
+            and isinstance(result, Response)
+            and (
+                result._sources
+                or len(result._messages) >= self.streaming_threshold
+            )
+            and version != "HTTP/1.0"
+        )
+
+    async def _read_body(self, reader, headers):
+        if "transfer-encoding" in headers:
+            raise HTTPError(411, "Requests must have a Content-Length.")
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length.") from None
+        if length < 0:
+            raise HTTPError(400, "Invalid Content-Length.")
+        if length > self.max_body_size:
+            raise HTTPError(413)
+        return await reader.readexactly(length)
+
+    async def _write_error(self, conn, error, keep_alive):
+        payload = _error_payload(error)
+        await self._write(conn, error.status, payload, keep_alive)
+
+    async def _write(
+        self,
+        conn,
+        status,
+        payload,
+        keep_alive,
+        headers=(),
+        content_type="application/json",
+    ):
+        length = "Content-Length: {}".format(len(payload))
+        conn.writer.write(
+            _head(status, length, keep_alive, headers, content_type)
+        )
+        conn.writer.write(payload)
+        await conn.writer.drain()
+
+    async def _write_chunked(
+        self, conn, response, keep_alive, method, body=None, received=None
+    ):
+        writer = conn.writer
+        size = 0
+        # The chunks are kept only to record the response.
+        recorded = [] if self.recorder is not None else None
+        pool = self.buffer_pool
+
+        def new_buffer():
+            data = bytearray() if pool is None else pool.acquire()
+            return OutputBuffer(data, _CHUNK_HEAD_ROOM)
+
+        budget = _MessageBudget(response, encode=True)
+        chunks = response._aiter_buffers(self.chunk_size, new_buffer, budget)
+        try:
+            # Encode the first chunk before committing to a 200 response.
+            start = time.perf_counter()
+            chunk = await chunks.__anext__()
+            # The time spent encoding, not waiting for the client.
+            encoding = time.perf_counter() - start
+            writer.write(_head(200, "Transfer-Encoding: chunked", keep_alive))
+            try:
+                while True:
+                    size += len(chunk)
+                    if recorded is not None:
+                        recorded.append(chunk.getvalue())
+                    # The size line and CRLF are written around the data.
+                    writer.write(chunk.frame(b"%x\r\n" % len(chunk), b"\r\n"))
+                    await writer.drain()
+                    if pool is not None:
+                        pool.release(chunk.data)
+                    start = time.perf_counter()
+                    chunk = await chunks.__anext__()
+                    encoding += time.perf_counter() - start
+            except StopAsyncIteration:
+                pass
+            except (ConnectionError, asyncio.CancelledError):
+                raise
+            except Exception:
+                # The status has been sent, all that is left is to abort.
+                logger.exception("Error while streaming response")
+                writer.transport.abort()
+                return False
+        finally:
+            await chunks.aclose()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+        if self.metrics is not None:
+            self.metrics.observe("serialize_seconds", method, encoding)
+            self.metrics.observe("response_bytes", method, size)
+            self.metrics.observe("response_messages", method, budget.count)
+            self.metrics.count(method, 200)
+        if recorded is not None:
+            self._record(body, 200, b"".join(recorded), received)
+        return keep_alive
+
+
+async def _encode(result):
+    """Returns the JSON of a handler's result, which may be encoded already.
+
+    Responses with async iterables of messages are encoded with
+    aiter_chunks().
+    """
+    if isinstance(result, bytes):
+        return result
+    if isinstance(result, Response) and result._sources:
+        return b"".join([c async for c in result.aiter_chunks()])
+    return result.to_bytes()
+
+
+def _error_payload(error):
+    return json.dumps({"error": error.message}).encode("utf-8")
+
+
+def _head(
+    status, framing, keep_alive, headers=(), content_type="application/json"
+):
+    status = HTTPStatus(status)
+    return (
+        "HTTP/1.1 {} {}\r\n"
+        "Content-Type: {}\r\n"
+        "{}\r\n"
+        "Connection: {}\r\n"
+        "{}"
+        "\r\n".format(
+            status.value,
+            status.phrase,
+            content_type,
+            framing,
+            "keep-alive" if keep_alive else "close",
+            "".join(header + "\r\n" for header in headers),
+        )
+    ).encode("latin-1")
+
+
+class _Connection:
+    __slots__ = ("reader", "writer", "task", "idle")
+
+    def __init__(self, reader, writer, task):
+        self.reader = reader
+        self.writer = writer
+        self.task = task
+        self.idle = True
+
+
+def _parse_head(head):
+    try:
+        lines = head.decode("latin-1").split("\r\n")
+        method, target, version = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line.") from None
+    headers = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, sep, value = line.partition(":")
+        if not sep:
+            raise HTTPError(400, "Malformed header.")
+        headers[name.strip().lower()] = value.strip()
+    return method, target, version, headers
+
+
+def _keep_alive(version, headers):
+    connection = headers.get("connection", "").lower()
+    if version == "HTTP/1.0":
+        return connection == "keep-alive"
+    return connection != "close"
+
+
+def run(
+    register, check=None, receive=None, host="0.0.0.0", port=5000, **kwargs
+):
+    """Serve an agent until the process is interrupted.
+
+    Parameters are the same as for AgentServer, plus the host and port to
+    listen on.
+    """
+    server = AgentServer(register, check, receive, **kwargs)
+    try:
+        asyncio.run(server.serve_forever(host, port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,55 @@
+"""Simple statistics kept by the server about its own work."""
+
+import bisect
+
+
+class Histogram:
+    """Counts observed values in buckets with fixed upper bounds.
+
+    The buckets follow the Prometheus convention: a value is counted in the
+    first bucket whose upper bound is greater than or equal to it, and the
+    values above the largest bound are counted in an extra bucket.
+    """
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds):
+        """Create a Histogram object.
+
+        Parameters
+        ----------
+        bounds : sequence of numbers
+            The upper bounds of the buckets, in increasing order.
+        """
+        bounds = tuple(bounds)
+        if list(bounds) != sorted(set(bounds)):
+            raise ValueError("bounds must be increasing.")
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        """Count a value."""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    @property
+    def mean(self):
+        """The mean of the observed values, or None if there are none."""
+        if not self.count:
+            return None
+        return self.sum / self.count
+
+    def cumulative(self):
+        """Returns (upper bound, count of values <= bound) pairs.
+
+        The last pair has an upper bound of float("inf").
+        """
+        pairs = []
+        total = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
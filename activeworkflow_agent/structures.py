@@ -0,0 +1,288 @@
+"""Compact structures to remember the items an agent has seen.
+
+Agents commonly keep a set of the ids of the items they have already seen in
+their memory. A plain list grows without bound and is serialised with every
+response. The structures in this module are bounded (or of a fixed size) and
+are stored in the memory in a compact form:
+
+    * LRUSet - keeps the most recently seen items, up to max_size.
+    * SeenHashes - keeps 64-bit hashes of up to max_size items, in a sorted
+      array, using 8 bytes per item.
+    * BloomFilter - a fixed number of bits for any number of items, at the
+      cost of false positives.
+
+Each of them is saved with to_memory() and loaded with from_memory():
+
+    seen = LRUSet.from_memory(request.memory.get("seen"), max_size=1000)
+    for item in items:
+        if seen.add(item["id"]):
+            response.add_messages(item)
+    response.add_memory({"seen": seen.to_memory()})
+
+Items are compared by their str(); SeenHashes and BloomFilter only store
+hashes of the items.
+"""
+
+import base64
+import bisect
+import hashlib
+import math
+import sys
+from array import array
+from collections import OrderedDict
+
+
+class _Structure:
+    __slots__ = ()
+
+    TYPE = None
+
+    @classmethod
+    def from_memory(cls, value, **kwargs):
+        """Load a structure saved with to_memory().
+
+        Parameters
+        ----------
+        value : dict or None
+            What to_memory() returned. When it is None, a new structure is
+            created with kwargs.
+        **kwargs
+            Arguments for the constructor, used when value is None.
+        """
+        if value is None:
+            return cls(**kwargs)
+        if not isinstance(value, dict) or value.get("type") != cls.TYPE:
+            raise ValueError("Not a saved {}.".format(cls.__name__))
+        return cls._load(value)
+
+    def to_memory(self):
+        """Returns a JSON serialisable dict to save in the memory."""
+        raise NotImplementedError
+
+
+class LRUSet(_Structure):
+    """A set of the most recently added items."""
+
+    TYPE = "lru_set"
+
+    __slots__ = ("max_size", "_items")
+
+    def __init__(self, max_size=1000, items=()):
+        """Create an LRUSet object.
+
+        Parameters
+        ----------
+        max_size : int
+            The number of items kept. Adding an item to a full set removes
+            the least recently added one.
+        items : iterable
+            The initial items, from the least to the most recently added.
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be a positive integer.")
+        self.max_size = max_size
+        self._items = OrderedDict()
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        """Add an item. Returns True if it was not in the set."""
+        key = str(item)
+        if key in self._items:
+            self._items.move_to_end(key)
+            return False
+        self._items[key] = None
+        if len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+        return True
+
+    def __contains__(self, item):
+        return str(item) in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def to_memory(self):
+        return {
+            "type": self.TYPE,
+            "max_size": self.max_size,
+            "items": list(self._items),
+        }
+
+    @classmethod
+    def _load(cls, value):
+        return cls(value["max_size"], value["items"])
+
+
+class SeenHashes(_Structure):
+    """A set of the 64-bit hashes of the most recently added items.
+
+    Membership is tested with a binary search of a sorted array. Two items
+    have the same hash with a probability of about n / 2**64 for n items.
+    """
+
+    TYPE = "seen_hashes"
+
+    __slots__ = ("max_size", "_sorted", "_order")
+
+    def __init__(self, max_size=100000):
+        """Create a SeenHashes object.
+
+        Parameters
+        ----------
+        max_size : int
+            The number of hashes kept. Adding an item to a full set removes
+            the hash of the least recently added one. It is saved in 8 *
+            max_size bytes (before base64 encoding) at most.
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be a positive integer.")
+        self.max_size = max_size
+        self._sorted = array("Q")
+        # The hashes in the order they were added.
+        self._order = array("Q")
+
+    def add(self, item):
+        """Add an item. Returns True if its hash was not in the set."""
+        value = _hash64(item)
+        index = bisect.bisect_left(self._sorted, value)
+        if index < len(self._sorted) and self._sorted[index] == value:
+            return False
+        self._sorted.insert(index, value)
+        self._order.append(value)
+        if len(self._order) > self.max_size:
+            oldest = self._order.pop(0)
+            del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+        return True
+
+    def __contains__(self, item):
+        value = _hash64(item)
+        index = bisect.bisect_left(self._sorted, value)
+        return index < len(self._sorted) and self._sorted[index] == value
+
+    def __len__(self):
+        return len(self._order)
+
+    def to_memory(self):
+        return {
+            "type": self.TYPE,
+            "max_size": self.max_size,
+            "hashes": _pack(self._order),
+        }
+
+    @classmethod
+    def _load(cls, value):
+        hashes = cls(value["max_size"])
+        hashes._order = _unpack(value["hashes"])
+        hashes._sorted = array("Q", sorted(hashes._order))
+        return hashes
+
+
+class BloomFilter(_Structure):
+    """A fixed size set of items that can give false positives.
+
+    An item that was added is always found; an item that was not added is
+    found with a probability of about error_rate, as long as no more than
+    capacity items have been added.
+    """
+
+    TYPE = "bloom"
+
+    __slots__ = ("size", "hashes", "count", "_bits")
+
+    def __init__(self, capacity=10000, error_rate=0.001):
+        """Create a BloomFilter object.
+
+        Parameters
+        ----------
+        capacity : int
+            The number of items the filter is sized for.
+        error_rate : float
+            The probability of false positives at capacity.
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be a positive integer.")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1.")
+        self.size = math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def add(self, item):
+        """Add an item. Returns True if it was (certainly) not in the set."""
+        new = False
+        bits = self._bits
+        for index in self._indexes(item):
+            mask = 1 << (index & 7)
+            if not bits[index >> 3] & mask:
+                bits[index >> 3] |= mask
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    def __contains__(self, item):
+        bits = self._bits
+        return all(
+            bits[index >> 3] & (1 << (index & 7))
+            for index in self._indexes(item)
+        )
+
+    def __len__(self):
+        """The number of items added (not counting false positives)."""
+        return self.count
+
+    def _indexes(self, item):
+        digest = hashlib.blake2b(
+            str(item).encode("utf-8"), digest_size=16
+        ).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        size = self.size
+        return [(first + i * second) % size for i in range(self.hashes)]
+
+    def to_memory(self):
+        return {
+            "type": self.TYPE,
+            "size": self.size,
+            "hashes": self.hashes,
+            "count": self.count,
+            "bits": base64.b64encode(self._bits).decode("ascii"),
+        }
+
+    @classmethod
+    def _load(cls, value):
+        bloom = cls.__new__(cls)
+        bloom.size = value["size"]
+        bloom.hashes = value["hashes"]
+        bloom.count = value["count"]
+        bloom._bits = bytearray(base64.b64decode(value["bits"]))
+        if len(bloom._bits) != (bloom.size + 7) // 8:
+            raise ValueError("Invalid saved BloomFilter.")
+        return bloom
+
+
+def _hash64(item):
+    digest = hashlib.blake2b(str(item).encode("utf-8"), digest_size=8)
+    return int.from_bytes(digest.digest(), "little")
+
+
+def _pack(values):
+    if sys.byteorder != "little":
+        values = array("Q", values)
+        values.byteswap()
+    return base64.b64encode(values.tobytes()).decode("ascii")
+
+
+def _unpack(data):
+    values = array("Q")
+    values.frombytes(base64.b64decode(data))
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
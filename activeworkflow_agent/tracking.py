@@ -0,0 +1,189 @@
+"""Change tracking for the memory of an agent.
+
+Handlers usually read the memory of a request, maybe change it and send it
+back with Response.add_memory(). To avoid sending a large memory that has
+not changed, set the track_memory class attribute of ParsedRequest:
+
+    aw.ParsedRequest.track_memory = True
+
+    def check(request):
+        response = aw.CheckResponse()
+        memory = request.memory          # A TrackedDict.
+        if new_items:
+            memory["seen"].extend(new_items)
+        response.add_memory(memory)      # Only sent if it was changed.
+        return response
+
+The memory is then a TrackedDict, a dict that records writes to itself and
+to the dicts and lists it contains. A Response given an unchanged TrackedDict
+sends it as if add_memory() had not been called, so handlers need neither
+copy the memory nor compare it with the original. Changes made through other
+references to the nested containers (obtained before they were tracked, or
+by copying them) are not seen; call mark_changed() after such changes.
+
+The number of unchanged memories that were not sent, and the number of bytes
+of JSON that this saved when it is known, are counted in stats.
+"""
+
+
+class _Stats:
+    """Counts the memories that were not sent because they were unchanged."""
+
+    __slots__ = ("unchanged_memories", "bytes_avoided")
+
+    def __init__(self):
+        self.unchanged_memories = 0
+        self.bytes_avoided = 0
+
+    def record(self, memory):
+        self.unchanged_memories += 1
+        if memory.size is not None:
+            self.bytes_avoided += memory.size
+
+
+stats = _Stats()
+
+
+class _Tracker:
+    __slots__ = ("changed",)
+
+    def __init__(self):
+        self.changed = False
+
+
+def _wrap(value, tracker):
+    if type(value) is dict:
+        return TrackedDict(value, _tracker=tracker)
+    if type(value) is list:
+        return _TrackedList(value, tracker)
+    return value
+
+
+class TrackedDict(dict):
+    """A dict that records whether it (or its contents) has been changed."""
+
+    __slots__ = ("_tracker", "size")
+
+    def __init__(self, *args, size=None, _tracker=None, **kwargs):
+        """Create a TrackedDict object.
+
+        The arguments are those of dict(), plus size: the size in bytes of
+        the JSON the memory was decoded from, if known.
+        """
+        super().__init__(*args, **kwargs)
+        self._tracker = _Tracker() if _tracker is None else _tracker
+        self.size = size
+
+    @property
+    def changed(self):
+        """Whether the memory has been changed since it was received."""
+        return self._tracker.changed
+
+    def mark_changed(self):
+        """Record a change that was not made through the TrackedDict."""
+        self._tracker.changed = True
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        wrapped = _wrap(value, self._tracker)
+        if wrapped is not value:
+            dict.__setitem__(self, key, wrapped)
+        return wrapped
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def copy(self):
+        """Returns a plain (untracked) shallow copy."""
+        return dict(self)
+
+    def __reduce__(self):
+        # Pickled (for example for a ProcessPool worker) as a plain dict:
+        # unpickling sets the items before the slots.
+        return (dict, (dict(self),))
+
+
+class _TrackedList(list):
+    """A list inside a TrackedDict."""
+
+    __slots__ = ("_tracker",)
+
+    def __init__(self, values, tracker):
+        super().__init__(values)
+        self._tracker = tracker
+
+    def __getitem__(self, index):
+        value = list.__getitem__(self, index)
+        if isinstance(index, slice):
+            return value
+        wrapped = _wrap(value, self._tracker)
+        if wrapped is not value:
+            list.__setitem__(self, index, wrapped)
+        return wrapped
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+
+def _track(cls, names):
+    """Make the methods called names of cls record a change."""
+    base = cls.__bases__[0]
+    for name in names:
+        if not hasattr(base, name):
+            continue
+
+        def mutate(self, *args, _method=getattr(base, name), **kwargs):
+            self._tracker.changed = True
+            return _method(self, *args, **kwargs)
+
+        mutate.__name__ = name
+        setattr(cls, name, mutate)
+
+
+# dict.__ior__ only exists on Python 3.9 and later.
+_track(
+    TrackedDict,
+    (
+        "__setitem__",
+        "__delitem__",
+        "__ior__",
+        "clear",
+        "pop",
+        "popitem",
+        "update",
+    ),
+)
+_track(
+    _TrackedList,
+    (
+        "__setitem__",
+        "__delitem__",
+        "__iadd__",
+        "__imul__",
+        "append",
+        "clear",
+        "extend",
+        "insert",
+        "pop",
+        "remove",
+        "reverse",
+        "sort",
+    ),
+)
@@ -0,0 +1,70 @@
+"""Compare eager and lazy decoding of requests with a large memory.
+
+The handler being simulated only reads the options of a 'check' request, so
+the lazy request never decodes the memory.
+
+Usage: python benchmarks/bench_lazy_request.py [memory size in MB]
+
+Run it from the root of the repository with the package installed (or with
+PYTHONPATH=.).
+"""
+
+import json
+import sys
+import timeit
+
+import activeworkflow_agent as aw
+from activeworkflow_agent import codec, lazy
+
+
+def make_request(memory_size):
+    entry = {"url": "https://example.org/", "n": 1}
+    count = memory_size // len(json.dumps({"id-000000": entry}))
+    seen = {"id-{:06}".format(i): entry for i in range(count)}
+    return json.dumps(
+        {
+            "method": "check",
+            "params": {
+                "message": None,
+                "options": {"url": "https://example.org/feed"},
+                "memory": {"seen": seen},
+                "credentials": [],
+            },
+        }
+    ).encode("utf-8")
+
+
+def measure(label, func, number):
+    seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print("{:<40} {:>10.3f} ms".format(label, seconds * 1000))
+
+
+def main():
+    size = float(sys.argv[1]) if len(sys.argv) > 1 else 4.0
+    data = make_request(int(size * 1024 * 1024))
+    print(
+        "Request size: {:.1f} MB, codec: {}".format(
+            len(data) / 1024 / 1024, codec.get_codec().name
+        )
+    )
+
+    def eager():
+        return aw.ParsedRequest.from_bytes(data).options
+
+    def lazy_options():
+        return aw.ParsedRequest.from_bytes(data, lazy=True).options
+
+    def lazy_all():
+        request = aw.ParsedRequest.from_bytes(data, lazy=True)
+        return request.options, request.memory
+
+    measure("eager, options only", eager, 5)
+    measure("lazy, options only", lazy_options, 5)
+    measure("lazy, options and memory", lazy_all, 5)
+    if lazy._msgspec_scan is not None:
+        lazy._msgspec_scan = None
+        measure("lazy (python scanner), options only", lazy_options, 5)
+
+
+if __name__ == "__main__":
+    main()
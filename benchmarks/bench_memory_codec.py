@@ -0,0 +1,81 @@
+"""Compare plain and compressed memories of realistic sizes.
+
+The memory simulated is the one of an agent that remembers the ids and
+digests of the items it has already seen. For every size the benchmark
+reports the size of the memory as sent to ActiveWorkflow and the time taken
+to encode it (Response) and decode it (ParsedRequest).
+
+Usage: python benchmarks/bench_memory_codec.py
+
+Run it from the root of the repository with the package installed (or with
+PYTHONPATH=.).
+"""
+
+import hashlib
+import timeit
+
+import activeworkflow_agent as aw
+from activeworkflow_agent import codec
+from activeworkflow_agent.memory_codec import MemoryCodec
+
+
+SIZES = (100, 1000, 10000, 100000)
+CODECS = (
+    ("plain", None),
+    ("zlib", MemoryCodec(threshold=0)),
+    ("zlib level 1", MemoryCodec(threshold=0, level=1)),
+    ("lzma", MemoryCodec(threshold=0, algorithm="lzma")),
+)
+
+
+def make_memory(count):
+    seen = {}
+    for i in range(count):
+        url = "https://example.org/articles/{}".format(i)
+        seen[url] = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+    return {"seen": seen, "last_run": "2024-01-01T00:00:00Z"}
+
+
+def measure(func):
+    number = 5
+    return min(timeit.repeat(func, number=number, repeat=3)) / number
+
+
+def main():
+    print("JSON codec: {}".format(codec.get_codec().name))
+    print(
+        "{:>8} {:<14} {:>12} {:>12} {:>12}".format(
+            "items", "encoding", "size (KB)", "encode (ms)", "decode (ms)"
+        )
+    )
+    for count in SIZES:
+        memory = make_memory(count)
+        for name, memory_codec in CODECS:
+            response = aw.Response()
+            response.add_memory(memory)
+            aw.Response.memory_codec = memory_codec
+            try:
+                body = response.to_bytes()
+                encode = measure(response.to_bytes)
+            finally:
+                aw.Response.memory_codec = None
+            params = codec.loads(body)["result"]
+            params.update(options={}, credentials=[])
+            data = codec.dumps({"method": "check", "params": params})
+
+            def decode():
+                return aw.ParsedRequest.from_bytes(data).memory
+
+            print(
+                "{:>8} {:<14} {:>12.1f} {:>12.3f} {:>12.3f}".format(
+                    count,
+                    name,
+                    len(body) / 1024,
+                    encode * 1000,
+                    measure(decode) * 1000,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,459 @@
+"""Benchmark suite for the request/response pipeline.
+
+Every public path a request takes is measured with payloads of realistic
+sizes: parsing requests (eager and lazy) with memories from 1 KB to 50 MB,
+building and encoding responses with 1 to 100,000 messages, flat and deeply
+nested options, and whole requests handled by AgentServer.handle().
+
+For each case the suite reports the number of operations per second, the
+peak memory allocated by Python during one operation (from tracemalloc) and
+the peak resident set size of the process. Every case runs in a fresh
+process, so that the RSS of one case does not hide the next one's.
+
+Results can be saved as a JSON baseline and later runs compared with it, to
+detect regressions between versions:
+
+    python benchmarks/suite.py --quick --label 0.1.0 \\
+        --save benchmarks/baselines/0.1.0.json
+    python benchmarks/suite.py --quick --compare \\
+        benchmarks/baselines/0.1.0.json
+
+A comparison lists the cases that got slower, or use more memory, by more
+than --threshold (20% by default) and exits with status 1 if there are any.
+Baselines are only comparable when recorded on the same machine with the
+same Python and JSON codec, which are stored with the results.
+
+Usage: python benchmarks/suite.py [--quick] [--filter TEXT] [--save FILE]
+                                  [--label TEXT] [--compare FILE]
+                                  [--threshold FRACTION]
+
+Run it from the root of the repository with the package installed (or with
+PYTHONPATH=.).
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import platform
+import resource
+import subprocess
+import sys
+import timeit
+import tracemalloc
+
+import activeworkflow_agent as aw
+from activeworkflow_agent import codec
+
+
+KB = 1024
+MB = 1024 * KB
+
+MEMORY_SIZES = (1 * KB, 64 * KB, 1 * MB, 50 * MB)
+MESSAGE_COUNTS = (1, 100, 10000, 100000)
+# The sizes used with --quick.
+QUICK_MEMORY_SIZES = (1 * KB, 64 * KB, 1 * MB)
+QUICK_MESSAGE_COUNTS = (1, 100, 10000)
+
+# Results compared with a baseline, and whether higher values are better.
+MEASURES = (
+    ("ops_per_sec", True),
+    ("alloc_peak_bytes", False),
+    ("peak_rss_kb", False),
+)
+
+
+# Payload generators.
+
+
+def make_memory(size):
+    """Returns a memory whose JSON is about size bytes."""
+    entry = {"url": "https://example.org/", "seen": True, "n": 1}
+    count = max(1, size // len(json.dumps({"id-000000": entry})))
+    return {"seen": {"id-{:06}".format(i): entry for i in range(count)}}
+
+
+def make_messages(count):
+    return [
+        {"id": i, "title": "Item {}".format(i), "tags": ["a", "b"], "ok": True}
+        for i in range(count)
+    ]
+
+
+def make_options(shape):
+    """Returns flat options (many keys) or deep options (nested)."""
+    if shape == "flat":
+        return {"option_{}".format(i): "value {}".format(i) for i in range(200)}
+    options = {"url": "https://example.org/feed", "limit": 10}
+    for depth in range(20):
+        options = {"level_{}".format(depth): options, "items": [1, 2, 3]}
+    return options
+
+
+def make_request(method="check", memory=None, options=None, message=None):
+    return {
+        "method": method,
+        "params": {
+            "message": message,
+            "options": options if options is not None else {"url": "x"},
+            "memory": memory if memory is not None else {},
+            "credentials": [{"name": "token", "value": "secret"}],
+        },
+    }
+
+
+def encode(value):
+    return json.dumps(value).encode("utf-8")
+
+
+def make_register(options=None):
+    return aw.RegisterResponse(
+        name="BenchmarkAgent",
+        display_name="Benchmark Agent",
+        description="An agent used by the benchmark suite.",
+        default_options=options or {},
+    )
+
+
+def make_response(messages):
+    response = aw.Response()
+    response.add_messages(*messages)
+    return response
+
+
+# Cases. Each setup function builds its payload and returns the operation to
+# measure.
+
+
+def parse_eager(size):
+    data = encode(make_request(memory=make_memory(size)))
+    return lambda: aw.ParsedRequest.from_bytes(data).memory
+
+
+def parse_lazy_options(size):
+    data = encode(make_request(memory=make_memory(size)))
+    return lambda: aw.ParsedRequest.from_bytes(data, lazy=True).options
+
+
+def parse_lazy_memory(size):
+    data = encode(make_request(memory=make_memory(size)))
+    return lambda: aw.ParsedRequest.from_bytes(data, lazy=True).memory
+
+
+def parse_dict(size):
+    content = make_request(memory=make_memory(size))
+    return lambda: aw.ParsedRequest(content)
+
+
+def response_memory(size):
+    memory = make_memory(size)
+
+    def run():
+        response = aw.Response()
+        response.add_memory(memory)
+        return response.to_bytes()
+
+    return run
+
+
+def add_messages(count):
+    messages = make_messages(count)
+    return lambda: make_response(messages)
+
+
+def messages_to_bytes(count):
+    response = make_response(make_messages(count))
+    return response.to_bytes
+
+
+def messages_to_json(count):
+    response = make_response(make_messages(count))
+    return response.to_json
+
+
+def messages_iter_chunks(count):
+    response = make_response(make_messages(count))
+    return lambda: sum(len(chunk) for chunk in response.iter_chunks())
+
+
+def add_logs(count):
+    logs = ["Fetched item {}".format(i) for i in range(count)]
+
+    def run():
+        response = aw.Response()
+        response.add_logs(*logs)
+        response.add_errors(*logs)
+        return response.to_bytes()
+
+    return run
+
+
+def options_hash(shape):
+    content = make_request(options=make_options(shape))
+    return lambda: aw.ParsedRequest(content).options_hash
+
+
+def options_validate(shape):
+    options = make_options(shape)
+    validator = make_register(options).options_validator
+    request = aw.ParsedRequest(make_request(options=options))
+    return lambda: validator.validate_request(request)
+
+
+def register_to_bytes(shape):
+    options = make_options(shape)
+    # A new RegisterResponse each time, since they cache their encoding.
+    return lambda: make_register(options).to_bytes()
+
+
+def server_handle(count):
+    from activeworkflow_agent.server import AgentServer
+
+    messages = make_messages(count)
+
+    def receive(request):
+        return make_response(messages)
+
+    server = AgentServer(make_register(), receive=receive)
+    data = encode(make_request("receive", message={"payload": {"n": 1}}))
+    loop = asyncio.new_event_loop()
+    return lambda: loop.run_until_complete(server.handle(data))
+
+
+def cases(quick=False):
+    """Returns a dict that maps the name of each case to (setup, arg)."""
+    memory_sizes = QUICK_MEMORY_SIZES if quick else MEMORY_SIZES
+    message_counts = QUICK_MESSAGE_COUNTS if quick else MESSAGE_COUNTS
+    result = {}
+    for setup in (
+        parse_eager,
+        parse_lazy_options,
+        parse_lazy_memory,
+        parse_dict,
+        response_memory,
+    ):
+        for size in memory_sizes:
+            name = "{}[memory={}]".format(setup.__name__, _size(size))
+            result[name] = (setup, size)
+    for setup in (
+        add_messages,
+        messages_to_bytes,
+        messages_to_json,
+        messages_iter_chunks,
+        server_handle,
+    ):
+        for count in message_counts:
+            name = "{}[messages={}]".format(setup.__name__, count)
+            result[name] = (setup, count)
+    for count in message_counts:
+        result["add_logs[entries={}]".format(count)] = (add_logs, count)
+    for setup in (options_hash, options_validate, register_to_bytes):
+        for shape in ("flat", "deep"):
+            name = "{}[options={}]".format(setup.__name__, shape)
+            result[name] = (setup, shape)
+    return result
+
+
+# Measurement.
+
+
+def measure(setup, arg):
+    """Returns the results of a case, measured in the current process."""
+    rss_before = _max_rss_kb()
+    run = setup(arg)
+    run()  # Warm up caches (and the lazy imports) before measuring.
+    timer = timeit.Timer(run)
+    number, _ = timer.autorange()
+    seconds = min(timer.repeat(repeat=3, number=number)) / number
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "ops_per_sec": 1 / seconds,
+        "alloc_peak_bytes": peak,
+        "peak_rss_kb": _max_rss_kb(),
+        "rss_growth_kb": _max_rss_kb() - rss_before,
+    }
+
+
+def _measure_case(name, quick, conn):
+    setup, arg = cases(quick)[name]
+    conn.send(measure(setup, arg))
+    conn.close()
+
+
+def run_case(name, quick):
+    """Measure a case in a new process and return its results."""
+    context = multiprocessing.get_context("spawn")
+    parent, child = context.Pipe(duplex=False)
+    process = context.Process(target=_measure_case, args=(name, quick, child))
+    process.start()
+    child.close()
+    try:
+        return parent.recv()
+    except EOFError:
+        raise RuntimeError("The case {} failed.".format(name)) from None
+    finally:
+        process.join()
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "codec": codec.get_codec().name,
+    }
+
+
+def compare(baseline, results, threshold):
+    """Returns the regressions of results compared with baseline.
+
+    Each regression is (case, measure, baseline value, new value).
+    """
+    regressions = []
+    for name, values in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for measure_name, higher_is_better in MEASURES:
+            old, new = base.get(measure_name), values.get(measure_name)
+            if not old or new is None:
+                continue
+            change = new / old - 1
+            if (higher_is_better and change < -threshold) or (
+                not higher_is_better and change > threshold
+            ):
+                regressions.append((name, measure_name, old, new))
+    return regressions
+
+
+def print_header():
+    print(
+        "{:<44} {:>12} {:>14} {:>12} {:>9}".format(
+            "case", "ops/sec", "alloc (KB)", "RSS (MB)", "change"
+        )
+    )
+
+
+def print_results(results, baseline=None):
+    for name, values in results.items():
+        change = ""
+        if baseline and name in baseline:
+            old = baseline[name]["ops_per_sec"]
+            change = "{:+.0%}".format(values["ops_per_sec"] / old - 1)
+        print(
+            "{:<44} {:>12.1f} {:>14.1f} {:>12.1f} {:>9}".format(
+                name,
+                values["ops_per_sec"],
+                values["alloc_peak_bytes"] / KB,
+                values["peak_rss_kb"] / KB,
+                change,
+            )
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--quick", action="store_true", help="skip the largest payloads"
+    )
+    parser.add_argument(
+        "--filter", help="only run the cases whose name contains this text"
+    )
+    parser.add_argument("--save", help="save the results to this JSON file")
+    parser.add_argument(
+        "--label", help="a label saved with the results, such as a version"
+    )
+    parser.add_argument("--compare", help="compare with this JSON baseline")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="the relative change reported as a regression (default 0.2)",
+    )
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as fp:
+            saved = json.load(fp)
+        baseline = saved["results"]
+        if saved["environment"] != environment():
+            print(
+                "Warning: the baseline was recorded in another environment: "
+                "{}".format(saved["environment"]),
+                file=sys.stderr,
+            )
+
+    names = [
+        name
+        for name in cases(args.quick)
+        if args.filter is None or args.filter in name
+    ]
+    results = {}
+    print_header()
+    for name in names:
+        results[name] = run_case(name, args.quick)
+        print_results({name: results[name]}, baseline)
+
+    if args.save:
+        with open(args.save, "w") as fp:
+            json.dump(
+                {
+                    "label": args.label,
+                    "revision": _revision(),
+                    "environment": environment(),
+                    "results": results,
+                },
+                fp,
+                indent=2,
+                sort_keys=True,
+            )
+            fp.write("\n")
+
+    if baseline is not None:
+        regressions = compare(baseline, results, args.threshold)
+        for name, measure_name, old, new in regressions:
+            print(
+                "Regression: {} {} {:.1f} -> {:.1f} ({:+.0%})".format(
+                    name, measure_name, old, new, new / old - 1
+                )
+            )
+        if regressions:
+            return 1
+    return 0
+
+
+def _max_rss_kb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return rss // KB if sys.platform == "darwin" else rss
+
+
+def _revision():
+    """Returns the git revision of the working tree, if known."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+            universal_newlines=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _size(size):
+    if size >= MB:
+        return "{}MB".format(size // MB)
+    return "{}KB".format(size // KB)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -25,7 +25,15 @@ setup(
         "Programming Language :: Python :: 3.9",
     ],
     packages=["activeworkflow_agent"],
+    entry_points={
+        "console_scripts": [
+            "activeworkflow-agent = activeworkflow_agent.cli:main",
+        ],
+    },
     extras_require={
         "test": ["pytest", "schema"],
+        "orjson": ["orjson"],
+        "msgspec": ["msgspec"],
+        "ujson": ["ujson"],
     }
 )
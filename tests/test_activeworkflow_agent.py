@@ -1,3 +1,5 @@
+import asyncio
+import io
 import json
 import pytest
 
@@ -116,6 +118,65 @@ def test_register_response_with_invalid_default_options():
         )
 
 
+def test_register_response_to_bytes_is_cached(agent_registration_details):
+    """RegisterResponse.to_bytes() returns the same object until changed."""
+    response = aw.RegisterResponse(**agent_registration_details)
+
+    assert response.to_bytes() is response.to_bytes()
+
+
+def test_register_response_cache_invalidated_by_assignment(
+    agent_registration_details,
+):
+    """Assigning a field updates the cached JSON and ETag."""
+    response = aw.RegisterResponse(**agent_registration_details)
+    etag = response.etag
+
+    response.description = "A new description."
+
+    assert json.loads(response.to_bytes())["result"]["description"] == (
+        "A new description."
+    )
+    assert response.etag != etag
+
+
+def test_register_response_cache_invalidated_by_mutation(
+    agent_registration_details,
+):
+    """Modifying default_options in place updates the cached JSON."""
+    agent_registration_details["default_options"] = {"url": {"a": 1}}
+    response = aw.RegisterResponse(**agent_registration_details)
+    etag = response.etag
+
+    response.default_options["url"]["a"] = 2
+
+    assert json.loads(response.to_bytes())["result"]["default_options"] == {
+        "url": {"a": 2}
+    }
+    assert response.etag != etag
+
+
+def test_register_response_validates_assigned_fields(
+    agent_registration_details,
+):
+    """Throws an exception when an assigned field is invalid."""
+    response = aw.RegisterResponse(**agent_registration_details)
+
+    response.name = None
+
+    with pytest.raises(TypeError):
+        response.to_bytes()
+
+
+def test_register_response_etag(agent_registration_details):
+    """RegisterResponse.etag is a quoted hash of the JSON."""
+    response = aw.RegisterResponse(**agent_registration_details)
+    same = aw.RegisterResponse(**agent_registration_details)
+
+    assert response.etag.startswith('"') and response.etag.endswith('"')
+    assert response.etag == same.etag
+
+
 ### Response
 
 
@@ -277,3 +338,196 @@ def test_response_to_json():
     response.add_memory({"Something": {"to": "remember"}})
 
     json.loads(response.to_json())
+
+
+def test_response_iter_chunks():
+    """Response.iter_chunks() yields chunks that join to the JSON."""
+    response = aw.Response()
+    response.add_errors("An error")
+    response.add_logs("Log something")
+    response.add_messages(*({"n": n, "text": "é" * 50} for n in range(100)))
+    response.add_memory({"Something": {"to": "remember"}})
+
+    chunks = list(response.iter_chunks(chunk_size=1000))
+
+    assert len(chunks) > 1
+    assert all(len(chunk) < 1200 for chunk in chunks)
+    assert b"".join(chunks) == response.to_bytes()
+
+
+def test_empty_response_iter_chunks():
+    """An empty Response is yielded in one chunk."""
+    response = aw.Response()
+
+    assert list(response.iter_chunks()) == [response.to_bytes()]
+
+
+def test_response_write_to():
+    """Response.write_to() writes the JSON to a file-like object."""
+    response = aw.Response()
+    response.add_messages({"Hello": "World"}, {"Hi": 1})
+    fp = io.BytesIO()
+
+    size = response.write_to(fp, chunk_size=1)
+
+    assert fp.getvalue() == response.to_bytes()
+    assert size == len(response.to_bytes())
+
+
+def test_add_messages_from_iterable():
+    """Messages from an iterable are consumed when the response is built."""
+    consumed = []
+
+    def generate():
+        for n in range(3):
+            consumed.append(n)
+            yield {"n": n}
+
+    response = aw.Response()
+    response.add_messages({"first": True})
+    response.add_messages_from(generate())
+    response.add_messages({"last": True})
+
+    assert consumed == []
+    assert response.to_dict()["result"]["messages"] == [
+        {"first": True},
+        {"n": 0},
+        {"n": 1},
+        {"n": 2},
+        {"last": True},
+    ]
+
+
+def test_add_messages_from_only_accepts_iterables():
+    """Throws an exception when messages is not an iterable of dicts."""
+    response = aw.Response()
+
+    with pytest.raises(TypeError):
+        response.add_messages_from({"Hello": "World"})
+
+
+def test_add_messages_from_validates_messages_lazily():
+    """Throws an exception when a message produced is not a dict."""
+    response = aw.Response()
+    response.add_messages_from([{"Hello": "World"}, "Bye Now"])
+
+    with pytest.raises(TypeError):
+        response.to_dict()
+
+
+def test_response_iter_chunks_with_iterable():
+    """Messages from an iterable are streamed and not kept."""
+    response = aw.Response()
+    response.add_messages_from({"n": n} for n in range(1000))
+    expected = json.dumps(
+        {"result": {"messages": [{"n": n} for n in range(1000)]}}
+    )
+
+    chunks = list(response.iter_chunks(chunk_size=100))
+
+    assert len(chunks) > 1
+    assert json.loads(b"".join(chunks))["result"]["messages"] == json.loads(
+        expected
+    )["result"]["messages"]
+
+
+def test_response_aiter_chunks_with_async_iterable():
+    """Messages from an async iterable are streamed by aiter_chunks()."""
+
+    async def generate():
+        for n in range(10):
+            yield {"n": n}
+
+    async def collect(response):
+        return b"".join([chunk async for chunk in response.aiter_chunks()])
+
+    response = aw.Response()
+    response.add_messages({"first": True})
+    response.add_messages_from(generate())
+
+    result = json.loads(asyncio.run(collect(response)))["result"]
+
+    assert result["messages"] == [{"first": True}] + [
+        {"n": n} for n in range(10)
+    ]
+
+
+def test_response_to_dict_with_async_iterable():
+    """Throws an exception when async messages are not streamed."""
+
+    async def generate():
+        yield {"n": 1}
+
+    response = aw.Response()
+    response.add_messages_from(generate())
+
+    with pytest.raises(TypeError):
+        response.to_dict()
+
+
+def test_response_max_messages_truncates():
+    """Messages over max_messages are dropped and the drop is logged."""
+    closed = []
+
+    def generate():
+        try:
+            for n in range(100):
+                yield {"n": n}
+        finally:
+            closed.append(True)
+
+    response = aw.Response(max_messages=5)
+    response.add_messages_from(generate())
+
+    result = json.loads(b"".join(response.iter_chunks()))["result"]
+
+    assert result["messages"] == [{"n": n} for n in range(5)]
+    assert result["logs"] == ["Messages truncated at the limit of 5 messages."]
+    assert closed == [True]
+
+
+def test_response_max_messages_size_truncates():
+    """Messages over max_messages_size bytes are dropped."""
+    response = aw.Response(max_messages_size=35)
+    response.add_messages(*({"n": n} for n in range(10)))
+
+    result = response.to_dict()["result"]
+
+    assert result["messages"] == [{"n": n} for n in range(5)]
+    assert result["logs"] == ["Messages truncated at the limit of 35 bytes."]
+
+
+def test_response_max_messages_error():
+    """Messages over max_messages raise an error with overflow='error'."""
+    response = aw.Response(max_messages=1, overflow="error")
+    response.add_messages({"n": 1}, {"n": 2})
+
+    with pytest.raises(ValueError):
+        response.to_bytes()
+
+
+def test_response_with_limits_iter_chunks_equal_to_bytes():
+    """Limits are applied in the same way by to_bytes() and iter_chunks()."""
+
+    def build():
+        response = aw.Response(max_messages=3)
+        response.add_messages(*({"n": n} for n in range(5)))
+        return response
+
+    assert b"".join(build().iter_chunks()) == build().to_bytes()
+
+    # The truncation is reported once when the same response is serialised
+    # again.
+    response = build()
+    chunks = b"".join(response.iter_chunks())
+    assert response.to_bytes() == chunks
+    assert b"".join(response.iter_chunks()) == chunks
+    assert json.loads(chunks)["result"]["logs"] == [
+        "Messages truncated at the limit of 3 messages."
+    ]
+
+
+def test_response_invalid_overflow():
+    """Throws an exception when overflow is not a known policy."""
+    with pytest.raises(ValueError):
+        aw.Response(overflow="ignore")
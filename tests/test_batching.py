@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+import activeworkflow_agent as aw
+from activeworkflow_agent.batching import Batcher
+from activeworkflow_agent.stats import Histogram
+
+
+def echo_batch(requests):
+    responses = []
+    for request in requests:
+        response = aw.ReceiveResponse()
+        response.add_messages({"batch": len(requests), **request.message})
+        responses.append(response)
+    return responses
+
+
+def submit_all(batcher, requests, delay=0):
+    async def main():
+        tasks = []
+        for request in requests:
+            tasks.append(asyncio.ensure_future(batcher.submit(request)))
+            await asyncio.sleep(delay)
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    return asyncio.run(main())
+
+
+def receive_requests(receive_method_request, count):
+    requests = []
+    for n in range(count):
+        receive_method_request["params"]["message"]["payload"] = {"n": n}
+        requests.append(aw.ParsedRequest(receive_method_request))
+    return requests
+
+
+def test_requests_are_batched(receive_method_request):
+    batcher = Batcher(echo_batch, max_batch_size=4, max_wait=1)
+    requests = receive_requests(receive_method_request, 8)
+
+    responses = submit_all(batcher, requests)
+
+    assert [r.to_dict()["result"]["messages"] for r in responses] == [
+        [{"batch": 4, "n": n}] for n in range(8)
+    ]
+    assert batcher.batch_sizes.count == 2
+    assert batcher.batch_sizes.mean == 4
+    assert batcher.wait_times.count == 8
+
+
+def test_batches_are_sent_after_max_wait(receive_method_request):
+    async def handler(requests):
+        return echo_batch(requests)
+
+    batcher = Batcher(handler, max_batch_size=100, max_wait=0.01)
+
+    responses = submit_all(
+        batcher, receive_requests(receive_method_request, 3)
+    )
+
+    assert len(responses) == 3
+    assert batcher.batch_sizes.count == 1
+    assert batcher.wait_times.sum >= 0.01 * 3 * 0.9
+
+
+def test_handler_errors_are_raised_for_every_request(receive_method_request):
+    def handler(requests):
+        return []
+
+    batcher = Batcher(handler, max_batch_size=2)
+
+    errors = submit_all(batcher, receive_requests(receive_method_request, 2))
+
+    assert all(isinstance(e, ValueError) for e in errors)
+
+
+def test_histogram():
+    histogram = Histogram((1, 5, 10))
+    for value in (0, 1, 2, 10, 11):
+        histogram.observe(value)
+
+    assert histogram.counts == [2, 1, 1, 1]
+    assert histogram.cumulative() == [
+        (1, 2),
+        (5, 3),
+        (10, 4),
+        (float("inf"), 5),
+    ]
+    assert histogram.mean == 24 / 5
+
+
+def test_histogram_requires_increasing_bounds():
+    with pytest.raises(ValueError):
+        Histogram((5, 1))
+
+
+def test_batch_tasks_are_kept_until_done(receive_method_request):
+    batcher = Batcher(echo_batch, max_batch_size=2, max_wait=1)
+    requests = receive_requests(receive_method_request, 2)
+
+    async def main():
+        tasks = [asyncio.ensure_future(batcher.submit(r)) for r in requests]
+        await asyncio.sleep(0)
+        running = len(batcher._tasks)
+        await asyncio.gather(*tasks)
+        await asyncio.sleep(0)
+        return running
+
+    assert asyncio.run(main()) == 1
+    assert not batcher._tasks
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import tracemalloc
+
+import pytest
+
+import activeworkflow_agent as aw
+from activeworkflow_agent import codec
+from activeworkflow_agent.buffers import BufferPool, OutputBuffer
+from activeworkflow_agent.server import AgentServer
+
+
+SIZE = 2 * 1024 * 1024
+
+
+def peak_allocated(func):
+    """Returns the peak of the memory allocated while func runs."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class RecordingWriter:
+    """A StreamWriter that records what is written, without keeping it."""
+
+    def __init__(self):
+        self.writes = []
+
+    def write(self, data):
+        if isinstance(data, memoryview):
+            self.writes.append(("view", id(data.obj), len(data)))
+        else:
+            self.writes.append(("copy", id(data), len(data)))
+
+    async def drain(self):
+        pass
+
+
+class Connection:
+    def __init__(self):
+        self.writer = RecordingWriter()
+
+
+@pytest.fixture()
+def default_codec():
+    yield
+    codec.set_codec(None)
+
+
+def test_buffer_pool_reuses_buffers():
+    pool = BufferPool(max_buffers=1, size=100)
+    first = pool.acquire()
+    second = pool.acquire()
+    pool.release(first)
+    pool.release(second)
+
+    assert len(first) == 100
+    assert len(pool) == 1
+    assert pool.acquire() is first
+    assert (pool.created, pool.reused) == (2, 1)
+
+
+def test_buffer_pool_drops_large_and_exported_buffers():
+    pool = BufferPool(max_size=10)
+    view = memoryview(bytearray(5))[1:]
+    pool.release(view.obj)
+    pool.release(bytearray(11))
+
+    assert len(pool) == 0
+    buffer = view.obj
+    view.release()
+    pool.release(buffer)
+    assert len(pool) == 1
+
+
+def test_output_buffer_writes_after_head_room():
+    data = bytearray(8)
+    buffer = OutputBuffer(data, head_room=4)
+    buffer += b"abc"
+    buffer += b"defgh"
+
+    assert len(buffer) == 8
+    assert buffer.getvalue() == b"abcdefgh"
+    assert bytes(buffer.frame(b"8\r\n", b"\r\n")) == b"8\r\nabcdefgh\r\n"
+    assert buffer.data is data
+    with pytest.raises(ValueError):
+        buffer.frame(b"too long")
+
+
+def test_output_buffer_extends_small_bytearrays():
+    buffer = OutputBuffer(bytearray(), head_room=4)
+    buffer += b"abc"
+
+    assert buffer.getvalue() == b"abc"
+
+
+def test_response_encodes_into_output_buffers():
+    response = aw.ReceiveResponse()
+    response.add_messages(*({"n": i} for i in range(1000)))
+    response.add_logs("done")
+    expected = response.to_bytes()
+    pool = BufferPool(size=256)
+
+    async def encode():
+        return [
+            buffer.getvalue()
+            async for buffer in response._aiter_buffers(
+                100, lambda: OutputBuffer(pool.acquire(), 16)
+            )
+        ]
+
+    chunks = asyncio.run(encode())
+
+    assert len(chunks) > 1
+    assert b"".join(chunks) == expected
+
+
+def test_streamed_chunks_are_written_from_pooled_buffers(
+    agent_registration_details,
+):
+    message = {"text": "x" * 1000}
+    response_size = len(json.dumps(message)) * 2000
+    server = AgentServer(
+        aw.RegisterResponse(**agent_registration_details), chunk_size=65536
+    )
+
+    def stream():
+        response = aw.ReceiveResponse()
+        response.add_messages(*[message] * 2000)
+        conn = Connection()
+        asyncio.run(
+            server._write_chunked(conn, response, True, "receive")
+        )
+        return conn.writer.writes
+
+    stream()  # Fill the pool.
+    writes = []
+    peak = peak_allocated(lambda: writes.extend(stream()))
+    head, chunks = writes[0], writes[1:-1]
+
+    # One write per chunk, of a view of a reused buffer: the JSON is never
+    # copied after it is encoded, and no buffer is allocated.
+    assert head[0] == "copy"
+    assert len(chunks) > 10
+    assert {kind for kind, _, _ in chunks} == {"view"}
+    assert len({buffer for _, buffer, _ in chunks}) == 1
+    assert sum(size for _, _, size in chunks) > response_size
+    assert server.buffer_pool.created == 1
+    assert peak < response_size / 10
+
+
+@pytest.mark.parametrize("name", codec.PREFERENCE)
+def test_requests_are_parsed_without_copying_the_body(default_codec, name):
+    try:
+        codec.set_codec(name)
+    except ImportError:
+        pytest.skip("{} is not installed".format(name))
+    body = json.dumps(
+        {
+            "method": "check",
+            "params": {
+                "message": None,
+                "options": {},
+                "memory": {"blob": "x" * SIZE},
+                "credentials": [],
+            },
+        }
+    ).encode("utf-8")
+
+    from_bytes = peak_allocated(lambda: aw.ParsedRequest.from_bytes(body))
+    from_view = peak_allocated(
+        lambda: aw.ParsedRequest.from_bytes(memoryview(body))
+    )
+    lazy = peak_allocated(
+        lambda: aw.ParsedRequest.from_bytes(body, lazy=True).memory
+    )
+
+    if name == "ujson":
+        pytest.skip("ujson copies its input")
+    # Decoding the memory creates a string of SIZE bytes; the body itself,
+    # or a memoryview of it, is not copied. The standard library decodes
+    # the whole body to a string first.
+    copies = 2 if name == "stdlib" else 1
+    for peak in (from_bytes, from_view, lazy):
+        assert peak < (copies + 0.5) * SIZE
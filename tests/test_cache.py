@@ -0,0 +1,200 @@
+import asyncio
+import threading
+
+import pytest
+
+import activeworkflow_agent as aw
+from activeworkflow_agent.cache import ResourceCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def request_with(check_method_request, options=None, credentials=None):
+    params = check_method_request["params"]
+    if options is not None:
+        params["options"] = options
+    if credentials is not None:
+        params["credentials"] = credentials
+    return aw.ParsedRequest(check_method_request)
+
+
+def new_list(request):
+    return []
+
+
+def test_resources_are_reused(check_method_request):
+    cache = ResourceCache()
+    request = request_with(check_method_request)
+
+    first = cache.get(request, lambda r: object())
+    second = cache.get(request_with(check_method_request), new_list)
+
+    assert first is second
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_resources_are_keyed_by_options(check_method_request):
+    cache = ResourceCache()
+    first = cache.get(request_with(check_method_request, {"a": 1}), new_list)
+    second = cache.get(request_with(check_method_request, {"a": 2}), new_list)
+
+    assert first is not second
+    assert len(cache) == 2
+
+
+def test_resources_keyed_by_credentials(check_method_request):
+    cache = ResourceCache(include_credentials=True)
+    credentials = [{"name": "token", "value": "1"}]
+    first = cache.get(request_with(check_method_request), new_list)
+    second = cache.get(
+        request_with(check_method_request, credentials=credentials),
+        new_list,
+    )
+
+    assert first is not second
+
+
+def test_least_recently_used_resource_is_evicted(check_method_request):
+    torn_down = []
+    cache = ResourceCache(max_entries=2, teardown=torn_down.append)
+    requests = [request_with(check_method_request, {"n": n}) for n in range(3)]
+    resources = [cache.get(request, new_list) for request in requests[:2]]
+
+    cache.get(requests[0], new_list)
+    cache.get(requests[2], new_list)
+
+    assert torn_down == [resources[1]]
+    assert cache.key_for(requests[1]) not in cache
+    assert cache.evictions == 1
+
+
+def test_resources_expire(check_method_request):
+    clock = Clock()
+    torn_down = []
+    cache = ResourceCache(ttl=10, teardown=torn_down.append, clock=clock)
+    request = request_with(check_method_request)
+    first = cache.get(request, new_list)
+
+    clock.now = 9
+    assert cache.get(request, new_list) is first
+    clock.now = 10
+    second = cache.get(request, new_list)
+
+    assert second is not first
+    assert torn_down == [first]
+
+
+def test_expire(check_method_request):
+    clock = Clock()
+    cache = ResourceCache(ttl=10, clock=clock)
+    cache.get(request_with(check_method_request), new_list)
+
+    clock.now = 10
+    cache.expire()
+
+    assert len(cache) == 0
+
+
+def test_memory_cap(check_method_request):
+    torn_down = []
+    cache = ResourceCache(max_size=10, sizeof=len, teardown=torn_down.append)
+    requests = [request_with(check_method_request, {"n": n}) for n in range(3)]
+    first = cache.get(requests[0], lambda r: "x" * 6)
+    cache.get(requests[1], lambda r: "y" * 6)
+    cache.get(requests[2], lambda r: "z" * 11)
+
+    assert torn_down == [first]
+    assert len(cache) == cache.size // 6 == 1
+
+
+def test_invalidate_and_clear(check_method_request):
+    torn_down = []
+    cache = ResourceCache(teardown=torn_down.append)
+    first = cache.get(request_with(check_method_request, {"n": 1}), new_list)
+    second = cache.get(request_with(check_method_request, {"n": 2}), new_list)
+
+    cache.invalidate(request_with(check_method_request, {"n": 1}))
+    cache.clear()
+
+    assert torn_down == [first, second]
+    assert cache.size == len(cache) == 0
+
+
+def test_teardown_errors_are_ignored(check_method_request):
+    def teardown(resource):
+        raise RuntimeError("Boom")
+
+    cache = ResourceCache(teardown=teardown)
+    cache.get(request_with(check_method_request), new_list)
+
+    cache.clear()
+
+
+def test_factory_is_called_once_by_threads(check_method_request):
+    calls = []
+    release = threading.Event()
+
+    def factory(request):
+        calls.append(request)
+        release.wait(1)
+        return object()
+
+    cache = ResourceCache()
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(
+                cache.get(aw.ParsedRequest(check_method_request), factory)
+            )
+        )
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(set(map(id, results))) == 1
+
+
+def test_factory_is_awaited_once_by_tasks(check_method_request):
+    calls = []
+
+    async def factory(request):
+        calls.append(request)
+        await asyncio.sleep(0.01)
+        return object()
+
+    cache = ResourceCache()
+
+    async def main():
+        return await asyncio.gather(
+            *(
+                cache.aget(aw.ParsedRequest(check_method_request), factory)
+                for _ in range(4)
+            )
+        )
+
+    results = asyncio.run(main())
+
+    assert len(calls) == 1
+    assert len(set(map(id, results))) == 1
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_factory_errors_are_not_cached(check_method_request):
+    cache = ResourceCache()
+    request = request_with(check_method_request)
+
+    with pytest.raises(ZeroDivisionError):
+        cache.get(request, lambda r: 1 / 0)
+
+    assert cache.get(request, new_list) == []
@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+import pytest
+
+import activeworkflow_agent as aw
+from activeworkflow_agent.coalesce import SingleFlight, idempotent
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def counting_call(calls, result="result"):
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return result
+
+    return call
+
+
+def test_concurrent_calls_are_shared():
+    calls = []
+    flight = SingleFlight()
+
+    async def main():
+        return await asyncio.gather(
+            *(flight.run("key", counting_call(calls)) for _ in range(3)),
+            flight.run("other", counting_call(calls, "other")),
+        )
+
+    results = asyncio.run(main())
+
+    assert results == ["result", "result", "result", "other"]
+    assert len(calls) == flight.calls == 2
+    assert flight.coalesced == 2
+
+
+def test_results_are_not_kept_without_ttl():
+    calls = []
+    flight = SingleFlight()
+
+    async def main():
+        await flight.run("key", counting_call(calls))
+        await flight.run("key", counting_call(calls))
+
+    asyncio.run(main())
+
+    assert len(calls) == 2
+
+
+def test_results_are_kept_for_ttl():
+    calls = []
+    clock = Clock()
+    flight = SingleFlight(ttl=5, clock=clock)
+
+    async def main():
+        await flight.run("key", counting_call(calls))
+        clock.now = 4
+        await flight.run("key", counting_call(calls))
+        clock.now = 5
+        await flight.run("key", counting_call(calls))
+
+    asyncio.run(main())
+
+    assert len(calls) == 2
+    assert flight.cache_hits == 1
+
+
+def test_errors_are_shared_but_not_kept():
+    flight = SingleFlight(ttl=5)
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("Boom")
+
+    async def main():
+        results = await asyncio.gather(
+            flight.run("key", fail),
+            flight.run("key", fail),
+            return_exceptions=True,
+        )
+        return results, await flight.run("key", counting_call([]))
+
+    errors, result = asyncio.run(main())
+
+    assert all(isinstance(e, RuntimeError) for e in errors)
+    assert result == "result"
+
+
+def test_idempotent():
+    @idempotent(ttl=3)
+    def check(request):
+        pass
+
+    assert check.idempotent_ttl == 3
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_content_hash(check_method_request, lazy):
+    def parse():
+        data = json.dumps(check_method_request).encode("utf-8")
+        return aw.ParsedRequest.from_bytes(data, lazy=lazy)
+
+    first = parse()
+    second = parse()
+    check_method_request["params"]["memory"] = {"key": "other"}
+    other = parse()
+
+    assert first.content_hash == second.content_hash
+    assert first.content_hash != other.content_hash
@@ -0,0 +1,158 @@
+import json
+
+import pytest
+
+import activeworkflow_agent as aw
+from activeworkflow_agent import codec
+
+
+BACKENDS = list(codec.PREFERENCE)
+
+# Documents every backend encodes to exactly the same bytes.
+CANONICAL = [
+    None,
+    True,
+    0,
+    -42,
+    2 ** 63 - 1,
+    -(2 ** 63),
+    "",
+    "plain",
+    "quotes \" and \\ backslashes",
+    "control \n\t\r\b\f \x00 \x1f",
+    "slash / and unicode é ü 漢字 🚀",
+    [],
+    {},
+    [1, [2, [3, []]], {}],
+    {"nested": {"list": [1, "a", None, False]}, "empty": {}},
+    {"b": 1, "a": 2},
+    1.5,
+    0.1,
+    -0.25,
+]
+
+# Documents every backend encodes to JSON that decodes to the same value.
+EQUIVALENT = [
+    1e16,
+    1.0,
+    1 / 3,
+    1e-7,
+    123456.789e200,
+    2 ** 70,
+    "line separator  ",
+    ("a", "tuple"),
+    {1: "int key"},
+]
+
+
+def backend(name):
+    try:
+        return codec.get_codec(name)
+    except ImportError:
+        pytest.skip("{} is not installed".format(name))
+
+
+@pytest.fixture(params=BACKENDS)
+def json_codec(request):
+    return backend(request.param)
+
+
+@pytest.fixture()
+def default_codec():
+    yield
+    codec.set_codec(None)
+
+
+@pytest.mark.parametrize("doc", CANONICAL, ids=repr)
+def test_codec_encodes_canonical_documents_identically(json_codec, doc):
+    expected = json.dumps(
+        doc, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+    assert json_codec.dumps(doc) == expected
+
+
+@pytest.mark.parametrize("doc", CANONICAL + EQUIVALENT, ids=repr)
+def test_codec_round_trips_to_stdlib_equivalent(json_codec, doc):
+    encoded = json_codec.dumps(doc)
+
+    assert isinstance(encoded, bytes)
+    assert json.loads(encoded) == json.loads(json.dumps(doc))
+
+
+@pytest.mark.parametrize("doc", CANONICAL, ids=repr)
+def test_codec_decodes_like_stdlib(json_codec, doc):
+    data = json.dumps(doc).encode("utf-8")
+
+    assert json_codec.loads(data) == json.loads(data)
+    assert json_codec.loads(bytearray(data)) == json.loads(data)
+    assert json_codec.loads(memoryview(data)) == json.loads(data)
+
+
+@pytest.mark.parametrize("data", [b"", b"{", b"[1,]", b"{'a': 1}", b"nul"])
+def test_codec_rejects_invalid_json_with_value_error(json_codec, data):
+    with pytest.raises(ValueError):
+        json_codec.loads(data)
+
+
+def test_codec_rejects_unserialisable_objects(json_codec):
+    with pytest.raises(TypeError):
+        json_codec.dumps({"a": object()})
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        codec.get_codec("yaml")
+
+
+def test_stdlib_codec_is_always_available():
+    assert "stdlib" in codec.available_codecs()
+
+
+def test_set_codec(default_codec):
+    codec.set_codec("stdlib")
+
+    assert codec.get_codec().name == "stdlib"
+
+
+def test_codec_selected_by_environment(default_codec, monkeypatch):
+    monkeypatch.setenv(codec.ENV_VARIABLE, "stdlib")
+    codec.set_codec(None)
+
+    assert codec.get_codec().name == "stdlib"
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_parsed_request_from_bytes(default_codec, name, receive_method_request):
+    backend(name)
+    codec.set_codec(name)
+    data = json.dumps(receive_method_request).encode("utf-8")
+
+    request = aw.ParsedRequest.from_bytes(data)
+
+    assert request.method == "receive"
+    assert request.message == {"a": 1, "b": 2}
+    assert request.credentials == receive_method_request["params"][
+        "credentials"
+    ]
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_response_to_bytes_is_identical_across_backends(default_codec, name):
+    backend(name)
+    codec.set_codec(name)
+    response = aw.Response()
+    response.add_logs("Log é")
+    response.add_messages({"Hello": "World/🚀"}, {"Hi": 1})
+    response.add_memory({"Something": {"to": ["remember", None]}})
+
+    assert response.to_bytes() == json.dumps(
+        response.to_dict(), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+    assert response.to_json() == response.to_bytes().decode("utf-8")
+
+
+def test_register_response_to_bytes(agent_registration_details):
+    response = aw.RegisterResponse(**agent_registration_details)
+
+    assert json.loads(response.to_bytes()) == response.to_dict()
@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+import activeworkflow_agent as aw
+from activeworkflow_agent import lazy
+from activeworkflow_agent.credentials import Credentials
+
+
+CREDENTIALS = [
+    {"name": "admin_email", "value": "admin@example.org"},
+    {"name": "api_key", "value": "secret"},
+    {"name": "admin_email", "value": "duplicate@example.org"},
+]
+
+
+@pytest.fixture()
+def intern_credentials(monkeypatch):
+    monkeypatch.setattr(aw.ParsedRequest, "intern_credentials", True)
+
+
+def test_credentials_lookup():
+    credentials = Credentials(CREDENTIALS)
+
+    assert credentials["api_key"] == "secret"
+    assert credentials.get("admin_email") == "admin@example.org"
+    assert credentials.get("missing") is None
+    assert "api_key" in credentials
+    assert len(credentials) == 2
+    assert sorted(credentials) == ["admin_email", "api_key"]
+
+
+def test_credentials_unknown_name():
+    with pytest.raises(KeyError):
+        Credentials(CREDENTIALS)["missing"]
+
+
+def test_credentials_repr_does_not_show_values():
+    assert "secret" not in repr(Credentials(CREDENTIALS))
+
+
+def test_credentials_resolve():
+    credentials = Credentials(CREDENTIALS)
+    options = {
+        "url": "https://example.org/?key={% credential api_key %}",
+        "headers": [{"From": "{%credential admin_email%}"}],
+        "count": 3,
+    }
+
+    assert credentials.resolve(options) == {
+        "url": "https://example.org/?key=secret",
+        "headers": [{"From": "admin@example.org"}],
+        "count": 3,
+    }
+
+
+def test_credentials_resolve_unknown_name():
+    with pytest.raises(KeyError):
+        Credentials(CREDENTIALS).resolve("{% credential missing %}")
+
+
+def test_interned_credentials_are_shared():
+    first = Credentials.interned(CREDENTIALS)
+    second = Credentials.interned([dict(c) for c in CREDENTIALS])
+
+    assert first is second
+    assert first is not Credentials.interned(CREDENTIALS[:1])
+
+
+def test_parsed_request_credentials_index(receive_method_request):
+    request = aw.ParsedRequest(receive_method_request)
+
+    assert request.credentials_index["admin_email"] == "admin@example.org"
+    assert request.credentials_index is request.credentials_index
+    assert request.credentials_index is not aw.ParsedRequest(
+        receive_method_request
+    ).credentials_index
+
+
+def test_parsed_request_option_credential(receive_method_request):
+    request = aw.ParsedRequest(receive_method_request)
+
+    assert request.option_credential("email_credential") == "admin@example.org"
+    assert request.option_credential("option") is None
+    assert request.option_credential("missing", "default") == "default"
+
+
+def test_register_request_credentials_index(register_method_request):
+    request = aw.ParsedRequest(register_method_request)
+
+    assert len(request.credentials_index) == 0
+
+
+def test_parsed_request_interned_credentials_index(
+    intern_credentials, receive_method_request
+):
+    first = aw.ParsedRequest(receive_method_request)
+    second = aw.ParsedRequest(receive_method_request)
+
+    assert first.credentials_index is second.credentials_index
+
+
+def test_lazy_request_interned_credentials_index(
+    intern_credentials, receive_method_request
+):
+    data = json.dumps(receive_method_request).encode("utf-8")
+    lazy.LazyParsedRequest(data).credentials_index
+
+    request = lazy.LazyParsedRequest(data)
+
+    assert request.credentials_index["admin_email"] == "admin@example.org"
+    assert "credentials" not in request.decoded_fields
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+import activeworkflow_agent as aw
+from activeworkflow_agent.deadline import Deadline, DeadlineExceeded
+from activeworkflow_agent.server import AgentServer
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture()
+def server(agent_registration_details):
+    def make(**kwargs):
+        register = aw.RegisterResponse(**agent_registration_details)
+        return AgentServer(register, deadlines=0.05, **kwargs)
+
+    return make
+
+
+def result_of(server, request):
+    body = asyncio.run(server.handle(json.dumps(request).encode("utf-8")))
+    return json.loads(body)["result"]
+
+
+def test_deadline():
+    clock = Clock()
+    deadline = Deadline(5, clock=clock)
+
+    clock.now += 2
+    assert deadline.remaining() == 3
+    assert not deadline.expired
+    deadline.check()
+
+    clock.now += 3
+    assert deadline.remaining() == 0
+    assert deadline.expired
+    with pytest.raises(DeadlineExceeded):
+        deadline.check()
+
+
+def test_requests_without_deadline(check_method_request):
+    assert aw.ParsedRequest(check_method_request).deadline is None
+
+
+def test_async_handler_is_cancelled(server, check_method_request):
+    cancelled = []
+
+    async def check(request):
+        response = request.deadline.attach(aw.CheckResponse())
+        response.add_messages({"n": 1})
+        response.add_memory({"done": 1})
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(request)
+            raise
+        response.add_messages({"n": 2})
+        return response
+
+    result = result_of(server(check=check), check_method_request)
+
+    assert result["messages"] == [{"n": 1}]
+    assert result["memory"] == {"done": 1}
+    assert "partial" in result["errors"][0]
+    assert len(cancelled) == 1
+
+
+def test_thread_handler_is_cut_off(server, check_method_request):
+    stopped = threading.Event()
+
+    def check(request):
+        response = request.deadline.attach(aw.CheckResponse())
+        response.add_logs("Started")
+        try:
+            while True:
+                request.deadline.check()
+                stopped.wait(0.01)
+        except DeadlineExceeded:
+            stopped.set()
+            raise
+
+    result = result_of(server(check=check), check_method_request)
+
+    assert result["logs"] == ["Started"]
+    assert len(result["errors"]) == 1
+    assert stopped.wait(1)
+
+
+def test_handler_without_attached_response(server, receive_method_request):
+    async def receive(request):
+        await asyncio.sleep(1)
+
+    result = result_of(server(receive=receive), receive_method_request)
+
+    assert result["messages"] == []
+    assert len(result["errors"]) == 1
+
+
+def test_fast_handler_is_not_affected(server, check_method_request):
+    async def check(request):
+        assert 0 < request.deadline.remaining() <= 0.05
+        return aw.CheckResponse()
+
+    result = result_of(server(check=check), check_method_request)
+
+    assert result["errors"] == []
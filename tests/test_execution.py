@@ -0,0 +1,202 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import activeworkflow_agent as aw
+from activeworkflow_agent.execution import (
+    Inline,
+    Overloaded,
+    ProcessPool,
+    ThreadPool,
+    _pack,
+    _unpack,
+)
+
+
+def process_receive(request):
+    response = aw.ReceiveResponse()
+    response.add_messages(request.message)
+    response.add_logs(str(os.getpid()))
+    return response
+
+
+async def async_process_check(request):
+    response = aw.CheckResponse()
+    response.add_memory(request.memory)
+    return response
+
+
+def run(policy, handler, request):
+    async def main():
+        try:
+            return await policy.run(handler, request)
+        finally:
+            policy.shutdown()
+
+    return asyncio.run(main())
+
+
+@pytest.fixture()
+def fork():
+    return multiprocessing.get_context("fork")
+
+
+def test_inline_runs_in_the_event_loop(check_method_request):
+    def check(request):
+        return threading.current_thread()
+
+    result = run(Inline(), check, aw.ParsedRequest(check_method_request))
+
+    assert result is threading.current_thread()
+
+
+def test_thread_pool(check_method_request):
+    def check(request):
+        return threading.current_thread().name
+
+    result = run(ThreadPool(2), check, aw.ParsedRequest(check_method_request))
+
+    assert result.startswith("agent-handler")
+
+
+def test_pools_resolve_their_number_of_workers(check_method_request):
+    request = aw.ParsedRequest(check_method_request)
+    sized, default = ThreadPool(3), ThreadPool()
+    assert default.workers is None
+
+    for policy in (sized, default):
+        run(policy, lambda r: None, request)
+
+    assert sized.workers == 3
+    assert default.workers == min(32, (os.cpu_count() or 1) + 4)
+
+
+def test_thread_pool_rejects_requests_over_the_limit(check_method_request):
+    release = threading.Event()
+    policy = ThreadPool(max_workers=1, max_queue=1)
+    request = aw.ParsedRequest(check_method_request)
+
+    async def main():
+        tasks = [
+            asyncio.ensure_future(
+                policy.run(lambda r: release.wait(1), request)
+            )
+            for _ in range(2)
+        ]
+        await asyncio.sleep(0)
+        try:
+            with pytest.raises(Overloaded):
+                await policy.run(lambda r: None, request)
+        finally:
+            release.set()
+            await asyncio.gather(*tasks)
+            policy.shutdown()
+        return policy.pending
+
+    assert asyncio.run(main()) == 0
+
+
+def test_thread_pool_counts_requests_until_they_have_run(
+    check_method_request,
+):
+    release = threading.Event()
+    policy = ThreadPool(max_workers=1, max_queue=0)
+    request = aw.ParsedRequest(check_method_request)
+
+    async def main():
+        # The caller gives up (as when a deadline expires); the thread
+        # still runs the handler.
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(
+                policy.run(lambda r: release.wait(1), request), 0.01
+            )
+        try:
+            with pytest.raises(Overloaded):
+                await policy.run(lambda r: None, request)
+        finally:
+            release.set()
+        while policy.pending:
+            await asyncio.sleep(0.01)
+        await policy.run(lambda r: None, request)
+        policy.shutdown()
+
+    asyncio.run(main())
+
+
+def test_process_pool(receive_method_request, fork):
+    request = aw.ParsedRequest(receive_method_request)
+
+    result = run(ProcessPool(1, mp_context=fork), process_receive, request)
+
+    result = json.loads(result)["result"]
+    assert result["messages"] == [{"a": 1, "b": 2}]
+    assert result["logs"] != [str(os.getpid())]
+
+
+def test_process_pool_with_async_handler(check_method_request, fork):
+    request = aw.ParsedRequest(check_method_request)
+
+    result = run(ProcessPool(1, mp_context=fork), async_process_check, request)
+
+    assert json.loads(result)["result"]["memory"] == {"key": "value"}
+
+
+def test_process_pool_with_tracked_memory(check_method_request, fork):
+    check_method_request["params"]["memory"] = {"seen": [{"id": 1}]}
+    aw.ParsedRequest.track_memory = True
+    try:
+        request = aw.ParsedRequest(check_method_request)
+        request.memory["seen"][0]
+    finally:
+        aw.ParsedRequest.track_memory = False
+
+    result = run(ProcessPool(1, mp_context=fork), async_process_check, request)
+
+    assert json.loads(result)["result"]["memory"] == {"seen": [{"id": 1}]}
+
+
+def process_exit(request):
+    os._exit(1)
+
+
+def test_process_pool_recovers_from_dead_workers(
+    receive_method_request, fork
+):
+    policy = ProcessPool(1, mp_context=fork)
+    request = aw.ParsedRequest(receive_method_request)
+
+    async def main():
+        try:
+            with pytest.raises(BrokenProcessPool):
+                await policy.run(process_exit, request)
+            return [
+                await policy.run(process_receive, request) for _ in range(2)
+            ]
+        finally:
+            policy.shutdown()
+
+    results = asyncio.run(main())
+
+    for result in results:
+        assert json.loads(result)["result"]["messages"] == [{"a": 1, "b": 2}]
+    assert policy.pending == 0
+
+
+def test_pack_requests(receive_method_request):
+    request = aw.ParsedRequest(receive_method_request)
+    data = json.dumps(receive_method_request).encode("utf-8")
+    lazy_request = aw.ParsedRequest.from_bytes(data, lazy=True)
+
+    for original in (request, lazy_request):
+        unpacked = _unpack(_pack(original))
+        assert unpacked.method == "receive"
+        assert unpacked.options == request.options
+        assert unpacked.memory == request.memory
+        assert unpacked.credentials == request.credentials
+        assert unpacked.message == request.message
+    assert _pack(lazy_request) == ((data,), None)
@@ -0,0 +1,75 @@
+"""Memory footprint guards for the objects created for every request.
+
+The limits are a little above what CPython 3.7 to 3.11 use on 64-bit
+platforms. Raise them only on purpose.
+"""
+
+import json
+import tracemalloc
+
+import activeworkflow_agent as aw
+from activeworkflow_agent import lazy
+
+
+def bytes_per_object(factory, count=2000):
+    """Returns the memory allocated by factory() on average, in bytes."""
+    objects = [None] * count
+    factory()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for i in range(count):
+            objects[i] = factory()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return (after - before) / count
+
+
+def test_objects_do_not_have_a_dict(
+    check_method_request, agent_registration_details
+):
+    data = json.dumps(check_method_request).encode("utf-8")
+    objects = [
+        aw.ParsedRequest(check_method_request),
+        lazy.LazyParsedRequest(data),
+        aw.RegisterResponse(**agent_registration_details),
+        aw.Response(),
+    ]
+
+    for obj in objects:
+        assert not hasattr(obj, "__dict__")
+
+
+def test_empty_responses_share_containers():
+    first, second = aw.Response(), aw.Response()
+
+    assert first._errors is second._errors
+    assert first._logs is second._logs
+    assert first._messages is second._messages
+
+
+def test_response_footprint():
+    assert bytes_per_object(aw.Response) <= 112
+
+
+def test_response_with_logs_footprint():
+    def factory():
+        response = aw.Response()
+        response.add_logs("Logged")
+        return response
+
+    # The list for the logs is the only other allocation.
+    assert bytes_per_object(factory) <= 112 + 96
+
+
+def test_parsed_request_footprint(check_method_request):
+    assert bytes_per_object(
+        lambda: aw.ParsedRequest(check_method_request)
+    ) <= 96
+
+
+def test_register_response_footprint(agent_registration_details):
+    assert bytes_per_object(
+        lambda: aw.RegisterResponse(**agent_registration_details)
+    ) <= 128
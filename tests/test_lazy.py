@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+import activeworkflow_agent as aw
+from activeworkflow_agent import lazy
+
+
+@pytest.fixture(params=["python", "msgspec"])
+def scanner(request, monkeypatch):
+    if request.param == "python":
+        monkeypatch.setattr(lazy, "_msgspec_scan", None)
+    elif lazy._msgspec_scan is None:
+        pytest.skip("msgspec is not installed")
+    return request.param
+
+
+def encode(request, indent=None):
+    return json.dumps(request, indent=indent).encode("utf-8")
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+@pytest.mark.parametrize(
+    "fixture",
+    [
+        "register_method_request",
+        "check_method_request",
+        "receive_method_request",
+    ],
+)
+def test_lazy_request_matches_parsed_request(request, scanner, fixture, indent):
+    data = request.getfixturevalue(fixture)
+
+    eager = aw.ParsedRequest(data)
+    lazy_request = aw.ParsedRequest.from_bytes(encode(data, indent), lazy=True)
+
+    assert isinstance(lazy_request, lazy.LazyParsedRequest)
+    assert lazy_request.method == eager.method
+    assert lazy_request.options == eager.options
+    assert lazy_request.memory == eager.memory
+    assert lazy_request.credentials == eager.credentials
+    assert lazy_request.message == eager.message
+
+
+def test_lazy_request_decodes_fields_on_access(scanner, check_method_request):
+    request = lazy.LazyParsedRequest(encode(check_method_request))
+
+    assert request.decoded_fields == []
+    assert request.options == {"option": "value"}
+    assert request.decoded_fields == ["options"]
+    assert request.options is request.options
+
+
+def test_lazy_request_does_not_decode_unused_fields(
+    scanner, check_method_request
+):
+    check_method_request["params"]["memory"] = {"seen": '[{"}] \\'}
+    data = encode(check_method_request).replace(b'"seen"', b'"seen" ')
+
+    request = lazy.LazyParsedRequest(data)
+
+    assert request.options == {"option": "value"}
+    assert "memory" not in request.decoded_fields
+    assert request.memory == {"seen": '[{"}] \\'}
+
+
+def test_lazy_request_fields_can_be_assigned(scanner, check_method_request):
+    request = lazy.LazyParsedRequest(encode(check_method_request))
+
+    request.memory = {"new": "memory"}
+
+    assert request.memory == {"new": "memory"}
+
+
+def test_lazy_request_with_escaped_keys(scanner, receive_method_request):
+    data = encode(receive_method_request).replace(
+        b'"payload"', b'"\\u0070ayload"'
+    )
+
+    request = lazy.LazyParsedRequest(data)
+
+    assert request.message == {"a": 1, "b": 2}
+
+
+def test_lazy_request_from_memoryview(scanner, receive_method_request):
+    data = memoryview(bytearray(encode(receive_method_request)))
+
+    request = lazy.LazyParsedRequest(data)
+
+    assert request.method == "receive"
+    assert request.message == {"a": 1, "b": 2}
+
+
+def test_lazy_request_missing_parameter(scanner, check_method_request):
+    del check_method_request["params"]["memory"]
+
+    with pytest.raises(KeyError):
+        lazy.LazyParsedRequest(encode(check_method_request))
+
+
+def test_lazy_request_missing_method(scanner):
+    with pytest.raises(KeyError):
+        lazy.LazyParsedRequest(b'{"params": {}}')
+
+
+@pytest.mark.parametrize(
+    "data",
+    [b"", b"[]", b'{"method": "check"', b'{"method": "check"} x'],
+)
+def test_lazy_request_invalid_json(scanner, data):
+    with pytest.raises(ValueError):
+        lazy.LazyParsedRequest(data)
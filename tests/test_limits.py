@@ -0,0 +1,103 @@
+import json
+
+import pytest
+
+import activeworkflow_agent as aw
+from activeworkflow_agent.limits import BoundedEntries, EntryLimits
+
+
+def bounded(*entries, **limits):
+    buffer = BoundedEntries(EntryLimits(**limits), ("entry", "entries"))
+    buffer.extend(entries)
+    return buffer.to_list()
+
+
+@pytest.fixture()
+def limited_response():
+    aw.Response.log_limits = EntryLimits(max_entries=3)
+    aw.Response.error_limits = EntryLimits(max_entries=1, keep="first")
+    try:
+        yield aw.Response()
+    finally:
+        aw.Response.log_limits = aw.Response.error_limits = None
+
+
+def test_keep_last_entries():
+    assert bounded("a", "b", "c", "d", max_entries=2) == [
+        "2 entries dropped to keep the response small.",
+        "c",
+        "d",
+    ]
+
+
+def test_keep_first_entries():
+    assert bounded("a", "b", "c", max_entries=2, keep="first") == [
+        "a",
+        "b",
+        "1 entry dropped to keep the response small.",
+    ]
+
+
+def test_entries_within_limits_are_kept():
+    assert bounded("a", "b", max_entries=2, max_bytes=2) == ["a", "b"]
+
+
+def test_long_entries_are_shortened():
+    assert bounded("abcdef", max_entry_length=3) == [
+        "abc... (3 characters truncated)"
+    ]
+
+
+def test_max_bytes():
+    assert bounded("aa", "é", "bb", max_bytes=4) == [
+        "1 entry dropped to keep the response small.",
+        "é",
+        "bb",
+    ]
+    assert bounded("aa", "bbb", "c", max_bytes=3, keep="first") == [
+        "aa",
+        "c",
+        "1 entry dropped to keep the response small.",
+    ]
+
+
+def test_entry_too_large_for_max_bytes():
+    assert bounded("a", "bbbb", max_bytes=3) == [
+        "2 entries dropped to keep the response small."
+    ]
+
+
+def test_invalid_limits():
+    with pytest.raises(ValueError):
+        EntryLimits(keep="middle")
+    with pytest.raises(ValueError):
+        EntryLimits(max_entries=0)
+
+
+def test_response_limits(limited_response):
+    for n in range(1000):
+        limited_response.add_logs("Log {}".format(n))
+        limited_response.add_errors("Error {}".format(n))
+
+    result = json.loads(limited_response.to_bytes())["result"]
+
+    assert result["logs"] == [
+        "997 log entries dropped to keep the response small.",
+        "Log 997",
+        "Log 998",
+        "Log 999",
+    ]
+    assert result["errors"] == [
+        "Error 0",
+        "999 errors dropped to keep the response small.",
+    ]
+    assert limited_response.to_dict()["result"] == result
+
+
+def test_streamed_response_limits(limited_response):
+    limited_response.add_logs(*("Log {}".format(n) for n in range(5)))
+    limited_response.add_messages_from(iter([{"a": 1}]))
+
+    result = json.loads(b"".join(limited_response.iter_chunks()))["result"]
+
+    assert result["logs"][1:] == ["Log 2", "Log 3", "Log 4"]
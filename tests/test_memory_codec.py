@@ -0,0 +1,111 @@
+import json
+
+import pytest
+
+import activeworkflow_agent as aw
+from activeworkflow_agent import codec
+from activeworkflow_agent.memory_codec import (
+    RESERVED_KEY,
+    MemoryCodec,
+    decode_memory,
+    is_compressed,
+)
+
+
+@pytest.fixture()
+def memory():
+    return {"seen": ["id-{:04}".format(n) for n in range(500)]}
+
+
+@pytest.fixture()
+def compressing_response():
+    aw.Response.memory_codec = MemoryCodec(threshold=1024)
+    try:
+        yield aw.Response()
+    finally:
+        aw.Response.memory_codec = None
+
+
+@pytest.mark.parametrize("algorithm", ["zlib", "lzma"])
+def test_round_trip(memory, algorithm):
+    encoded = MemoryCodec(algorithm=algorithm, level=1).encode(memory)
+
+    assert is_compressed(encoded)
+    assert encoded[RESERVED_KEY].startswith("1:" + algorithm + ":")
+    assert len(json.dumps(encoded)) < len(json.dumps(memory)) / 4
+    assert decode_memory(encoded) == memory
+
+
+def test_small_memories_are_not_compressed():
+    codec = MemoryCodec(threshold=100)
+
+    assert codec.encode({"key": "value"}) == {"key": "value"}
+    assert codec.dumps({"key": "value"}) == b'{"key":"value"}'
+
+
+def test_plain_memories_are_not_decoded():
+    memory = {RESERVED_KEY: "1:zlib:", "other": 1}
+
+    assert decode_memory(memory) is memory
+
+
+@pytest.mark.parametrize(
+    "value", ["1:zlib:not base64!", "2:zlib:", "1:gzip:", "no tag", 1]
+)
+def test_invalid_compressed_memory(value):
+    with pytest.raises(ValueError):
+        decode_memory({RESERVED_KEY: value})
+
+
+def test_unknown_algorithm():
+    with pytest.raises(ValueError):
+        MemoryCodec(algorithm="gzip")
+
+
+def test_response_compresses_memory(memory, compressing_response):
+    compressing_response.add_memory(memory)
+
+    result = json.loads(compressing_response.to_bytes())["result"]
+
+    assert is_compressed(result["memory"])
+    assert compressing_response.to_dict()["result"] == result
+
+
+def test_small_memories_are_encoded_once(compressing_response, monkeypatch):
+    memory = {"small": True}
+    compressing_response.add_memory(memory)
+    encoded = []
+    dumps = codec.dumps
+
+    def counting_dumps(obj):
+        # The memory alone, or a whole response containing it.
+        if obj is memory or obj.get("result", {}).get("memory") is memory:
+            encoded.append(obj)
+        return dumps(obj)
+
+    monkeypatch.setattr(codec, "dumps", counting_dumps)
+
+    result = json.loads(compressing_response.to_bytes())["result"]
+
+    assert result["memory"] == memory
+    assert len(encoded) == 1
+
+
+def test_streamed_response_compresses_memory(memory, compressing_response):
+    compressing_response.add_memory(memory)
+    compressing_response.add_messages_from(iter([{"a": 1}]))
+
+    result = json.loads(b"".join(compressing_response.iter_chunks()))
+
+    assert decode_memory(result["result"]["memory"]) == memory
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_request_decompresses_memory(memory, check_method_request, lazy):
+    check_method_request["params"]["memory"] = MemoryCodec().encode(memory)
+    data = json.dumps(check_method_request).encode("utf-8")
+
+    request = aw.ParsedRequest.from_bytes(data, lazy=lazy)
+
+    assert request.memory == memory
+    assert request.memory is request.memory
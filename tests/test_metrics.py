@@ -0,0 +1,49 @@
+from activeworkflow_agent.metrics import Metrics
+
+
+def test_render():
+    metrics = Metrics()
+    metrics.count("check", 200)
+    metrics.count("check", 200)
+    metrics.count("unknown", 400)
+    metrics.observe("handle_seconds", "check", 0.002)
+    metrics.observe("response_bytes", "check", 300)
+
+    lines = metrics.render().decode("utf-8").splitlines()
+
+    assert (
+        'activeworkflow_agent_requests_total{method="check",status="200"} 2'
+        in lines
+    )
+    assert (
+        'activeworkflow_agent_requests_total{method="unknown",status="400"} 1'
+        in lines
+    )
+    assert "# TYPE activeworkflow_agent_handle_seconds histogram" in lines
+    assert (
+        'activeworkflow_agent_handle_seconds_bucket{method="check",le="0.001"}'
+        " 0" in lines
+    )
+    assert (
+        'activeworkflow_agent_handle_seconds_bucket{method="check",le="0.005"}'
+        " 1" in lines
+    )
+    assert (
+        'activeworkflow_agent_handle_seconds_bucket{method="check",le="+Inf"}'
+        " 1" in lines
+    )
+    assert (
+        'activeworkflow_agent_handle_seconds_sum{method="check"} 0.002' in lines
+    )
+    assert (
+        'activeworkflow_agent_response_bytes_bucket{method="check",le="1024"}'
+        " 1" in lines
+    )
+
+
+def test_histogram():
+    metrics = Metrics()
+
+    assert metrics.histogram("parse_seconds", "check") is None
+    metrics.observe("parse_seconds", "check", 0.5)
+    assert metrics.histogram("parse_seconds", "check").count == 1
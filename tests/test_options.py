@@ -0,0 +1,140 @@
+import json
+
+import pytest
+
+import activeworkflow_agent as aw
+from activeworkflow_agent import lazy
+from activeworkflow_agent.options import Option, OptionsValidator, infer_schema
+
+
+@pytest.fixture()
+def validator():
+    return OptionsValidator(
+        {
+            "url": Option(str, required=True),
+            "mode": Option(str, choices=("all", "new")),
+            "limit": int,
+            "ratio": float,
+            "pattern": Option(
+                str, check=lambda v: None if v else "must not be empty."
+            ),
+        }
+    )
+
+
+def test_valid_options(validator):
+    options = {"url": "https://example.org", "mode": "new", "limit": 3}
+
+    assert validator.validate(options) == []
+
+
+def test_missing_required_option(validator):
+    assert validator.validate({}) == ["Missing option 'url'."]
+
+
+def test_invalid_option_type(validator):
+    errors = validator.validate({"url": 1, "limit": True})
+
+    assert errors == [
+        "Invalid option 'url': expected str, got int.",
+        "Invalid option 'limit': expected int, got bool.",
+    ]
+
+
+def test_float_option_accepts_int(validator):
+    assert validator.validate({"url": "u", "ratio": 1}) == []
+
+
+def test_invalid_option_choice(validator):
+    errors = validator.validate({"url": "u", "mode": "some"})
+
+    assert errors == ["Invalid option 'mode': must be one of \"all\", \"new\"."]
+
+
+def test_option_check(validator):
+    errors = validator.validate({"url": "u", "pattern": ""})
+
+    assert errors == ["Invalid option 'pattern': must not be empty."]
+
+
+def test_options_must_be_a_dict(validator):
+    assert validator.validate(["url"]) == ["Options must be an object."]
+
+
+def test_infer_schema():
+    validator = OptionsValidator(
+        infer_schema(
+            {"url": "", "limit": 10, "enabled": True, "extra": None, "l": []}
+        )
+    )
+
+    assert validator.validate(
+        {"url": "u", "limit": 1.5, "enabled": False, "l": [1]}
+    ) == []
+    assert validator.validate({"url": "u", "limit": 1, "enabled": 1}) == [
+        "Invalid option 'enabled': expected bool, got int.",
+        "Missing option 'l'.",
+    ]
+
+
+def test_validate_request_is_cached(validator, check_method_request):
+    check_method_request["params"]["options"] = {"url": 1}
+
+    first = validator.validate_request(aw.ParsedRequest(check_method_request))
+    second = validator.validate_request(aw.ParsedRequest(check_method_request))
+
+    assert first == ["Invalid option 'url': expected str, got int."]
+    assert first is second
+    assert (validator.hits, validator.misses) == (1, 1)
+
+
+def test_options_hash(check_method_request):
+    first = aw.ParsedRequest(check_method_request)
+    second = aw.ParsedRequest(check_method_request)
+    check_method_request["params"]["options"] = {"option": "other"}
+    other = aw.ParsedRequest(check_method_request)
+
+    assert first.options_hash == second.options_hash
+    assert first.options_hash != other.options_hash
+
+
+def test_lazy_options_hash_does_not_decode(check_method_request):
+    data = json.dumps(check_method_request).encode("utf-8")
+    request = lazy.LazyParsedRequest(data)
+
+    assert request.options_hash == lazy.LazyParsedRequest(data).options_hash
+    assert request.decoded_fields == []
+
+
+def test_register_response_options_validator(agent_registration_details):
+    agent_registration_details["default_options"] = {"url": "https://"}
+    response = aw.RegisterResponse(**agent_registration_details)
+
+    assert response.options_validator is response.options_validator
+    assert response.options_validator.validate({}) == [
+        "Missing option 'url'."
+    ]
+    assert "options_schema" not in response.to_dict()["result"]
+
+
+def test_register_response_options_schema(agent_registration_details):
+    response = aw.RegisterResponse(
+        **agent_registration_details, options_schema={"limit": int}
+    )
+    validator = response.options_validator
+
+    response.options_schema = {"limit": str}
+
+    assert response.options_validator is not validator
+    assert response.options_validator.validate({"limit": 1}) == [
+        "Invalid option 'limit': expected str, got int."
+    ]
+
+
+def test_register_response_with_invalid_options_schema(
+    agent_registration_details,
+):
+    with pytest.raises(TypeError):
+        aw.RegisterResponse(
+            **agent_registration_details, options_schema=[("limit", int)]
+        )
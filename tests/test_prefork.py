@@ -0,0 +1,214 @@
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import textwrap
+import time
+
+import pytest
+
+from activeworkflow_agent.cli import load_server
+from activeworkflow_agent.server import AgentServer
+
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(os, "fork"), reason="Prefork mode requires os.fork()"
+)
+
+AGENT = textwrap.dedent(
+    """
+    import os
+
+    import activeworkflow_agent as aw
+
+    register = aw.RegisterResponse(
+        name="PidAgent",
+        display_name="Pid Agent",
+        description="Logs the pid of the worker handling the request.",
+    )
+
+    def check(request):
+        response = aw.CheckResponse()
+        response.add_logs(str(os.getpid()))
+        return response
+    """
+)
+
+
+FAILING_AGENT = textwrap.dedent(
+    """
+    import activeworkflow_agent as aw
+    from activeworkflow_agent.server import AgentServer
+
+    class FailingServer(AgentServer):
+        async def start(self, *args, **kwargs):
+            with open("starts", "a") as f:
+                f.write("x")
+            raise OSError("Cannot listen.")
+
+    server = FailingServer(
+        aw.RegisterResponse(
+            name="FailingAgent",
+            display_name="Failing Agent",
+            description="Fails to start.",
+        )
+    )
+    """
+)
+
+
+@pytest.fixture()
+def agent_module(tmp_path, monkeypatch):
+    (tmp_path / "pid_agent.py").write_text(AGENT)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    return tmp_path
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def post(port, body):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    try:
+        conn.request("POST", "/", json.dumps(body))
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        conn.close()
+
+
+def start_agent(agent_module, *args):
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "activeworkflow_agent",
+            "serve",
+            "pid_agent",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            *args,
+        ],
+        cwd=str(agent_module),
+        env=env,
+    )
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process, port
+        except OSError:
+            if time.monotonic() > deadline or process.poll() is not None:
+                process.kill()
+                raise
+            time.sleep(0.05)
+
+
+def worker_pid(port, check_method_request):
+    status, body = post(port, check_method_request)
+    assert status == 200
+    return int(body["result"]["logs"][0])
+
+
+def test_load_server_from_module(agent_module):
+    server = load_server("pid_agent")
+
+    assert isinstance(server, AgentServer)
+    assert server.handlers["check"] is not None
+    assert server.handlers["receive"] is None
+
+
+def test_prefork_serves_from_several_workers(
+    agent_module, check_method_request, register_method_request
+):
+    process, port = start_agent(agent_module, "--workers", "2")
+    try:
+        pids = {worker_pid(port, check_method_request) for _ in range(50)}
+        status, body = post(port, register_method_request)
+
+        assert process.pid not in pids
+        assert len(pids) >= 1
+        assert status == 200
+        assert body["result"]["name"] == "PidAgent"
+    finally:
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(10) == 0
+
+
+def test_prefork_recycles_workers(agent_module, check_method_request):
+    process, port = start_agent(
+        agent_module, "--workers", "1", "--max-requests", "1"
+    )
+    try:
+        first = worker_pid(port, check_method_request)
+        deadline = time.monotonic() + 10
+        pid = first
+        while pid == first and time.monotonic() < deadline:
+            time.sleep(0.1)
+            try:
+                pid = worker_pid(port, check_method_request)
+            except (OSError, http.client.HTTPException):
+                pass
+
+        assert pid != first
+    finally:
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(10) == 0
+
+
+def test_prefork_graceful_restart(agent_module, check_method_request):
+    process, port = start_agent(agent_module, "--workers", "2")
+    try:
+        old = {worker_pid(port, check_method_request) for _ in range(10)}
+        process.send_signal(signal.SIGHUP)
+        deadline = time.monotonic() + 10
+        pid = next(iter(old))
+        while pid in old and time.monotonic() < deadline:
+            time.sleep(0.1)
+            pid = worker_pid(port, check_method_request)
+
+        assert pid not in old
+    finally:
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(10) == 0
+
+
+def test_prefork_stops_when_workers_fail_to_start(agent_module):
+    (agent_module / "failing_agent.py").write_text(FAILING_AGENT)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "activeworkflow_agent",
+            "serve",
+            "failing_agent:server",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(free_port()),
+            "--workers",
+            "2",
+        ],
+        cwd=str(agent_module),
+        env=env,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        timeout=20,
+    )
+
+    assert result.returncode == 1
+    assert "A worker failed to start." in result.stderr
+    # Workers are not forked again and again.
+    assert len((agent_module / "starts").read_text()) <= 4
@@ -0,0 +1,104 @@
+import asyncio
+import pstats
+
+import pytest
+
+import activeworkflow_agent as aw
+from activeworkflow_agent import profiling
+from activeworkflow_agent.profiling import Profiler
+
+
+def busy(n):
+    return sum(i * i for i in range(n))
+
+
+def profile_request(profiler, request, handler):
+    profile = profiler.sample()
+    profile.tag(request)
+    with profile.phase("parse"):
+        busy(100)
+    result = profile.wrap(handler)(request)
+    if asyncio.iscoroutine(result):
+        result = asyncio.run(result)
+    profile.finish()
+    return result
+
+
+def test_profiler_validates_sample_rate():
+    with pytest.raises(ValueError):
+        Profiler(sample_rate=1.5)
+    with pytest.raises(ValueError):
+        Profiler().sample_rate = -0.1
+
+
+def test_profiler_samples_requests():
+    assert Profiler().sample() is None
+    profiler = Profiler(sample_rate=1.0)
+    profile = profiler.sample()
+    assert profile is not None
+    # Only one request is profiled at a time.
+    assert profiler.sample() is None
+    profile.finish()
+    assert profiler.sample() is not None
+
+
+def test_profiler_aggregates_phases(check_method_request):
+    request = aw.ParsedRequest(check_method_request)
+    profiler = Profiler(sample_rate=1.0)
+
+    def check(request):
+        busy(1000)
+        return aw.CheckResponse()
+
+    for _ in range(2):
+        profile_request(profiler, request, check)
+
+    summary = profiler.summary()
+    assert profiler.requests_profiled == 2
+    assert [(s["phase"], s["requests"]) for s in summary] == [
+        ("handle", 2),
+        ("parse", 2),
+    ]
+    assert {s["options_hash"] for s in summary} == {request.options_hash}
+    stats = profiler.stats(method="check", phase="handle")
+    assert any(func[2] == "busy" for func in stats.stats)
+    assert profiler.stats(method="receive") is None
+
+    profiler.reset()
+    assert profiler.summary() == []
+
+
+def test_profiler_profiles_coroutine_handlers(check_method_request):
+    request = aw.ParsedRequest(check_method_request)
+    profiler = Profiler(sample_rate=1.0)
+
+    async def check(request):
+        await asyncio.sleep(0.01)
+        busy(1000)
+        return request.method
+
+    assert profile_request(profiler, request, check) == "check"
+    stats = profiler.stats(phase="handle")
+    assert any(func[2] == "busy" for func in stats.stats)
+
+
+def test_profiler_does_not_record_untagged_requests():
+    profiler = Profiler(sample_rate=1.0)
+    profile = profiler.sample()
+    with profile.phase("parse"):
+        busy(10)
+    profile.finish()
+    assert profiler.summary() == []
+
+
+def test_dumps_writes_pstats_files(tmp_path, check_method_request):
+    request = aw.ParsedRequest(check_method_request)
+    profiler = Profiler(sample_rate=1.0)
+    profile_request(profiler, request, lambda r: busy(100))
+    path = tmp_path / "check.prof"
+    path.write_bytes(profiling.dumps(profiler.stats()))
+
+    stats = pstats.Stats(str(path))
+
+    assert any(func[2] == "busy" for func in stats.stats)
+    assert "busy" in profiling.text(profiler.stats())
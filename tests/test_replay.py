@@ -0,0 +1,217 @@
+import asyncio
+import json
+import textwrap
+
+import pytest
+
+import activeworkflow_agent as aw
+from activeworkflow_agent.cli import main
+from activeworkflow_agent.replay import Recorder, Report, diff, load, replay
+from activeworkflow_agent.server import AgentServer
+
+
+AGENT = textwrap.dedent(
+    """
+    import activeworkflow_agent as aw
+
+    register = aw.RegisterResponse(
+        name="EchoAgent",
+        display_name="Echo Agent",
+        description="Emits the options it is given.",
+    )
+
+    def check(request):
+        response = aw.CheckResponse()
+        response.add_messages(request.options)
+        return response
+    """
+)
+
+
+def options_check(request):
+    response = aw.CheckResponse()
+    response.add_messages(request.options)
+    response.add_logs("checked")
+    return response
+
+
+def with_server(server, client):
+    async def main():
+        await server.start("127.0.0.1", 0)
+        port = server._server.sockets[0].getsockname()[1]
+        try:
+            return await client(port)
+        finally:
+            await server.close()
+
+    return asyncio.run(main())
+
+
+def record(path, register_response, requests, check=options_check):
+    recorder = Recorder(str(path))
+    server = AgentServer(register_response, check=check, recorder=recorder)
+
+    async def client(port):
+        # Record through the server by replaying the requests.
+        await replay(
+            [{"request": r, "status": 200, "response": None} for r in requests],
+            port=port,
+        )
+
+    with_server(server, client)
+    recorder.close()
+    return list(load(str(path)))
+
+
+@pytest.fixture()
+def register_response(agent_registration_details):
+    return aw.RegisterResponse(**agent_registration_details)
+
+
+def test_recorder_writes_one_line_per_request(tmp_path):
+    path = tmp_path / "traffic.jsonl"
+    recorder = Recorder(str(path))
+    recorder.record(b'{\n"method": "check"}', 200, b'{"result": {}}', 0.25)
+    recorder.record(b'{"method": "receive"}', 500, b'{"error": "x"}', 0.5)
+    recorder.close()
+
+    lines = path.read_bytes().splitlines()
+    records = list(load(str(path)))
+
+    assert len(lines) == 2
+    assert records[0]["request"] == {"method": "check"}
+    assert records[0]["seconds"] == 0.25
+    assert records[1]["status"] == 500
+    assert records[1]["response"] == {"error": "x"}
+
+
+def test_recorder_compresses_and_limits(tmp_path):
+    path = tmp_path / "traffic.jsonl.gz"
+    recorder = Recorder(str(path), max_records=2)
+    for _ in range(5):
+        recorder.record(b"{}", 200, b"{}", 0.0)
+    recorder.close()
+
+    assert recorder.records == 2
+    assert len(list(load(str(path)))) == 2
+
+
+def test_recorder_validates_sample_rate(tmp_path):
+    with pytest.raises(ValueError):
+        Recorder(str(tmp_path / "traffic.jsonl"), sample_rate=2)
+
+
+def test_diff():
+    expected = {"result": {"messages": [{"a": 1}, {"a": 2}], "logs": ["x"]}}
+
+    assert diff(expected, expected) == []
+    assert diff(
+        expected, {"result": {"messages": [{"a": 1}], "logs": ["y"]}}
+    ) == ["result.logs[0]", "result.messages[1:]"]
+    assert diff(
+        expected,
+        {"result": {"messages": [{"a": 1}, {"a": 2}], "logs": ["y"]}},
+        ignore=["result.logs"],
+    ) == []
+    assert diff({"a": 1}, {"b": 1}) == ["a", "b"]
+    assert diff(1, 1.0) == ["$"]
+
+
+def test_report_percentiles():
+    report = Report()
+    report.latencies = [i / 100 for i in range(1, 101)]
+    report.duration = 2.0
+
+    assert report.percentile(50) == 0.51
+    assert report.percentile(99) == 1.0
+    assert report.throughput == 50.0
+    assert report.summary()["latency"]["max"] == 1.0
+    assert "p90 910.0 ms" in report.format()
+
+
+def test_server_records_requests(
+    tmp_path, register_response, check_method_request
+):
+    records = record(
+        tmp_path / "traffic.jsonl",
+        register_response,
+        [check_method_request, {"method": "bogus"}],
+    )
+
+    # The invalid request is not recorded.
+    assert len(records) == 1
+    assert records[0]["request"] == check_method_request
+    assert records[0]["response"]["result"]["messages"] == [
+        {"option": "value"}
+    ]
+
+
+def test_replay_reports_differences(
+    tmp_path, register_response, check_method_request
+):
+    records = record(
+        tmp_path / "traffic.jsonl",
+        register_response,
+        [check_method_request] * 3,
+    )
+
+    def changed_check(request):
+        response = options_check(request)
+        response.add_logs("changed")
+        return response
+
+    def run(check, **kwargs):
+        server = AgentServer(register_response, check=check)
+        return with_server(
+            server, lambda port: replay(records, port=port, **kwargs)
+        )
+
+    report = run(options_check, concurrency=2, rate=1000)
+    assert report.requests == 3
+    assert report.statuses == {200: 3}
+    assert report.mismatches == 0
+
+    report = run(changed_check)
+    assert report.mismatches == 3
+    assert report.diffs[0] == (0, ["result.logs[1:]"])
+
+    report = run(changed_check, ignore=["result.logs"], speed=100)
+    assert report.mismatches == 0
+
+
+def test_replay_counts_failures():
+    records = [{"request": {}, "status": 200, "response": {}}]
+
+    report = asyncio.run(replay(records, port=1, timeout=1))
+
+    assert report.failures == 1
+    assert report.latencies == []
+
+
+def test_cli_replays_against_local_agent(
+    tmp_path, monkeypatch, capsys, check_method_request
+):
+    (tmp_path / "echo_agent.py").write_text(AGENT)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    path = tmp_path / "traffic.jsonl"
+    response = aw.CheckResponse()
+    response.add_messages({"option": "value"})
+    path.write_text(
+        json.dumps(
+            {
+                "t": 0,
+                "seconds": 0,
+                "status": 200,
+                "request": check_method_request,
+                "response": json.loads(response.to_bytes()),
+            }
+        )
+        + "\n"
+    )
+
+    assert main(["replay", str(path), "--agent", "echo_agent", "--json"]) == 0
+
+    summary = json.loads(capsys.readouterr().out)
+    assert summary["requests"] == 1
+    assert summary["statuses"] == {"200": 1}
+    assert summary["mismatches"] == 0
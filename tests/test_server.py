@@ -0,0 +1,706 @@
+import asyncio
+import json
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+import activeworkflow_agent as aw
+from activeworkflow_agent.execution import ProcessPool, ThreadPool
+from activeworkflow_agent.profiling import Profiler
+from activeworkflow_agent.server import AgentServer, HTTPError
+
+
+async def post(port, body, headers=None, reader_writer=None, path="/"):
+    """Send a POST request and return (status, headers, body)."""
+    if reader_writer is None:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    else:
+        reader, writer = reader_writer
+    if isinstance(body, dict):
+        body = json.dumps(body).encode("utf-8")
+    lines = ["POST {} HTTP/1.1".format(path), "Host: localhost"]
+    lines.append("Content-Length: {}".format(len(body)))
+    for name, value in (headers or {}).items():
+        lines.append("{}: {}".format(name, value))
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+    return await read_response(reader)
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ")[1])
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+    if headers.get("transfer-encoding") == "chunked":
+        body = b""
+        while True:
+            size = int(await reader.readuntil(b"\r\n"), 16)
+            body += await reader.readexactly(size + 2)
+            body = body[:-2]
+            if size == 0:
+                return status, headers, body
+    body = await reader.readexactly(int(headers["content-length"]))
+    return status, headers, body
+
+
+async def get(port, path, headers=None):
+    """Send a GET request and return (status, headers, body)."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    lines = ["GET {} HTTP/1.1".format(path), "Host: localhost"]
+    for name, value in (headers or {}).items():
+        lines.append("{}: {}".format(name, value))
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    await writer.drain()
+    try:
+        return await read_response(reader)
+    finally:
+        writer.close()
+
+
+def serve(server, client):
+    """Run client(port) against server on an ephemeral port."""
+
+    async def main():
+        await server.start("127.0.0.1", 0)
+        port = server._server.sockets[0].getsockname()[1]
+        try:
+            return await client(port)
+        finally:
+            await server.close()
+
+    return asyncio.run(main())
+
+
+@pytest.fixture()
+def register_response(agent_registration_details):
+    return aw.RegisterResponse(**agent_registration_details)
+
+
+def test_server_register(register_response, register_method_request):
+    server = AgentServer(register_response)
+
+    status, headers, body = serve(
+        server, lambda port: post(port, register_method_request)
+    )
+
+    assert status == 200
+    assert headers["content-type"] == "application/json"
+    assert headers["etag"] == register_response.etag
+    assert json.loads(body) == register_response.to_dict()
+
+
+def test_server_check_with_sync_handler(
+    register_response, check_method_request, valid_response_schema
+):
+    def check(request):
+        response = aw.CheckResponse()
+        response.add_memory(request.memory)
+        response.add_logs(threading.current_thread().name)
+        return response
+
+    server = AgentServer(register_response, check=check)
+
+    status, _, body = serve(
+        server, lambda port: post(port, check_method_request)
+    )
+
+    assert status == 200
+    result = valid_response_schema.validate(json.loads(body))["result"]
+    assert result["memory"] == {"key": "value"}
+    assert result["logs"] != [threading.current_thread().name]
+
+
+def test_server_receive_with_async_handler(
+    register_response, receive_method_request
+):
+    async def receive(request):
+        response = aw.ReceiveResponse()
+        response.add_messages(request.message)
+        return response
+
+    server = AgentServer(register_response, receive=receive)
+
+    status, _, body = serve(
+        server, lambda port: post(port, receive_method_request)
+    )
+
+    assert status == 200
+    assert json.loads(body)["result"]["messages"] == [{"a": 1, "b": 2}]
+
+
+def test_server_without_handler_returns_empty_response(
+    register_response, check_method_request
+):
+    server = AgentServer(register_response)
+
+    status, _, body = serve(
+        server, lambda port: post(port, check_method_request)
+    )
+
+    assert status == 200
+    assert json.loads(body) == aw.Response().to_dict()
+
+
+def test_server_unknown_method(register_response, unknown_method_request):
+    server = AgentServer(register_response)
+
+    status, _, body = serve(
+        server,
+        lambda port: post(port, unknown_method_request.encode("utf-8")),
+    )
+
+    assert status == 400
+    assert "some_random_method" in json.loads(body)["error"]
+
+
+def test_server_invalid_json(register_response):
+    server = AgentServer(register_response)
+
+    status, _, _ = serve(server, lambda port: post(port, b"{not json"))
+
+    assert status == 400
+
+
+def test_server_handler_exception(register_response, check_method_request):
+    def check(request):
+        raise RuntimeError("Boom")
+
+    server = AgentServer(register_response, check=check)
+
+    status, _, body = serve(
+        server, lambda port: post(port, check_method_request)
+    )
+
+    assert status == 500
+    assert "Boom" not in body.decode("utf-8")
+
+
+def test_server_keep_alive(register_response, check_method_request):
+    server = AgentServer(register_response)
+
+    async def client(port):
+        conn = await asyncio.open_connection("127.0.0.1", port)
+        first = await post(port, check_method_request, reader_writer=conn)
+        second = await post(port, check_method_request, reader_writer=conn)
+        conn[1].close()
+        return first, second
+
+    first, second = serve(server, client)
+
+    assert first[0] == second[0] == 200
+    assert first[1]["connection"] == "keep-alive"
+
+
+def test_server_connection_close(register_response, check_method_request):
+    server = AgentServer(register_response)
+
+    async def client(port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        response = await post(
+            port,
+            check_method_request,
+            headers={"Connection": "close"},
+            reader_writer=(reader, writer),
+        )
+        eof = await reader.read()
+        return response, eof
+
+    (status, headers, _), eof = serve(server, client)
+
+    assert status == 200
+    assert headers["connection"] == "close"
+    assert eof == b""
+
+
+def test_server_concurrency_limit(register_response, check_method_request):
+    running = 0
+    peak = 0
+
+    async def check(request):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return aw.CheckResponse()
+
+    server = AgentServer(register_response, check=check, max_concurrency=3)
+
+    async def client(port):
+        return await asyncio.gather(
+            *(post(port, check_method_request) for _ in range(20))
+        )
+
+    results = serve(server, client)
+
+    assert all(status == 200 for status, _, _ in results)
+    assert peak == 3
+
+
+def test_server_streams_large_responses(
+    register_response, check_method_request
+):
+    messages = [{"n": n, "text": "x" * 100} for n in range(500)]
+
+    def check(request):
+        response = aw.CheckResponse()
+        response.add_messages(*messages)
+        return response
+
+    server = AgentServer(
+        register_response, check=check, streaming_threshold=100, chunk_size=1024
+    )
+
+    async def client(port):
+        conn = await asyncio.open_connection("127.0.0.1", port)
+        first = await post(port, check_method_request, reader_writer=conn)
+        second = await post(port, check_method_request, reader_writer=conn)
+        conn[1].close()
+        return first, second
+
+    first, second = serve(server, client)
+
+    for status, headers, body in (first, second):
+        assert status == 200
+        assert headers["transfer-encoding"] == "chunked"
+        assert "content-length" not in headers
+        assert json.loads(body)["result"]["messages"] == messages
+
+
+def test_server_streams_async_message_sources(
+    register_response, check_method_request
+):
+    async def generate():
+        for n in range(10):
+            await asyncio.sleep(0)
+            yield {"n": n}
+
+    async def check(request):
+        response = aw.CheckResponse(max_messages=5)
+        response.add_messages_from(generate())
+        return response
+
+    server = AgentServer(register_response, check=check)
+
+    status, headers, body = serve(
+        server, lambda port: post(port, check_method_request)
+    )
+
+    result = json.loads(body)["result"]
+    assert status == 200
+    assert headers["transfer-encoding"] == "chunked"
+    assert result["messages"] == [{"n": n} for n in range(5)]
+    assert len(result["logs"]) == 1
+
+
+def test_server_handle_encodes_async_message_sources(
+    register_response, check_method_request
+):
+    async def generate():
+        for n in range(3):
+            await asyncio.sleep(0)
+            yield {"n": n}
+
+    async def check(request):
+        response = aw.CheckResponse()
+        response.add_messages_from(generate())
+        return response
+
+    server = AgentServer(register_response, check=check)
+
+    body = asyncio.run(
+        server.handle(json.dumps(check_method_request).encode("utf-8"))
+    )
+
+    assert json.loads(body)["result"]["messages"] == [
+        {"n": n} for n in range(3)
+    ]
+
+
+def test_server_does_not_stream_small_responses(
+    register_response, check_method_request
+):
+    def check(request):
+        response = aw.CheckResponse()
+        response.add_messages({"n": 1})
+        return response
+
+    server = AgentServer(register_response, check=check, streaming_threshold=2)
+
+    status, headers, _ = serve(
+        server, lambda port: post(port, check_method_request)
+    )
+
+    assert status == 200
+    assert "transfer-encoding" not in headers
+
+
+def test_server_validates_options(
+    agent_registration_details, check_method_request
+):
+    calls = []
+
+    def check(request):
+        calls.append(request)
+        return aw.CheckResponse()
+
+    register = aw.RegisterResponse(
+        **agent_registration_details, options_schema={"option": int}
+    )
+    server = AgentServer(register, check=check, validate_options=True)
+
+    status, _, body = serve(
+        server, lambda port: post(port, check_method_request)
+    )
+
+    assert status == 200
+    assert json.loads(body)["result"]["errors"] == [
+        "Invalid option 'option': expected int, got str."
+    ]
+    assert calls == []
+
+
+def test_server_validate_options_requires_register_response():
+    with pytest.raises(TypeError):
+        AgentServer(lambda request: None, validate_options=True)
+
+
+def echo_messages(request):
+    response = aw.ReceiveResponse()
+    response.add_messages(request.message)
+    return response
+
+
+def test_server_with_process_pool(register_response, receive_method_request):
+    pool = ProcessPool(1, mp_context=multiprocessing.get_context("fork"))
+    server = AgentServer(
+        register_response,
+        receive=echo_messages,
+        execution={"receive": pool},
+    )
+
+    status, _, body = serve(
+        server, lambda port: post(port, receive_method_request)
+    )
+
+    assert status == 200
+    assert json.loads(body)["result"]["messages"] == [{"a": 1, "b": 2}]
+
+
+def check_until_deadline(request):
+    request.deadline.attach(aw.CheckResponse())
+    while True:
+        request.deadline.check()
+        time.sleep(0.01)
+
+
+def receive_with_deadline(request):
+    response = aw.ReceiveResponse()
+    response.add_messages({"remaining": request.deadline.remaining()})
+    return response
+
+
+def test_server_with_process_pool_and_deadlines(
+    register_response, check_method_request, receive_method_request
+):
+    pool = ProcessPool(1, mp_context=multiprocessing.get_context("fork"))
+    server = AgentServer(
+        register_response,
+        check=check_until_deadline,
+        receive=receive_with_deadline,
+        deadlines=0.5,
+        execution=pool,
+    )
+
+    async def client(port):
+        first = await post(port, check_method_request)
+        # Only answered in time if the first handler stopped at its deadline.
+        second = await post(port, receive_method_request)
+        return first, second
+
+    first, second = serve(server, client)
+
+    assert first[0] == 200
+    assert len(json.loads(first[2])["result"]["errors"]) == 1
+    result = json.loads(second[2])["result"]
+    assert result["errors"] == []
+    assert 0 < result["messages"][0]["remaining"] <= 0.5
+
+
+def test_server_overloaded(register_response, check_method_request):
+    release = threading.Event()
+
+    def check(request):
+        release.wait(1)
+        return aw.CheckResponse()
+
+    server = AgentServer(
+        register_response, check=check, execution=ThreadPool(1, max_queue=0)
+    )
+
+    async def client(port):
+        first = asyncio.ensure_future(post(port, check_method_request))
+        await asyncio.sleep(0.1)
+        second = await post(port, check_method_request)
+        release.set()
+        return await first, second
+
+    first, second = serve(server, client)
+
+    assert first[0] == 200
+    assert second[0] == 503
+
+
+def test_server_batches_receive_requests(
+    register_response, receive_method_request
+):
+    def receive_batch(requests):
+        responses = []
+        for request in requests:
+            response = aw.ReceiveResponse()
+            response.add_messages({"batch": len(requests)})
+            responses.append(response)
+        return responses
+
+    server = AgentServer(
+        register_response, receive_batch=receive_batch, max_batch_size=3
+    )
+
+    async def client(port):
+        return await asyncio.gather(
+            *(post(port, receive_method_request) for _ in range(6))
+        )
+
+    results = serve(server, client)
+
+    messages = [json.loads(body)["result"]["messages"] for *_, body in results]
+    assert messages == [[{"batch": 3}]] * 6
+    assert server.batcher.batch_sizes.count == 2
+
+
+def test_server_coalesces_identical_checks(
+    register_response, check_method_request
+):
+    calls = []
+
+    async def check(request):
+        calls.append(request)
+        await asyncio.sleep(0.05)
+        response = aw.CheckResponse()
+        response.add_messages({"calls": len(calls)})
+        return response
+
+    server = AgentServer(register_response, check=check, coalesce_checks=True)
+
+    async def client(port):
+        return await asyncio.gather(
+            *(post(port, check_method_request) for _ in range(4))
+        )
+
+    results = serve(server, client)
+
+    assert len(calls) == 1
+    assert len({body for *_, body in results}) == 1
+    assert server.single_flight.coalesced == 3
+
+
+def test_server_metrics(register_response, check_method_request):
+    def check(request):
+        response = aw.CheckResponse()
+        response.add_messages({"n": 1}, {"n": 2})
+        return response
+
+    server = AgentServer(register_response, check=check, metrics=True)
+
+    async def client(port):
+        await post(port, check_method_request)
+        await post(port, b"{not json")
+        return await get(port, "/metrics")
+
+    status, headers, body = serve(server, client)
+    lines = body.decode("utf-8").splitlines()
+
+    assert status == 200
+    assert headers["content-type"].startswith("text/plain; version=0.0.4")
+    prefix = "activeworkflow_agent_"
+    assert prefix + 'requests_total{method="check",status="200"} 1' in lines
+    assert prefix + 'requests_total{method="unknown",status="400"} 1' in lines
+    for name in ("parse_seconds", "handle_seconds", "serialize_seconds"):
+        assert prefix + name + '_count{method="check"} 1' in lines
+    assert prefix + 'response_messages_sum{method="check"} 2' in lines
+
+
+def test_server_metrics_include_streamed_responses(
+    register_response, check_method_request, receive_method_request
+):
+    def check(request):
+        response = aw.CheckResponse()
+        response.add_messages(*({"n": n} for n in range(20)))
+        return response
+
+    def receive(request):
+        response = aw.ReceiveResponse(max_messages=2)
+        response.add_messages(*({"n": n} for n in range(5)))
+        return response
+
+    server = AgentServer(
+        register_response,
+        check=check,
+        receive=receive,
+        streaming_threshold=10,
+        metrics=True,
+    )
+
+    async def client(port):
+        streamed = await post(port, check_method_request)
+        await post(port, receive_method_request)
+        return streamed, await get(port, "/metrics")
+
+    streamed, (_, _, body) = serve(server, client)
+    lines = body.decode("utf-8").splitlines()
+
+    assert streamed[1]["transfer-encoding"] == "chunked"
+    prefix = "activeworkflow_agent_"
+    assert prefix + 'serialize_seconds_count{method="check"} 1' in lines
+    assert prefix + 'response_messages_sum{method="check"} 20' in lines
+    # Truncated responses count the messages sent.
+    assert prefix + 'response_messages_sum{method="receive"} 2' in lines
+
+
+def test_server_metrics_count_errors_by_method(
+    register_response, check_method_request, receive_method_request
+):
+    def check(request):
+        raise RuntimeError("Failed")
+
+    server = AgentServer(
+        register_response,
+        check=check,
+        receive=echo_messages,
+        execution={"receive": ThreadPool(1, max_queue=0)},
+        metrics=True,
+    )
+    server.execution["receive"].pending = 1
+
+    async def client(port):
+        await post(port, check_method_request)
+        await post(port, receive_method_request)
+        return await get(port, "/metrics")
+
+    _, _, body = serve(server, client)
+    lines = body.decode("utf-8").splitlines()
+
+    prefix = "activeworkflow_agent_"
+    assert prefix + 'requests_total{method="check",status="500"} 1' in lines
+    assert prefix + 'requests_total{method="receive",status="503"} 1' in lines
+
+
+def test_server_without_metrics(register_response):
+    server = AgentServer(register_response)
+
+    status, _, _ = serve(server, lambda port: get(port, "/metrics"))
+
+    assert status == 405
+
+
+def test_server_profiles_requests(register_response, check_method_request):
+    async def check(request):
+        await asyncio.sleep(0)
+        return aw.CheckResponse()
+
+    server = AgentServer(
+        register_response,
+        check=check,
+        profiler=Profiler(sample_rate=1.0),
+        admin_token="secret",
+    )
+    auth = {"Authorization": "Bearer secret"}
+
+    async def client(port):
+        await post(port, check_method_request)
+        summary = await get(port, "/admin/profile", auth)
+        stats = await get(
+            port, "/admin/profile?method=check&phase=handle", auth
+        )
+        missing = await get(port, "/admin/profile?method=receive", auth)
+        disabled = await post(
+            port, b"", auth, path="/admin/profile?sample_rate=0&reset=1"
+        )
+        return summary, stats, missing, disabled
+
+    summary, stats, missing, disabled = serve(server, client)
+
+    profiles = json.loads(summary[2])["profiles"]
+    assert {p["phase"] for p in profiles} == {"parse", "handle", "serialize"}
+    assert {p["method"] for p in profiles} == {"check"}
+    assert stats[0] == 200
+    assert stats[1]["content-type"] == "application/octet-stream"
+    assert missing[0] == 404
+    assert json.loads(disabled[2]) == {
+        "sample_rate": 0.0,
+        "requests_profiled": 0,
+        "profiles": [],
+    }
+
+
+def test_server_admin_endpoint_requires_the_token(register_response):
+    profiler = Profiler(sample_rate=0.5)
+    server = AgentServer(
+        register_response, profiler=profiler, admin_token="secret"
+    )
+
+    async def client(port):
+        return (
+            await get(port, "/admin/profile"),
+            await get(
+                port, "/admin/profile", {"Authorization": "Bearer wrong"}
+            ),
+            await post(
+                port, b"", path="/admin/profile?sample_rate=1&reset=1"
+            ),
+        )
+
+    responses = serve(server, client)
+
+    assert [status for status, _, _ in responses] == [401, 401, 401]
+    assert profiler.sample_rate == 0.5
+
+
+def test_server_admin_endpoint_requires_a_token(register_response):
+    server = AgentServer(register_response, profiler=Profiler(1.0))
+
+    status, _, _ = serve(server, lambda port: get(port, "/admin/profile"))
+
+    assert status == 405
+
+
+def test_server_without_profiler(register_response):
+    server = AgentServer(register_response)
+
+    status, _, _ = serve(server, lambda port: get(port, "/admin/profile"))
+
+    assert status == 405
+
+
+def test_server_rejects_oversized_body(register_response, check_method_request):
+    server = AgentServer(register_response, max_body_size=10)
+
+    status, _, _ = serve(server, lambda port: post(port, check_method_request))
+
+    assert status == 413
+
+
+def test_server_requires_callable_handlers(register_response):
+    with pytest.raises(TypeError):
+        AgentServer(register_response, check="not a handler")
+
+
+def test_http_error_defaults_to_status_phrase():
+    assert HTTPError(404).message == "Not Found"
@@ -0,0 +1,98 @@
+"""Import time guards: agents are restarted and scaled out often.
+
+Importing the package must not import the server, the JSON backends or the
+standard library modules used by optional features. The budget is a few
+times what the package takes on a recent CPython with its bytecode cached;
+raise it only on purpose.
+"""
+
+import subprocess
+import sys
+
+import pytest
+
+import activeworkflow_agent as aw
+
+
+IMPORT_TIME_BUDGET = 0.05  # seconds
+
+DEFERRED_MODULES = (
+    "activeworkflow_agent.server",
+    "activeworkflow_agent.metrics",
+    "activeworkflow_agent.profiling",
+    "activeworkflow_agent.credentials",
+    "activeworkflow_agent.lazy",
+    "asyncio",
+    "json",
+    "re",
+    "hashlib",
+    "copy",
+    "zlib",
+    "lzma",
+    "base64",
+    "orjson",
+    "msgspec",
+    "ujson",
+)
+
+
+def import_times(cache_dir):
+    """Returns the cumulative import time of each module imported, in µs.
+
+    The modules are those imported by 'import activeworkflow_agent' in a new
+    interpreter, as reported by -X importtime.
+    """
+    options = ["-X", "importtime"]
+    if sys.version_info >= (3, 8):
+        # Do not count the compilation of the sources.
+        options += ["-X", "pycache_prefix={}".format(cache_dir)]
+    result = subprocess.run(
+        [sys.executable] + options + ["-c", "import activeworkflow_agent"],
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_import_defers_optional_modules(tmp_path):
+    imported = import_times(tmp_path)
+
+    assert "activeworkflow_agent" in imported
+    for name in DEFERRED_MODULES:
+        assert name not in imported
+
+
+def test_import_time_budget(tmp_path):
+    import_times(tmp_path)
+    best = min(
+        import_times(tmp_path)["activeworkflow_agent"] for _ in range(5)
+    )
+
+    assert best / 1e6 < IMPORT_TIME_BUDGET
+
+
+def test_submodules_and_names_are_loaded_on_access():
+    from activeworkflow_agent import server
+
+    assert aw.server is server
+    assert aw.AgentServer is server.AgentServer
+    assert "AgentServer" in dir(aw)
+    with pytest.raises(AttributeError):
+        aw.no_such_name
+
+
+def test_warm_up_encodes_register_responses(agent_registration_details):
+    register = aw.RegisterResponse(**agent_registration_details)
+
+    aw.warm_up(register)
+
+    assert register._encoded is not None
+    assert register._etag is not None
+    assert register.to_bytes() is register._encoded
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+import activeworkflow_agent as aw
+from activeworkflow_agent.structures import BloomFilter, LRUSet, SeenHashes
+
+
+def round_trip(structure, check_method_request):
+    """Save a structure in a response and load it from the next request."""
+    response = aw.Response()
+    response.add_memory({"seen": structure.to_memory()})
+    memory = json.loads(response.to_bytes())["result"]["memory"]
+    check_method_request["params"]["memory"] = memory
+    request = aw.ParsedRequest(check_method_request)
+    return type(structure).from_memory(request.memory["seen"])
+
+
+def test_lru_set(check_method_request):
+    seen = LRUSet(max_size=3)
+
+    assert [seen.add(item) for item in (1, 2, 1, 3, 4)] == [
+        True,
+        True,
+        False,
+        True,
+        True,
+    ]
+    seen = round_trip(seen, check_method_request)
+
+    assert list(seen) == ["1", "3", "4"]
+    assert 2 not in seen
+    assert seen.max_size == 3
+
+
+def test_seen_hashes(check_method_request):
+    seen = SeenHashes(max_size=100)
+    for n in range(150):
+        seen.add("id-{}".format(n))
+
+    assert not seen.add("id-149")
+    seen = round_trip(seen, check_method_request)
+
+    assert len(seen) == 100
+    assert "id-49" not in seen
+    assert all("id-{}".format(n) in seen for n in range(50, 150))
+    assert seen.add("id-0")
+    assert "id-50" not in seen
+
+
+def test_seen_hashes_size():
+    seen = SeenHashes(max_size=1000)
+    for n in range(2000):
+        seen.add(n)
+
+    assert len(json.dumps(seen.to_memory())) < 1000 * 8 * 4 / 3 + 100
+
+
+def test_bloom_filter(check_method_request):
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for n in range(1000):
+        bloom.add(n)
+    size = len(json.dumps(bloom.to_memory()))
+
+    bloom = round_trip(bloom, check_method_request)
+
+    assert all(n in bloom for n in range(1000))
+    false_positives = sum(n in bloom for n in range(1000, 11000))
+    assert false_positives < 10000 * 0.02
+    assert len(bloom) <= 1000
+    bloom.add("more")
+    assert len(json.dumps(bloom.to_memory())) == size
+
+
+def test_from_memory_without_value():
+    seen = LRUSet.from_memory(None, max_size=5)
+
+    assert seen.max_size == 5
+    assert len(seen) == 0
+
+
+def test_from_memory_with_another_type():
+    with pytest.raises(ValueError):
+        BloomFilter.from_memory(LRUSet().to_memory())
+
+
+def test_structures_do_not_have_a_dict():
+    for structure in (LRUSet(), SeenHashes(), BloomFilter()):
+        assert not hasattr(structure, "__dict__")
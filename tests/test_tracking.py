@@ -0,0 +1,116 @@
+import json
+import pickle
+
+import pytest
+
+import activeworkflow_agent as aw
+from activeworkflow_agent import tracking
+from activeworkflow_agent.tracking import TrackedDict
+
+
+@pytest.fixture()
+def tracked_request(check_method_request):
+    check_method_request["params"]["memory"] = {
+        "seen": ["a", "b"],
+        "feeds": [{"url": "https://example.org", "etag": None}],
+        "state": {"count": 1},
+    }
+    aw.ParsedRequest.track_memory = True
+    try:
+        yield check_method_request
+    finally:
+        aw.ParsedRequest.track_memory = False
+
+
+@pytest.fixture()
+def parse(tracked_request):
+    def parse(lazy=False):
+        data = json.dumps(tracked_request).encode("utf-8")
+        return aw.ParsedRequest.from_bytes(data, lazy=lazy)
+
+    return parse
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda m: m.__setitem__("new", 1),
+        lambda m: m.pop("seen"),
+        lambda m: m.update(state={}),
+        lambda m: m.setdefault("new", []),
+        lambda m: m["seen"].append("c"),
+        lambda m: m["seen"].sort(reverse=True),
+        lambda m: m.get("state").__setitem__("count", 2),
+        lambda m: m["feeds"][0].__setitem__("etag", "x"),
+        lambda m: [f.clear() for f in m["feeds"]],
+        lambda m: [v for v in m.values()][0].clear(),
+    ],
+)
+def test_changes_are_tracked(parse, change):
+    memory = parse().memory
+
+    change(memory)
+
+    assert memory.changed
+
+
+def test_reads_are_not_changes(parse):
+    memory = parse().memory
+
+    memory["seen"][0], list(memory["feeds"]), memory.get("state")
+    memory.setdefault("seen", [])
+
+    assert isinstance(memory, TrackedDict)
+    assert not memory.changed
+    assert type(memory.copy()) is dict
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_unchanged_memory_is_not_sent(parse, lazy):
+    before = tracking.stats.unchanged_memories, tracking.stats.bytes_avoided
+    response = aw.Response()
+    response.add_memory(parse(lazy).memory)
+
+    result = json.loads(response.to_bytes())["result"]
+
+    assert result["memory"] == {}
+    assert tracking.stats.unchanged_memories == before[0] + 1
+    if lazy:
+        assert tracking.stats.bytes_avoided > before[1]
+    else:
+        assert tracking.stats.bytes_avoided == before[1]
+
+
+def test_changed_memory_is_sent(parse):
+    request = parse()
+    response = aw.Response()
+    response.add_memory(request.memory)
+    request.memory["seen"].append("c")
+
+    chunks = b"".join(response.iter_chunks())
+
+    assert json.loads(chunks)["result"]["memory"]["seen"] == ["a", "b", "c"]
+
+
+def test_mark_changed(parse):
+    memory = parse().memory
+    memory.mark_changed()
+
+    assert memory.changed
+
+
+def test_memory_is_not_tracked_by_default(check_method_request):
+    assert type(aw.ParsedRequest(check_method_request).memory) is dict
+
+
+def test_tracked_memory_is_pickled_as_plain_containers(parse):
+    memory = parse().memory
+    memory["seen"]
+    memory["feeds"][0]
+
+    copy = pickle.loads(pickle.dumps(memory))
+
+    assert copy == memory
+    assert type(copy) is dict
+    assert type(copy["seen"]) is list
+    assert type(copy["feeds"][0]) is dict